@@ -7,6 +7,10 @@ from abc import ABC, abstractmethod
 from enum import Enum
 from typing import Dict, Any, Optional
 
+import numpy as np
+
+from app.core.augmentation.lut import apply_lut_stack
+
 
 class FilterCategory(Enum):
     """Categories for organizing augmentation filters."""
@@ -95,11 +99,28 @@ class AugmentationEffect(ABC):
     2. Implement get_transform() to return Albumentations transform
     3. Implement get_param_specs() to return ParamSpec dict
     4. Implement set_params() to update parameters
+    
+    Purely per-pixel effects may also set supports_batch and implement
+    apply_batch() so the pipeline can run them over whole image stacks.
+    Effects that are a per-sample lookup table can instead set supports_lut
+    and implement sample_luts(); consecutive ones are then fused into a
+    single table, and apply_batch() comes for free.
+    
+    Effects that treat all channels alike (geometry, blur, ...) should set
+    requires_rgb = False so the pipeline can run them on OpenCV's native
+    BGR images without converting.
     """
     
     # Class attributes (override in subclasses)
     category = FilterCategory.OTHER
     bbox_safe = True  # Whether this filter preserves bounding boxes
+    supports_batch = False  # Whether apply_batch() is implemented
+    supports_lut = False  # Whether sample_luts() is implemented
+    requires_rgb = True  # False if the result does not depend on channel order
+    
+    # Bumped on every change to any effect's public attributes (set_params,
+    # enabled, probability, ...). Pipelines compare it to validate caches.
+    generation = 0
     
     def __init__(self, probability: float = 0.5, enabled: bool = True):
         """
@@ -111,6 +132,11 @@ class AugmentationEffect(ABC):
         self.enabled = enabled
         self.name = self.__class__.__name__
     
+    def __setattr__(self, name, value):
+        if not name.startswith('_'):
+            AugmentationEffect.generation += 1
+        super().__setattr__(name, value)
+    
     @abstractmethod
     def get_transform(self):
         """
@@ -141,6 +167,41 @@ class AugmentationEffect(ABC):
         """
         pass
     
+    def apply_batch(self, images: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """
+        Apply the effect to a stack of images in one vectorized operation.
+        
+        Only called when supports_batch is True. Each sample draws its own
+        random parameters and is affected with the effect's probability.
+        
+        Args:
+            images: uint8 array of shape (N, H, W, C), RGB
+            rng: Generator to draw the per-sample parameters from
+            
+        Returns:
+            np.ndarray: New uint8 stack of the same shape
+        """
+        if self.supports_lut:
+            return apply_lut_stack(images, self.sample_luts(rng, images.shape[0]))
+        raise NotImplementedError(f"{self.name} does not support batch execution")
+    
+    def sample_luts(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        """
+        Draw the lookup tables of n samples.
+        
+        Only called when supports_lut is True. Samples the effect skips
+        (see probability) get the identity table.
+        
+        Args:
+            rng: Generator to draw the per-sample parameters from
+            n: Number of samples
+            
+        Returns:
+            np.ndarray: uint8 tables, (n, 256) shared by all channels
+                or (n, C, 256) per channel
+        """
+        raise NotImplementedError(f"{self.name} is not a lookup-table effect")
+    
     def get_params(self) -> Dict[str, Any]:
         """
         Get current parameter values (for backward compatibility).
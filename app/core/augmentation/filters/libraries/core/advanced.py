@@ -12,6 +12,7 @@ class PerspectiveEffect(AugmentationEffect):
     
     category = FilterCategory.ADVANCED
     bbox_safe = True
+    requires_rgb = False
     
     def __init__(self, scale=0.05, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -49,6 +50,7 @@ class ElasticTransformEffect(AugmentationEffect):
     
     category = FilterCategory.ADVANCED
     bbox_safe = True
+    requires_rgb = False
     
     def __init__(self, alpha=1.0, sigma=50.0, alpha_affine=50.0,
                  probability=0.5, enabled=True):
@@ -107,6 +109,7 @@ class GridDistortionEffect(AugmentationEffect):
     
     category = FilterCategory.ADVANCED
     bbox_safe = True
+    requires_rgb = False
     
     def __init__(self, num_steps=5, distort_limit=0.3, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -152,6 +155,7 @@ class OpticalDistortionEffect(AugmentationEffect):
     
     category = FilterCategory.ADVANCED
     bbox_safe = True
+    requires_rgb = False
     
     def __init__(self, distort_limit=0.5, shift_limit=0.5, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -9,6 +9,7 @@ class BlurEffect(AugmentationEffect):
     
     category = FilterCategory.BLUR
     bbox_safe = True
+    requires_rgb = False
     
     def __init__(self, blur_limit=7, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -41,6 +42,7 @@ class GaussianBlurEffect(AugmentationEffect):
     
     category = FilterCategory.BLUR
     bbox_safe = True
+    requires_rgb = False
     
     def __init__(self, blur_limit=7, sigma_limit_min=0, sigma_limit_max=0, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -95,6 +97,7 @@ class MotionBlurEffect(AugmentationEffect):
     
     category = FilterCategory.BLUR
     bbox_safe = True
+    requires_rgb = False
     
     def __init__(self, blur_limit=7, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
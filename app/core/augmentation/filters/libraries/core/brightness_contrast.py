@@ -1,7 +1,17 @@
 """Brightness and contrast adjustment filters."""
 
 from app.core.augmentation.base import AugmentationEffect, ParamSpec, FilterCategory
+from app.core.augmentation.lut import brightness_contrast_lut, sample_mask
 import albumentations as A
+import numpy as np
+
+
+def _brightness_contrast_luts(rng, n, brightness_limit, contrast_limit, probability):
+    """Per-sample RandomBrightnessContrast tables, (n, 256)."""
+    applied = sample_mask(rng, n, probability)
+    alpha = np.where(applied, 1.0 + rng.uniform(-contrast_limit, contrast_limit, n), 1.0)
+    beta = np.where(applied, rng.uniform(-brightness_limit, brightness_limit, n), 0.0)
+    return brightness_contrast_lut(alpha, beta)
 
 
 class BrightnessContrastEffect(AugmentationEffect):
@@ -9,6 +19,9 @@ class BrightnessContrastEffect(AugmentationEffect):
     
     category = FilterCategory.COLOR
     bbox_safe = True
+    requires_rgb = False
+    supports_batch = True
+    supports_lut = True
     
     def __init__(self, brightness_limit=0.2, contrast_limit=0.2, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -22,6 +35,9 @@ class BrightnessContrastEffect(AugmentationEffect):
             p=self.probability
         )
     
+    def sample_luts(self, rng, n):
+        return _brightness_contrast_luts(rng, n, self.brightness_limit, self.contrast_limit, self.probability)
+    
     def get_param_specs(self):
         return {
             'brightness_limit': ParamSpec(
@@ -54,6 +70,9 @@ class BrightnessEffect(AugmentationEffect):
     
     category = FilterCategory.COLOR
     bbox_safe = True
+    requires_rgb = False
+    supports_batch = True
+    supports_lut = True
     
     def __init__(self, limit=0.2, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -66,6 +85,9 @@ class BrightnessEffect(AugmentationEffect):
             p=self.probability
         )
     
+    def sample_luts(self, rng, n):
+        return _brightness_contrast_luts(rng, n, self.limit, 0.0, self.probability)
+    
     def get_param_specs(self):
         return {
             'limit': ParamSpec(
@@ -88,6 +110,9 @@ class ContrastEffect(AugmentationEffect):
     
     category = FilterCategory.COLOR
     bbox_safe = True
+    requires_rgb = False
+    supports_batch = True
+    supports_lut = True
     
     def __init__(self, limit=0.2, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -100,6 +125,9 @@ class ContrastEffect(AugmentationEffect):
             p=self.probability
         )
     
+    def sample_luts(self, rng, n):
+        return _brightness_contrast_luts(rng, n, 0.0, self.limit, self.probability)
+    
     def get_param_specs(self):
         return {
             'limit': ParamSpec(
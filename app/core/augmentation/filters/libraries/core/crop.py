@@ -12,6 +12,7 @@ class RandomCropEffect(AugmentationEffect):
     
     category = FilterCategory.SPATIAL
     bbox_safe = True  # With min_area safety check
+    requires_rgb = False
     
     def __init__(self, scale_min=0.7, scale_max=0.9, min_bbox_area=0.1, 
                  probability=0.5, enabled=True):
@@ -73,6 +74,7 @@ class CenterCropEffect(AugmentationEffect):
     
     category = FilterCategory.SPATIAL
     bbox_safe = False  # May crop out bboxes
+    requires_rgb = False
     
     def __init__(self, scale=0.8, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -107,6 +109,7 @@ class RandomResizedCropEffect(AugmentationEffect):
     
     category = FilterCategory.SPATIAL
     bbox_safe = True
+    requires_rgb = False
     
     def __init__(self, scale_min=0.5, scale_max=1.0, ratio_min=0.75, ratio_max=1.33,
                  probability=0.5, enabled=True):
@@ -1,7 +1,9 @@
 """Exposure and gamma correction filters."""
 
 from app.core.augmentation.base import AugmentationEffect, ParamSpec, FilterCategory
+from app.core.augmentation.lut import gamma_lut, sample_mask
 import albumentations as A
+import numpy as np
 
 
 class ExposureEffect(AugmentationEffect):
@@ -9,6 +11,9 @@ class ExposureEffect(AugmentationEffect):
     
     category = FilterCategory.COLOR
     bbox_safe = True
+    requires_rgb = False
+    supports_batch = True
+    supports_lut = True
     
     def __init__(self, gamma_min=80, gamma_max=120, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -21,6 +26,11 @@ class ExposureEffect(AugmentationEffect):
             p=self.probability
         )
     
+    def sample_luts(self, rng, n):
+        applied = sample_mask(rng, n, self.probability)
+        gamma = np.where(applied, rng.uniform(self.gamma_min, self.gamma_max, n) / 100.0, 1.0)
+        return gamma_lut(gamma)
+    
     def get_param_specs(self):
         return {
             'gamma_min': ParamSpec(
@@ -9,6 +9,7 @@ class HorizontalFlipEffect(AugmentationEffect):
     
     category = FilterCategory.GEOMETRIC
     bbox_safe = True
+    requires_rgb = False
     
     def get_transform(self):
         return A.HorizontalFlip(p=self.probability)
@@ -25,6 +26,7 @@ class VerticalFlipEffect(AugmentationEffect):
     
     category = FilterCategory.GEOMETRIC
     bbox_safe = True
+    requires_rgb = False
     
     def get_transform(self):
         return A.VerticalFlip(p=self.probability)
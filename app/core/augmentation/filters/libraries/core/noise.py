@@ -1,7 +1,9 @@
 """Noise addition filters."""
 
 from app.core.augmentation.base import AugmentationEffect, ParamSpec, FilterCategory
+from app.core.augmentation.lut import sample_mask
 import albumentations as A
+import numpy as np
 
 
 class GaussianNoiseEffect(AugmentationEffect):
@@ -9,6 +11,8 @@ class GaussianNoiseEffect(AugmentationEffect):
     
     category = FilterCategory.NOISE
     bbox_safe = True
+    requires_rgb = False
+    supports_batch = True
     
     def __init__(self, var_limit_min=10.0, var_limit_max=50.0, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -21,6 +25,19 @@ class GaussianNoiseEffect(AugmentationEffect):
             p=self.probability
         )
     
+    def apply_batch(self, images, rng):
+        n = images.shape[0]
+        applied = sample_mask(rng, n, self.probability)
+        if not applied.any():
+            return images.copy()
+        sigma = np.sqrt(rng.uniform(self.var_limit_min, self.var_limit_max, n)).astype(np.float32)
+        
+        out = images.copy()
+        noisy = images[applied].astype(np.float32)
+        noisy += rng.standard_normal(noisy.shape, dtype=np.float32) * sigma[applied, None, None, None]
+        out[applied] = np.clip(noisy, 0, 255).astype(np.uint8)
+        return out
+    
     def get_param_specs(self):
         return {
             'var_limit_min': ParamSpec(
@@ -1,7 +1,10 @@
 """RGB channel shift filters."""
 
 from app.core.augmentation.base import AugmentationEffect, ParamSpec, FilterCategory
+from app.core.augmentation.lut import shift_lut, hue_lut, apply_lut_stack, sample_mask
 import albumentations as A
+import numpy as np
+import cv2
 
 
 class RGBShiftEffect(AugmentationEffect):
@@ -9,6 +12,8 @@ class RGBShiftEffect(AugmentationEffect):
     
     category = FilterCategory.COLOR
     bbox_safe = True
+    supports_batch = True
+    supports_lut = True
     
     def __init__(self, r_shift=20, g_shift=20, b_shift=20, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -24,6 +29,12 @@ class RGBShiftEffect(AugmentationEffect):
             p=self.probability
         )
     
+    def sample_luts(self, rng, n):
+        applied = sample_mask(rng, n, self.probability)[:, None]
+        limits = np.array([self.r_shift, self.g_shift, self.b_shift], dtype=np.float32)
+        shifts = np.where(applied, rng.uniform(-limits, limits, (n, 3)), 0.0)
+        return shift_lut(shifts)
+    
     def get_param_specs(self):
         return {
             'r_shift': ParamSpec(
@@ -66,6 +77,7 @@ class HueSaturationEffect(AugmentationEffect):
     
     category = FilterCategory.COLOR
     bbox_safe = True
+    supports_batch = True
     
     def __init__(self, hue_shift=20, sat_shift=30, val_shift=20, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -81,6 +93,22 @@ class HueSaturationEffect(AugmentationEffect):
             p=self.probability
         )
     
+    def apply_batch(self, images, rng):
+        n, h, w, c = images.shape
+        applied = sample_mask(rng, n, self.probability)
+        hue = np.where(applied, rng.uniform(-self.hue_shift, self.hue_shift, n), 0.0)
+        sat = np.where(applied, rng.uniform(-self.sat_shift, self.sat_shift, n), 0.0)
+        val = np.where(applied, rng.uniform(-self.val_shift, self.val_shift, n), 0.0)
+        
+        # One colour conversion for the whole stack, viewed as a tall image
+        hsv = cv2.cvtColor(images.reshape(n * h, w, c), cv2.COLOR_RGB2HSV).reshape(n, h, w, c)
+        luts = np.stack([hue_lut(hue), shift_lut(sat), shift_lut(val)], axis=1)
+        hsv = apply_lut_stack(hsv, luts)
+        out = cv2.cvtColor(hsv.reshape(n * h, w, c), cv2.COLOR_HSV2RGB).reshape(n, h, w, c)
+        # Untouched samples keep their exact pixels (HSV round trips are lossy)
+        out[~applied] = images[~applied]
+        return out
+    
     def get_param_specs(self):
         return {
             'hue_shift': ParamSpec(
@@ -10,6 +10,7 @@ class RotateEffect(AugmentationEffect):
     
     category = FilterCategory.GEOMETRIC
     bbox_safe = True
+    requires_rgb = False
     
     def __init__(self, limit=15, border_value=0, probability=0.5, enabled=True):
         super().__init__(probability, enabled)
@@ -56,6 +57,7 @@ class SafeRotateEffect(AugmentationEffect):
     
     category = FilterCategory.GEOMETRIC
     bbox_safe = True
+    requires_rgb = False
     
     def get_transform(self):
         return A.RandomRotate90(p=self.probability)
@@ -9,6 +9,7 @@ class SharpenEffect(AugmentationEffect):
     
     category = FilterCategory.BLUR  # Opposite of blur, but same category
     bbox_safe = True
+    requires_rgb = False
     
     def __init__(self, alpha_min=0.2, alpha_max=0.5, lightness_min=0.5, lightness_max=1.0,
                  probability=0.5, enabled=True):
@@ -77,6 +78,7 @@ class UnsharpMaskEffect(AugmentationEffect):
     
     category = FilterCategory.BLUR
     bbox_safe = True
+    requires_rgb = False
     
     def __init__(self, blur_limit=7, sigma_limit=0.0, alpha=0.2, threshold=10,
                  probability=0.5, enabled=True):
@@ -0,0 +1,111 @@
+"""
+Lookup-table helpers for per-pixel colour effects.
+Builders return uint8 tables with the same rounding as Albumentations,
+for one sample (256,) or a batch of samples (N, 256).
+"""
+
+import cv2
+import numpy as np
+import albumentations as A
+
+
+_IDENTITY = np.arange(256, dtype=np.float32)
+
+
+def brightness_contrast_lut(alpha, beta):
+    """Table for img * alpha + beta * 255 (RandomBrightnessContrast, brightness_by_max)."""
+    alpha = np.asarray(alpha, dtype=np.float32)[..., None]
+    beta = np.asarray(beta, dtype=np.float32)[..., None]
+    lut = _IDENTITY * alpha + beta * 255.0
+    return np.clip(lut, 0, 255).astype(np.uint8)
+
+
+def gamma_lut(gamma):
+    """Table for (img / 255) ** gamma * 255 (RandomGamma)."""
+    gamma = np.asarray(gamma, dtype=np.float32)[..., None]
+    lut = np.power(_IDENTITY / 255.0, gamma) * 255.0
+    return np.clip(lut, 0, 255).astype(np.uint8)
+
+
+def shift_lut(shift):
+    """Table for img + shift, clipped (RGBShift, value/saturation shifts)."""
+    shift = np.asarray(shift, dtype=np.float32)[..., None]
+    return np.clip(_IDENTITY + shift, 0, 255).astype(np.uint8)
+
+
+def hue_lut(shift):
+    """Table for (hue + shift) mod 180 on OpenCV's 0-179 hue channel."""
+    shift = np.asarray(shift, dtype=np.int16)[..., None]
+    return np.mod(np.arange(256, dtype=np.int16) + shift, 180).astype(np.uint8)
+
+
+def compose_luts(first, second):
+    """Table equivalent to applying `first` and then `second`.
+
+    Either argument may be a shared (N, 256) or per-channel (N, C, 256)
+    table; the result is per-channel if either input is.
+    """
+    if first.ndim != second.ndim:
+        if first.ndim == 2:
+            first = np.broadcast_to(first[:, None, :], second.shape)
+        else:
+            second = np.broadcast_to(second[:, None, :], first.shape)
+    return np.take_along_axis(second, first.astype(np.intp), axis=-1)
+
+
+def apply_lut_stack(images, luts):
+    """Apply one table per sample to an (N, H, W, C) uint8 stack.
+
+    Each sample is a single cv2.LUT call into a preallocated output, which
+    is several times faster than a fancy-indexing gather over the stack.
+
+    Args:
+        images: uint8 array of shape (N, H, W, C) or (N, H, W)
+        luts: (N, 256) table shared by all channels, or (N, C, 256) per channel
+
+    Returns:
+        np.ndarray: New uint8 stack of the same shape
+    """
+    out = np.empty_like(images)
+    if luts.ndim == 3:
+        # cv2.LUT takes per-channel tables as a (256, 1, C) array
+        luts = np.ascontiguousarray(luts.transpose(0, 2, 1)[:, :, None, :])
+    for i in range(images.shape[0]):
+        cv2.LUT(images[i], luts[i], dst=out[i])
+    return out
+
+
+def sample_mask(rng, n, probability):
+    """Boolean mask of the samples an effect with `probability` applies to."""
+    return rng.random(n) < probability
+
+
+class FusedLUTTransform(A.ImageOnlyTransform):
+    """Applies a run of LUT-expressible effects as one cv2.LUT per image.
+
+    Each effect still draws its own random parameters and honours its own
+    probability; only the resulting tables are folded together, so a stack
+    of colour effects costs a single pass over the pixels.
+    """
+
+    def __init__(self, effects):
+        super().__init__(p=1.0)
+        self.effects = list(effects)
+
+    def get_params(self):
+        # Drawn from the global RNG so seeded runs stay reproducible
+        rng = np.random.default_rng(np.random.randint(0, 2**31))
+        lut = None
+        for effect in self.effects:
+            table = effect.sample_luts(rng, 1)
+            lut = table if lut is None else compose_luts(lut, table)
+        return {'lut': lut[0]}
+
+    def apply(self, img, lut=None, **params):
+        if lut.ndim == 2:
+            # cv2.LUT takes per-channel tables as a (256, 1, C) array
+            lut = np.ascontiguousarray(lut.T[:, None, :])
+        return cv2.LUT(img, lut)
+
+    def get_transform_init_args_names(self):
+        return ('effects',)
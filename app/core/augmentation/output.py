@@ -0,0 +1,150 @@
+"""
+Output encoding for generated augmentations.
+Chooses the file format and quality of written samples and keeps
+per-format throughput and size statistics.
+"""
+
+import io
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class OutputEncoder:
+    """
+    Encodes augmented samples (BGR, as produced for cv2.imwrite) to disk.
+
+    Formats:
+        source: same extension as the source image, OpenCV defaults
+        jpg: JPEG with `quality` (0-100)
+        webp: WebP with `quality` (1-100, above 100 is lossless)
+        png: lossless PNG with `png_compression` (0 = fastest, 9 = smallest)
+        npy: raw array via np.save, no encoding at all. Holds OpenCV's BGR
+            order, like cv2.imread. For custom loaders only; YOLO training
+            cannot read it.
+    """
+
+    FORMATS = ('source', 'jpg', 'webp', 'png', 'npy')
+    EXTENSIONS = {'jpg': '.jpg', 'webp': '.webp', 'png': '.png', 'npy': '.npy'}
+
+    def __init__(self, format='source', quality=95, png_compression=1):
+        """
+        Args:
+            format: One of FORMATS
+            quality: JPEG/WebP quality
+            png_compression: PNG compression level (0-9)
+        """
+        if format not in self.FORMATS:
+            raise ValueError(f"Unknown output format '{format}', expected one of {self.FORMATS}")
+        self.format = format
+        self.quality = int(quality)
+        self.png_compression = int(png_compression)
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def extension(self, source_ext):
+        """Extension of the written files for a source with source_ext."""
+        return self.EXTENSIONS.get(self.format, source_ext)
+
+    def signature(self):
+        """Settings that change the written files, for the augmentation manifest."""
+        if self.format == 'source':
+            return None
+        return f"{self.format}:{self.quality}:{self.png_compression}"
+
+    def _imwrite_params(self, ext):
+        ext = ext.lower()
+        if ext in ('.jpg', '.jpeg'):
+            return [cv2.IMWRITE_JPEG_QUALITY, self.quality] if self.format == 'jpg' else []
+        if ext == '.webp':
+            return [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        if ext == '.png':
+            return [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression] if self.format == 'png' else []
+        return []
+
+    def write(self, path, image):
+        """Write one BGR image to path (whose extension comes from extension()).
+
+        Returns:
+            int: Bytes written (0 if encoding failed)
+        """
+        start = time.perf_counter()
+        ext = os.path.splitext(path)[1]
+        if self.format == 'npy':
+            with open(path, 'wb') as f:
+                np.save(f, image)
+            ok = True
+        else:
+            ok = cv2.imwrite(path, image, self._imwrite_params(ext))
+        elapsed = time.perf_counter() - start
+
+        size = os.path.getsize(path) if ok and os.path.exists(path) else 0
+        if not ok:
+            print(f"Failed to write augmented image {path}")
+        self.record(ext.lstrip('.').lower(), 1, size, elapsed)
+        return size
+
+    def encode(self, image, ext):
+        """Encode one BGR image in memory, e.g. for packing into shards.
+
+        Args:
+            image: BGR uint8 array
+            ext: Extension from extension(), decides the codec
+
+        Returns:
+            bytes: Encoded image, or None if encoding failed
+        """
+        start = time.perf_counter()
+        if self.format == 'npy':
+            buffer = io.BytesIO()
+            np.save(buffer, image)
+            data = buffer.getvalue()
+        else:
+            ok, encoded = cv2.imencode(ext, image, self._imwrite_params(ext))
+            data = encoded.tobytes() if ok else None
+        elapsed = time.perf_counter() - start
+
+        if data is None:
+            print(f"Failed to encode augmented image as {ext}")
+        self.record(ext.lstrip('.').lower(), 1, len(data) if data else 0, elapsed)
+        return data
+
+    def record(self, key, count, size, seconds):
+        """Add to the statistics of one format (thread-safe)."""
+        with self._lock:
+            entry = self.stats.setdefault(key, {'count': 0, 'bytes': 0, 'seconds': 0.0})
+            entry['count'] += count
+            entry['bytes'] += size
+            entry['seconds'] += seconds
+
+    def merge_stats(self, stats):
+        """Fold statistics gathered elsewhere (e.g. a worker process) into these."""
+        for key, entry in stats.items():
+            self.record(key, entry['count'], entry['bytes'], entry['seconds'])
+
+    def take_stats(self):
+        """Return the statistics gathered so far and start over."""
+        with self._lock:
+            stats, self.stats = self.stats, {}
+        return stats
+
+    def summary(self):
+        """Per-format count, bytes, average size and encode throughput."""
+        with self._lock:
+            stats = {key: dict(entry) for key, entry in self.stats.items()}
+        for entry in stats.values():
+            entry['avg_bytes'] = entry['bytes'] / entry['count'] if entry['count'] else 0
+            entry['images_per_sec'] = entry['count'] / entry['seconds'] if entry['seconds'] else 0.0
+            entry['mb_per_sec'] = entry['bytes'] / 1e6 / entry['seconds'] if entry['seconds'] else 0.0
+        return stats
+
+    def to_dict(self):
+        return {'format': self.format, 'quality': self.quality, 'png_compression': self.png_compression}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(format=data.get('format', 'source'), quality=data.get('quality', 95),
+                   png_compression=data.get('png_compression', 1))
@@ -0,0 +1,209 @@
+"""
+Packed dataset shards for augmented output.
+Stores encoded images and their YOLO boxes in a few large append-only
+files plus an offset index, instead of one image and one label file
+per sample.
+"""
+
+import io
+import json
+import mmap
+import os
+
+import cv2
+import numpy as np
+
+from app.core.label_io import LABEL_WIDTH, to_array, to_lists
+
+
+INDEX_FILE = "index.json"
+
+# One label row: class_id, cx, cy, w, h
+_LABEL_DTYPE = np.float32
+
+# np.save headers are padded to a multiple of 64 bytes and are short for images
+_NPY_HEADER_MAX = 4096
+
+
+class ShardWriter:
+    """
+    Appends samples to shard files in a directory.
+
+    Each record is the encoded image followed by its labels as a float32
+    (n, 5) array. Records never move once written; the index maps sample
+    id -> (shard, offset, image length, box count, extension) and is
+    rewritten atomically by flush()/close(). Every writer session starts a
+    new shard, so an interrupted session at worst leaves unindexed bytes
+    at the end of its own shard.
+    """
+
+    VERSION = 1
+
+    def __init__(self, directory, max_shard_bytes=512 * 1024 * 1024):
+        """
+        Args:
+            directory: Shard directory (created if missing; existing shards are kept)
+            max_shard_bytes: Start a new shard once the current one exceeds this
+        """
+        self.directory = directory
+        self.max_shard_bytes = max_shard_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self.shards, self.samples = _load_index(directory)
+        self._file = None
+        self._offset = 0
+
+    def _open_next_shard(self):
+        if self._file:
+            self._file.close()
+        name = f"shard-{len(self.shards):05d}.bin"
+        self.shards.append(name)
+        self._file = open(os.path.join(self.directory, name), 'ab')
+        self._offset = self._file.tell()
+
+    def add(self, sample_id, encoded, ext, bboxes, class_labels):
+        """Append one sample; a sample id written again replaces the old entry.
+
+        Args:
+            sample_id: Unique name of the sample
+            encoded: Encoded image bytes (see OutputEncoder.encode)
+            ext: Extension of the encoding, e.g. '.jpg' or '.npy'
+            bboxes: list of [cx, cy, w, h] in YOLO format
+            class_labels: list of class IDs
+        """
+        if self._file is None or self._offset >= self.max_shard_bytes:
+            self._open_next_shard()
+
+        labels = to_array(bboxes, class_labels, _LABEL_DTYPE)
+        self._file.write(encoded)
+        self._file.write(labels.tobytes())
+
+        self.samples[sample_id] = [len(self.shards) - 1, self._offset, len(encoded), len(labels), ext]
+        self._offset += len(encoded) + labels.nbytes
+
+    def flush(self):
+        """Make everything added so far durable and visible to readers."""
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        tmp_path = os.path.join(self.directory, INDEX_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.VERSION, 'shards': self.shards, 'samples': self.samples}, f)
+        os.replace(tmp_path, os.path.join(self.directory, INDEX_FILE))
+
+    def close(self):
+        self.flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ShardReader:
+    """
+    Random access to the samples of a shard directory by sample id.
+
+    Shards are memory-mapped on first use, so reading a sample touches
+    only its own bytes and several readers share the OS page cache.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.shards, self.samples = _load_index(directory)
+        self._maps = {}
+        self._files = {}
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __contains__(self, sample_id):
+        return sample_id in self.samples
+
+    def __iter__(self):
+        return iter(self.samples)
+
+    def ids(self):
+        """All sample ids, in the order they were written."""
+        return list(self.samples)
+
+    def _map(self, shard):
+        if shard not in self._maps:
+            f = open(os.path.join(self.directory, self.shards[shard]), 'rb')
+            self._files[shard] = f
+            self._maps[shard] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[shard]
+
+    def read_bytes(self, sample_id):
+        """Encoded image of a sample as a zero-copy view into its shard."""
+        shard, offset, length, _, _ = self.samples[sample_id]
+        return memoryview(self._map(shard))[offset:offset + length]
+
+    def read_labels(self, sample_id):
+        """(bboxes, class_labels) of a sample, without decoding its image."""
+        shard, offset, length, count, _ = self.samples[sample_id]
+        labels = np.frombuffer(self._map(shard), dtype=_LABEL_DTYPE, count=count * LABEL_WIDTH,
+                               offset=offset + length)
+        return to_lists(labels)
+
+    def read(self, sample_id, channel_order='RGB'):
+        """Decode one sample.
+
+        Args:
+            sample_id: Id given to ShardWriter.add
+            channel_order: 'RGB' or 'BGR' for the returned image
+
+        Returns:
+            tuple: (image, bboxes, class_labels). A BGR image from an .npy
+                shard is a read-only view into the shard.
+        """
+        ext = self.samples[sample_id][4]
+        view = self.read_bytes(sample_id)
+        if ext == '.npy':
+            image = _decode_npy(view)
+        else:
+            image = cv2.imdecode(np.frombuffer(view, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is not None and channel_order == 'RGB':
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        bboxes, class_labels = self.read_labels(sample_id)
+        return image, bboxes, class_labels
+
+    def close(self):
+        for m in self._maps.values():
+            m.close()
+        for f in self._files.values():
+            f.close()
+        self._maps = {}
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _decode_npy(view):
+    """Array stored with np.save, as a read-only view of the buffer (no copy)."""
+    header = io.BytesIO(view[:_NPY_HEADER_MAX].tobytes())
+    major, _ = np.lib.format.read_magic(header)
+    read_header = np.lib.format.read_array_header_1_0 if major == 1 else np.lib.format.read_array_header_2_0
+    shape, fortran_order, dtype = read_header(header)
+    array = np.frombuffer(view, dtype=dtype, count=int(np.prod(shape)), offset=header.tell())
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def _load_index(directory):
+    """(shard names, samples) from a shard directory's index, empty if there is none."""
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return [], {}
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('version') != ShardWriter.VERSION:
+        raise ValueError(f"Unsupported shard index version in {path}")
+    return data['shards'], data['samples']
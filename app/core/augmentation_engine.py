@@ -8,9 +8,22 @@ import cv2
 import numpy as np
 import albumentations as A
 import json
-from datetime import datetime
+import random
+import hashlib
+import multiprocessing
+import threading
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from abc import ABC, abstractmethod
 
+from app.core.augmentation.base import AugmentationEffect
+from app.core.augmentation.lut import FusedLUTTransform, apply_lut_stack, compose_luts
+from app.core.augmentation.output import OutputEncoder
+from app.core.augmentation.shards import ShardWriter
+from app.core.label_store import LabelStore
+from app.core.label_io import read_label_lists, write_label_lists
+
 # --- Dynamic Loading ---
 
 import importlib.util
@@ -76,60 +89,182 @@ def create_effect_from_dict(data):
         
     return None
 
+# --- Seeding ---
+
+def derive_sample_seed(seed, key, aug_idx):
+    """Derive the seed of one sample's independent RNG stream.
+
+    The stream depends only on the run seed, the source image key (its file
+    name) and the augmentation index, so any process or shard regenerates
+    the same sample without coordinating with the others.
+
+    Args:
+        seed: Run-level seed (non-negative int)
+        key: Stable identifier of the source image
+        aug_idx: Index of the augmentation for that source
+
+    Returns:
+        int: 32-bit seed for the sample
+    """
+    key_hash = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+    return int(np.random.SeedSequence([int(seed), key_hash, int(aug_idx)]).generate_state(1)[0])
+
+# Held while a transform draws from the global RNGs: a seeded sample must not
+# interleave with another thread's (e.g. a preview during a dataset run)
+_RNG_LOCK = threading.Lock()
+
+@contextmanager
+def _seeded_rng(seed):
+    """Temporarily seed the global RNGs Albumentations draws from.
+
+    The previous states are restored afterwards, so seeded calls do not
+    disturb unseeded ones. Holds _RNG_LOCK throughout.
+    """
+    with _RNG_LOCK:
+        py_state = random.getstate()
+        np_state = np.random.get_state()
+        random.seed(seed)
+        np.random.seed(seed)
+        try:
+            yield
+        finally:
+            random.setstate(py_state)
+            np.random.set_state(np_state)
+
+# --- Channel Order ---
+
+class _SwapRedBlue(A.ImageOnlyTransform):
+    """RGB <-> BGR conversion step inserted by the pipeline where needed."""
+
+    def __init__(self):
+        # always_apply: must not draw from the RNG, or seeded results would
+        # depend on where conversions happen to be inserted
+        super().__init__(always_apply=True, p=1.0)
+
+    def apply(self, img, **params):
+        return cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+
+    def get_transform_init_args_names(self):
+        return ()
+
 # --- Pipeline ---
 
 class AugmentationPipeline:
     def __init__(self):
-        self.effects = []
+        self._effects = []
         self.enabled = True
         self.augmentations_per_image = 5
+        self.seed = None  # None: fresh randomness on every run
         
         # Performance: Transform caching
-        self._cached_compose = None
-        self._cache_hash = None
+        self._generation = 0  # Bumped whenever the effect list is replaced or edited through the helpers
+        self._cached_composes = {}  # channel order -> A.Compose
+        self._cache_key = None
+        self._cached_batch_plan = None
+        self._batch_plan_key = None
+
+    @property
+    def effects(self):
+        return self._effects
+
+    @effects.setter
+    def effects(self, effects):
+        self._effects = effects
+        self._generation += 1
 
     def add_effect(self, effect):
         self.effects.append(effect)
+        self._generation += 1
 
     def remove_effect(self, index):
         if 0 <= index < len(self.effects):
             self.effects.pop(index)
+            self._generation += 1
 
     def move_effect(self, from_index, to_index):
         if 0 <= from_index < len(self.effects) and 0 <= to_index < len(self.effects):
             self.effects.insert(to_index, self.effects.pop(from_index))
+            self._generation += 1
+
+    def _get_cache_key(self):
+        """Cache key: changes whenever the effect list or any effect changes.
+
+        The effects themselves are part of it, so editing the list in place
+        (pipeline.effects.append(...)) is noticed too; holding them also
+        keeps their ids from being reused while the key is cached.
+        """
+        return (self._generation, AugmentationEffect.generation, tuple(self._effects))
 
     def _compute_pipeline_hash(self):
-        """Compute hash of current pipeline configuration for cache invalidation."""
+        """Compute a content hash of the pipeline configuration.
+
+        Stable across processes and sessions (unlike hash()), so it can be
+        persisted in the augmentation manifest. Too slow for per-image cache
+        checks; those use _get_cache_key().
+        """
         config_str = json.dumps(self.to_dict(), sort_keys=True)
-        return hash(config_str)
+        return hashlib.sha1(config_str.encode('utf-8')).hexdigest()
     
-    def get_compose(self, use_cache=True):
+    def get_compose(self, use_cache=True, channel_order='RGB'):
         """Compile the pipeline into an Albumentations Compose object.
         
         Args:
             use_cache: If True, use cached transform if pipeline hasn't changed
+            channel_order: 'RGB' or 'BGR', order of the images the Compose
+                takes and returns
             
         Returns:
             A.Compose: The composed transformation pipeline
         """
         if not use_cache:
-            return self._build_compose()
+            return self._build_compose(channel_order=channel_order)
         
         # Check cache
-        current_hash = self._compute_pipeline_hash()
-        if current_hash != self._cache_hash or self._cached_compose is None:
-            self._cached_compose = self._build_compose()
-            self._cache_hash = current_hash
+        current_key = self._get_cache_key()
+        if current_key != self._cache_key:
+            self._cached_composes = {}
+            self._cache_key = current_key
+        if channel_order not in self._cached_composes:
+            self._cached_composes[channel_order] = self._build_compose(channel_order=channel_order)
         
-        return self._cached_compose
+        return self._cached_composes[channel_order]
     
-    def _build_compose(self):
-        """Build the Albumentations Compose object."""
+    def _build_compose(self, effects=None, channel_order='RGB'):
+        """Build the Albumentations Compose object (of all enabled effects by default).
+
+        Consecutive lookup-table effects (supports_lut) are fused into a single
+        FusedLUTTransform, so they cost one pass over the pixels together.
+
+        For BGR input, effects with requires_rgb = False run on the BGR image
+        as is; a conversion is inserted before the first effect that needs RGB
+        and another one at the end, so a pipeline of order-agnostic effects
+        needs none.
+        """
+        # Units run as one transform: single effects or fused LUT runs
+        units = []
+        lut_run = []
+        for effect in (self.effects if effects is None else effects):
+            if not effect.enabled:
+                continue
+            if effect.supports_lut:
+                lut_run.append(effect)
+                continue
+            if lut_run:
+                units.append(lut_run)
+                lut_run = []
+            units.append([effect])
+        if lut_run:
+            units.append(lut_run)
+        
         transforms = []
-        for effect in self.effects:
-            if effect.enabled:
-                transforms.append(effect.get_transform())
+        order = channel_order
+        for unit in units:
+            if order != 'RGB' and any(effect.requires_rgb for effect in unit):
+                transforms.append(_SwapRedBlue())
+                order = 'RGB'
+            transforms.extend(self._lut_transforms(unit))
+        if order != channel_order:
+            transforms.append(_SwapRedBlue())
         
         return A.Compose(transforms, bbox_params=A.BboxParams(
             format='yolo',
@@ -137,16 +272,68 @@ class AugmentationPipeline:
             min_visibility=0.3
         ))
 
+    @staticmethod
+    def _lut_transforms(effects):
+        """Transforms for a run of LUT effects: fused if there is more than one."""
+        if len(effects) > 1:
+            return [FusedLUTTransform(effects)]
+        return [effect.get_transform() for effect in effects]
+
+    def native_channel_order(self):
+        """Channel order to decode sources in for this pipeline.
+
+        'BGR' (OpenCV's own) when no enabled effect needs RGB, so samples go
+        from cv2.imread to cv2.imwrite without any conversion. Otherwise 'RGB':
+        converting once per decoded source is cheaper than converting there
+        and back for every sample.
+        """
+        if any(effect.enabled and effect.requires_rgb for effect in self.effects):
+            return 'RGB'
+        return 'BGR'
+
+    def get_batch_plan(self):
+        """Split the enabled effects into stages for run_on_batch.
+        
+        Consecutive effects that support batch execution form one 'batch'
+        stage; everything in between is compiled into a per-sample Compose.
+        
+        Returns:
+            list: ('batch', [effects]) and ('sample', A.Compose) tuples in pipeline order
+        """
+        current_key = self._get_cache_key()
+        if current_key == self._batch_plan_key and self._cached_batch_plan is not None:
+            return self._cached_batch_plan
+        
+        plan = []
+        run = []
+        batchable = None
+        for effect in self.effects:
+            if not effect.enabled:
+                continue
+            if run and effect.supports_batch != batchable:
+                plan.append(('batch', run) if batchable else ('sample', self._build_compose(run)))
+                run = []
+            batchable = effect.supports_batch
+            run.append(effect)
+        if run:
+            plan.append(('batch', run) if batchable else ('sample', self._build_compose(run)))
+        
+        self._cached_batch_plan = plan
+        self._batch_plan_key = current_key
+        return plan
+
     def to_dict(self):
         return {
             'enabled': self.enabled,
             'augmentations_per_image': self.augmentations_per_image,
+            'seed': self.seed,
             'effects': [effect.to_dict() for effect in self.effects]
         }
 
     def from_dict(self, data):
         self.enabled = data.get('enabled', True)
         self.augmentations_per_image = data.get('augmentations_per_image', 5)
+        self.seed = data.get('seed')
         self.effects = []
         for effect_data in data.get('effects', []):
             effect = create_effect_from_dict(effect_data)
@@ -163,13 +350,18 @@ class AugmentationPipeline:
                 data = json.load(f)
                 self.from_dict(data)
 
-    def run_on_image(self, image, bboxes, class_labels):
+    def run_on_image(self, image, bboxes, class_labels, seed=None, channel_order='RGB'):
         """Run pipeline on a single image and return transformed results.
         
         Args:
-            image: numpy array (RGB)
+            image: numpy array (RGB, or BGR with channel_order='BGR')
             bboxes: list of [cx, cy, w, h] in YOLO format (normalized)
             class_labels: list of class IDs
+            seed: Optional per-sample seed (see derive_sample_seed). The same
+                seed always reproduces the same result.
+            channel_order: 'RGB' or 'BGR'; the result has the same order.
+                Passing images straight from cv2.imread as 'BGR' skips the
+                conversions for effects that don't care about channel order.
             
         Returns:
             tuple: (transformed_image, transformed_bboxes, transformed_labels)
@@ -177,8 +369,11 @@ class AugmentationPipeline:
         if not self.enabled or not self.effects:
             return image, bboxes, class_labels
 
-        transform = self.get_compose()
-        
+        transform = self.get_compose(channel_order=channel_order)
+        return self._apply_transform(transform, image, bboxes, class_labels, seed)
+
+    def _apply_transform(self, transform, image, bboxes, class_labels, seed=None):
+        """Call a compiled transform on one sample; on failure, log and return the input."""
         try:
             kwargs = {
                 'image': image,
@@ -186,7 +381,15 @@ class AugmentationPipeline:
                 'class_labels': class_labels if class_labels else []
             }
 
-            result = transform(**kwargs)
+            if seed is None:
+                with _RNG_LOCK:
+                    result = transform(**kwargs)
+            else:
+                with _seeded_rng(seed):
+                    if hasattr(transform, 'set_random_seed'):
+                        # Newer Albumentations keep their own generator
+                        transform.set_random_seed(seed)
+                    result = transform(**kwargs)
             return result['image'], result['bboxes'], result['class_labels']
         except Exception as e:
             # Improved error handling with context
@@ -199,17 +402,420 @@ class AugmentationPipeline:
             print(f"  Traceback: {traceback.format_exc()}")
             return image, bboxes, class_labels
 
+    def run_on_batch(self, images, bboxes=None, class_labels=None, seed=None):
+        """Run pipeline on a stack of same-size images.
+        
+        Runs of per-pixel effects (supports_batch) are applied to the whole
+        stack at once with per-sample random parameters; other effects fall
+        back to per-sample execution. Once samples stop sharing a shape
+        (e.g. after a crop) the rest of the pipeline runs per sample.
+        
+        Args:
+            images: uint8 numpy array (N, H, W, C), RGB
+            bboxes: optional list of N per-image YOLO bbox lists
+            class_labels: optional list of N per-image class ID lists
+            seed: optional seed; the same batch and seed give the same result
+            
+        Returns:
+            tuple: (images, bboxes, class_labels) - images is an (N, H, W, C)
+                array while all samples share a shape, otherwise a list
+        """
+        n = len(images)
+        bboxes = list(bboxes) if bboxes is not None else [[] for _ in range(n)]
+        class_labels = list(class_labels) if class_labels is not None else [[] for _ in range(n)]
+        
+        if not self.enabled or not self.effects:
+            return images, bboxes, class_labels
+        
+        rng = np.random.default_rng(seed)
+        for kind, stage in self.get_batch_plan():
+            if kind == 'batch':
+                lut = None
+                for effect in stage:
+                    if effect.supports_lut:
+                        # Fold consecutive tables; applied once below
+                        table = effect.sample_luts(rng, n)
+                        lut = table if lut is None else compose_luts(lut, table)
+                        continue
+                    if lut is not None:
+                        images = self._apply_batch_lut(images, lut)
+                        lut = None
+                    if isinstance(images, np.ndarray):
+                        images = effect.apply_batch(images, rng)
+                    else:
+                        images = [effect.apply_batch(img[None], rng)[0] for img in images]
+                if lut is not None:
+                    images = self._apply_batch_lut(images, lut)
+            else:
+                sample_seeds = rng.integers(0, 2**32, n)
+                results = [self._apply_transform(stage, images[i], bboxes[i], class_labels[i], int(sample_seeds[i]))
+                           for i in range(n)]
+                out_images = [r[0] for r in results]
+                bboxes = [r[1] for r in results]
+                class_labels = [r[2] for r in results]
+                
+                if all(img.shape == out_images[0].shape for img in out_images):
+                    images = np.stack(out_images)
+                else:
+                    images = out_images
+        
+        return images, bboxes, class_labels
+
+    @staticmethod
+    def _apply_batch_lut(images, luts):
+        """Apply per-sample tables to a stack, or to a list of odd-sized images."""
+        if isinstance(images, np.ndarray):
+            return apply_lut_stack(images, luts)
+        return [apply_lut_stack(img[None], luts[i:i + 1])[0] for i, img in enumerate(images)]
+
+# --- Per-image Work ---
+
+# Prefix of every generated file; such files are never used as sources.
+AUG_PREFIX = "aug_"
+
+def _output_names(img_file, aug_idx, run_seed, ext=None, variant=None):
+    """Deterministic (image, label) output file names for one sample.
+
+    ext overrides the image extension (default: the source's). variant is
+    a digest of everything else the sample depends on (see
+    AugmentationManifest.digest), so a file of that name is known current.
+    """
+    base_name, source_ext = os.path.splitext(img_file)
+    if variant:
+        stem = f"{AUG_PREFIX}{aug_idx}_s{run_seed}_{variant}_{base_name}"
+    else:
+        stem = f"{AUG_PREFIX}{aug_idx}_s{run_seed}_{base_name}"
+    return stem + (ext or source_ext), stem + '.txt'
+
+def _load_source(img_path, label_path, channel_order='RGB', label_store=None):
+    """Read a source image and its YOLO labels.
+
+    Args:
+        channel_order: 'RGB', or 'BGR' to keep OpenCV's order and skip the conversion
+        label_store: LabelStore mirroring label_path's directory; labels are
+            then read from it instead of parsing the .txt
+
+    Returns:
+        tuple: (image, bboxes, class_labels), image is None if unreadable
+    """
+    image = cv2.imread(img_path)
+    if image is None:
+        return None, [], []
+    if channel_order == 'RGB':
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    
+    if label_store is not None:
+        bboxes, class_labels = label_store.get(os.path.splitext(os.path.basename(label_path))[0])
+    else:
+        bboxes, class_labels = read_label_lists(label_path)
+    return image, bboxes, class_labels
+
+def _plan_outputs(img_file, output_images_dir, output_labels_dir, augmentations_per_image, run_seed,
+                  skip_existing=True, variant=None, encoder=None):
+    """Work out which augmentations of one source still have to be generated.
+
+    Existing outputs are only trusted (skip_existing) if their names carry
+    the variant digest; without one every sample is generated again.
+
+    Returns:
+        tuple: (pending, outputs) - (aug_idx, image path, label path) of the
+            samples to generate, and the (image name, label name) pairs of
+            all samples of this source
+    """
+    ext = encoder.extension(os.path.splitext(img_file)[1]) if encoder else None
+    pending = []
+    outputs = []
+    for aug_idx in range(augmentations_per_image):
+        aug_img_name, aug_label_name = _output_names(img_file, aug_idx, run_seed, ext, variant)
+        aug_img_path = os.path.join(output_images_dir, aug_img_name)
+        aug_label_path = os.path.join(output_labels_dir, aug_label_name)
+        outputs.append((aug_img_name, aug_label_name))
+        
+        if skip_existing and variant and os.path.exists(aug_img_path) and os.path.exists(aug_label_path):
+            continue
+        pending.append((aug_idx, aug_img_path, aug_label_path))
+    return pending, outputs
+
+def _write_sample(aug_img_path, aug_label_path, aug_img, aug_bboxes, aug_classes, channel_order='BGR',
+                  encoder=None):
+    """Encode one augmented sample (with encoder's settings if given) and write its YOLO labels."""
+    if channel_order == 'RGB':
+        aug_img = cv2.cvtColor(aug_img, cv2.COLOR_RGB2BGR)
+    if encoder:
+        encoder.write(aug_img_path, aug_img)
+    else:
+        cv2.imwrite(aug_img_path, aug_img)
+    
+    write_label_lists(aug_label_path, aug_bboxes, aug_classes)
+
+def _augment_image_file(pipeline, img_file, images_dir, labels_dir, output_images_dir, output_labels_dir,
+                        run_seed, skip_existing=True, variant=None, encoder=None, label_store=None):
+    """Decode one source image, generate its augmentations and write them out.
+
+    Used by the process pool workers; the serial path runs the same steps
+    as overlapping stages (see AugmentationEngine._run_pipelined), so both
+    produce the same files. Every sample is seeded from (run_seed, img_file,
+    aug_idx) and named after those plus the variant digest of the source,
+    labels, pipeline and encoder, so an existing output of the same name is
+    what would be generated and is skipped when skip_existing is set.
+
+    Returns:
+        tuple: (written, outputs) - number of augmentations written and the
+            (image name, label name) pairs present for this source afterwards
+            (empty if the image could not be read)
+    """
+    pending, outputs = _plan_outputs(img_file, output_images_dir, output_labels_dir,
+                                     pipeline.augmentations_per_image, run_seed, skip_existing, variant, encoder)
+    if not pending:
+        return 0, outputs
+    
+    # Load source
+    label_path = os.path.join(labels_dir, os.path.splitext(img_file)[0] + '.txt')
+    order = pipeline.native_channel_order()
+    image, bboxes, class_labels = _load_source(os.path.join(images_dir, img_file), label_path, order, label_store)
+    if image is None: return 0, []
+    
+    # Generate augmentations
+    for aug_idx, aug_img_path, aug_label_path in pending:
+        seed = derive_sample_seed(run_seed, img_file, aug_idx)
+        aug_img, aug_bboxes, aug_classes = pipeline.run_on_image(image, bboxes, class_labels, seed=seed,
+                                                                 channel_order=order)
+        _write_sample(aug_img_path, aug_label_path, aug_img, aug_bboxes, aug_classes, order, encoder)
+    
+    return len(pending), outputs
+
+# --- Process Pool Workers ---
+
+# Each worker process compiles its own pipeline once, in the initializer.
+_worker_pipeline = None
+_worker_encoder = None
+_worker_label_store = None
+
+def _init_worker(pipeline_data, encoder_data, label_store_dirs=None):
+    """Rebuild the pipeline and output encoder inside a worker process from their to_dict() forms.
+
+    label_store_dirs: (labels_dir, store_dir) of a LabelStore synced by the
+    parent, opened here read-only
+    """
+    global _worker_pipeline, _worker_encoder, _worker_label_store
+    _worker_pipeline = AugmentationPipeline()
+    _worker_pipeline.from_dict(pipeline_data)
+    _worker_encoder = OutputEncoder.from_dict(encoder_data)
+    _worker_label_store = LabelStore(*label_store_dirs, sync=False) if label_store_dirs else None
+
+def _augment_worker(task):
+    """Process pool entry point: augment one image with the worker's pipeline.
+
+    Returns the task's result plus the encoder statistics it produced.
+    """
+    img_file = task[0]
+    return (img_file,) + _augment_image_file(_worker_pipeline, *task, encoder=_worker_encoder,
+                                             label_store=_worker_label_store) + \
+        (_worker_encoder.take_stats(),)
+
+# --- Prefetching ---
+
+def _prefetch_map(fn, items, depth=8, workers=4):
+    """Yield fn(item) for each item, in order, computed ahead on a thread pool.
+
+    At most `depth` results are in flight or waiting at any time, so memory
+    stays bounded however far the consumer falls behind. OpenCV releases the
+    GIL while decoding, so the threads overlap with the consumer's work.
+    """
+    depth = max(1, int(depth))
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as executor:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(executor.submit(fn, item))
+                if len(pending) >= depth:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Consumer stopped early: drop work that has not started yet
+            for future in pending:
+                future.cancel()
+
+# --- Incremental Runs ---
+
+def list_source_images(images_dir):
+    """Image files in images_dir that are sources, i.e. not generated augmentations."""
+    return [f for f in os.listdir(images_dir)
+            if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')) and not f.startswith(AUG_PREFIX)]
+
+def _file_digest(path):
+    """sha1 of a file's content, '' if it does not exist."""
+    if not os.path.exists(path):
+        return ''
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+class AugmentationManifest:
+    """
+    Record of what augment_dataset generated for each source image.
+
+    Maps source file name -> source mtime/size, label hash, pipeline hash,
+    seed and the generated (image, label) output names, so a re-run can skip
+    up-to-date sources and remove outputs that went stale.
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.load()
+    
+    def load(self):
+        self.entries = {}
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable augmentation manifest {self.path}: {e}")
+    
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.VERSION, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)
+    
+    @staticmethod
+    def signature(img_path, label_path, pipeline_hash, output=None):
+        """Everything that decides whether a source's outputs are still valid.
+
+        output is the encoder signature; None (the default encoder) is
+        recorded as 'source'.
+        """
+        stat = os.stat(img_path)
+        return {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'label_hash': _file_digest(label_path),
+            'pipeline_hash': pipeline_hash,
+            'output': output or 'source'
+        }
+    
+    @staticmethod
+    def digest(signature):
+        """Short hex digest of a signature, for output file names."""
+        return hashlib.sha1(json.dumps(signature, sort_keys=True).encode('utf-8')).hexdigest()[:10]
+    
+    def is_current(self, img_file, signature, seed, output_images_dir, output_labels_dir):
+        """True if the recorded outputs of img_file are up to date and still on disk.
+
+        seed None means the pipeline is unseeded, so outputs from any
+        previous run seed are acceptable.
+        """
+        entry = self.entries.get(img_file)
+        if not entry or not entry.get('outputs'):
+            return False
+        recorded = {key: value for key, value in entry.items() if key not in ('seed', 'outputs')}
+        if recorded != signature:
+            return False
+        if seed is not None and entry.get('seed') != seed:
+            return False
+        return all(os.path.exists(os.path.join(output_images_dir, img_name)) and
+                   os.path.exists(os.path.join(output_labels_dir, label_name))
+                   for img_name, label_name in entry['outputs'])
+    
+    def record(self, img_file, signature, seed, outputs):
+        entry = dict(signature)
+        entry['seed'] = seed
+        entry['outputs'] = [list(pair) for pair in outputs]
+        self.entries[img_file] = entry
+    
+    def discard(self, img_file, output_images_dir, output_labels_dir):
+        """Forget img_file and delete the outputs recorded for it."""
+        entry = self.entries.pop(img_file, None)
+        if not entry:
+            return 0
+        removed = 0
+        for img_name, label_name in entry.get('outputs', []):
+            for path in (os.path.join(output_images_dir, img_name), os.path.join(output_labels_dir, label_name)):
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed += 1
+        return removed
+
 # --- Engine ---
 
 class AugmentationEngine:
     """Refactored backbone using the pipeline."""
     
-    def __init__(self, pipeline=None):
+    def __init__(self, pipeline=None, num_workers=1, seed=None, io_threads=2, io_queue_depth=8,
+                 output_encoder=None, label_store=None):
+        """
+        Args:
+            pipeline: AugmentationPipeline to run (a new empty one if None)
+            num_workers: Number of worker processes for augment_dataset.
+                1 keeps everything in the calling process.
+            seed: Run seed; overrides pipeline.seed when given
+            io_threads: Reader and writer threads each, in the serial path
+            io_queue_depth: Maximum sources buffered between the serial stages
+            output_encoder: OutputEncoder for written images (default: the
+                source format with OpenCV's default settings)
+            label_store: Optional LabelStore; sources whose labels_dir it
+                mirrors read their labels from it instead of .txt files
+        """
         self.pipeline = pipeline or AugmentationPipeline()
+        self.num_workers = num_workers
+        self.io_threads = io_threads
+        self.io_queue_depth = io_queue_depth
+        self.output_encoder = output_encoder or OutputEncoder()
+        self.label_store = label_store
+        self.last_run_stats = {}
+        if seed is not None:
+            self.pipeline.seed = seed
+
+    def _label_store_for(self, labels_dir):
+        """label_store if it mirrors labels_dir (brought up to date), else None."""
+        store = self.label_store
+        if store is None or os.path.abspath(store.labels_dir) != os.path.abspath(labels_dir):
+            return None
+        store.sync()
+        return store
 
-    def augment_dataset(self, images_dir, labels_dir, output_images_dir, output_labels_dir, progress_callback=None):
+    def _resolve_run_seed(self):
+        """Pipeline seed if set, otherwise a fresh random seed for this run."""
+        if self.pipeline.seed is not None:
+            return int(self.pipeline.seed)
+        return random.SystemRandom().randrange(2**32)
+
+    def augment_dataset(self, images_dir, labels_dir, output_images_dir, output_labels_dir, progress_callback=None,
+                        skip_existing=True, manifest_path=None):
         """
         Augment entire dataset.
+
+        With num_workers == 1 decoding, augmenting and encoding overlap on
+        threads in this process (see _run_pipelined); with num_workers > 1 the
+        images are distributed over a process pool.
+        Each worker builds its own pipeline from to_dict(); progress is still
+        reported from the calling process as progress_callback(current, total, message).
+
+        Output names are derived from the run seed, the source name, the
+        augmentation index and a digest of the source, its labels, the
+        pipeline and the encoder settings, so seeded runs produce identical
+        files in serial and parallel mode, and skip_existing avoids
+        re-encoding them only while none of those changed. Images
+        are written by output_encoder; per-format counts, bytes and encode
+        throughput end up in last_run_stats['output'].
+
+        Generated files (aug_*) are never used as sources. With a manifest_path
+        the run is incremental: sources whose image, labels, pipeline and seed
+        are unchanged are skipped, and outputs of changed or deleted sources
+        are removed before regenerating.
+
+        Returns:
+            int: Number of augmentations written in this run
         """
         if not self.pipeline.enabled:
             return 0
@@ -218,87 +824,319 @@ class AugmentationEngine:
         os.makedirs(output_images_dir, exist_ok=True)
         os.makedirs(output_labels_dir, exist_ok=True)
         
-        # Get list of images
-        image_files = [f for f in os.listdir(images_dir) 
-                      if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp'))]
+        # Get list of source images
+        image_files = list_source_images(images_dir)
         
-        total_images = len(image_files)
+        augs_per_image = self.pipeline.augmentations_per_image
+        total = len(image_files) * augs_per_image
+        current = 0
         augmented_count = 0
         
-        for idx, img_file in enumerate(image_files):
-            img_path = os.path.join(images_dir, img_file)
-            label_file = os.path.splitext(img_file)[0] + '.txt'
-            label_path = os.path.join(labels_dir, label_file)
+        run_seed = self._resolve_run_seed()
+        manifest = AugmentationManifest(manifest_path) if manifest_path else None
+        pipeline_hash = self.pipeline._compute_pipeline_hash()
+        encoder = self.output_encoder
+        encoder.take_stats()
+        signatures = {}
+        label_store = self._label_store_for(labels_dir)
+        
+        tasks = []
+        for img_file in image_files:
+            label_path = os.path.join(labels_dir, os.path.splitext(img_file)[0] + '.txt')
+            signature = AugmentationManifest.signature(os.path.join(images_dir, img_file), label_path,
+                                                       pipeline_hash, encoder.signature())
+            if manifest:
+                if manifest.is_current(img_file, signature, self.pipeline.seed, output_images_dir, output_labels_dir):
+                    current += augs_per_image
+                    if progress_callback:
+                        progress_callback(current, total, f"Up to date: {img_file}")
+                    continue
+                # Stale: remove what the previous run generated for this source
+                manifest.discard(img_file, output_images_dir, output_labels_dir)
+                signatures[img_file] = signature
+            tasks.append((img_file, images_dir, labels_dir, output_images_dir, output_labels_dir, run_seed,
+                          skip_existing, AugmentationManifest.digest(signature)))
+        
+        if manifest:
+            sources = set(image_files)
+            for img_file in [f for f in manifest.entries if f not in sources]:
+                manifest.discard(img_file, output_images_dir, output_labels_dir)
+        
+        num_workers = max(1, min(int(self.num_workers or 1), len(tasks)))
+        if num_workers > 1:
+            results = self._run_parallel(tasks, num_workers, label_store)
+        else:
+            results = self._run_pipelined(tasks, label_store)
+        
+        decoded_count = 0
+        try:
+            for img_file, written, outputs in results:
+                augmented_count += written
+                decoded_count += bool(written)
+                if manifest and outputs:
+                    manifest.record(img_file, signatures[img_file], run_seed, outputs)
+                
+                if progress_callback:
+                    # Keep the per-augmentation contract of the serial loop
+                    for _ in range(augs_per_image):
+                        current += 1
+                        progress_callback(current, total, f"Augmenting {img_file}")
+        finally:
+            if manifest:
+                manifest.save()
+        
+        # Converting every decode to RGB and every output back to BGR costs
+        # one conversion per decoded source plus one per written sample
+        conversions = decoded_count + augmented_count
+        if self.pipeline.native_channel_order() == 'BGR':
+            conversions = 0
+        self.last_run_stats = {
+            'written': augmented_count,
+            'color_conversions': conversions,
+            'color_conversions_avoided': decoded_count + augmented_count - conversions,
+            'output': encoder.summary()
+        }
+        if augmented_count:
+            print(f"[Augmentation] {augmented_count} images written, "
+                  f"{self.last_run_stats['color_conversions_avoided']} colour conversions avoided")
+            for fmt, entry in self.last_run_stats['output'].items():
+                print(f"[Augmentation] {fmt}: {entry['count']} files, {entry['bytes'] / 1e6:.1f} MB "
+                      f"(avg {entry['avg_bytes'] / 1e3:.1f} KB), {entry['images_per_sec']:.1f} images/s encoding")
+                    
+        return augmented_count
+
+    def _run_pipelined(self, tasks, label_store=None):
+        """Yield (img_file, written, outputs) for each task, in task order, in this process.
+
+        Three overlapping stages: reader threads decode upcoming sources, this
+        thread runs the pipeline, and writer threads encode and flush outputs.
+        OpenCV releases the GIL while decoding and encoding, so the stages run
+        concurrently. At most io_queue_depth sources wait on either side of the
+        augment stage, which bounds peak memory. A source is reported only once
+        all its files are written.
+        """
+        depth = max(1, int(self.io_queue_depth or 1))
+        threads = max(1, int(self.io_threads or 1))
+        order = self.pipeline.native_channel_order()
+        
+        def read(task):
+            (img_file, images_dir, labels_dir, output_images_dir, output_labels_dir, run_seed,
+             skip_existing, variant) = task
+            pending, outputs = _plan_outputs(img_file, output_images_dir, output_labels_dir,
+                                             self.pipeline.augmentations_per_image, run_seed, skip_existing,
+                                             variant, self.output_encoder)
+            if not pending:
+                return img_file, run_seed, pending, outputs, None, [], []
+            label_path = os.path.join(labels_dir, os.path.splitext(img_file)[0] + '.txt')
+            image, bboxes, class_labels = _load_source(os.path.join(images_dir, img_file), label_path, order,
+                                                       label_store)
+            return img_file, run_seed, pending, outputs, image, bboxes, class_labels
+        
+        with ThreadPoolExecutor(max_workers=threads) as writer:
+            in_flight = deque()  # (img_file, written, outputs, write futures) per source
             
-            # Load source
-            image = cv2.imread(img_path)
-            if image is None: continue
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            def finish(entry):
+                img_file, written, outputs, futures = entry
+                for future in futures:
+                    future.result()
+                return img_file, written, outputs
             
-            bboxes = []
-            class_labels = []
+            for img_file, run_seed, pending, outputs, image, bboxes, class_labels in _prefetch_map(
+                    read, tasks, depth, threads):
+                if not pending:
+                    in_flight.append((img_file, 0, outputs, []))
+                elif image is None:
+                    in_flight.append((img_file, 0, [], []))
+                else:
+                    futures = []
+                    for aug_idx, aug_img_path, aug_label_path in pending:
+                        seed = derive_sample_seed(run_seed, img_file, aug_idx)
+                        aug_img, aug_bboxes, aug_classes = self.pipeline.run_on_image(image, bboxes, class_labels,
+                                                                                      seed=seed, channel_order=order)
+                        futures.append(writer.submit(_write_sample, aug_img_path, aug_label_path,
+                                                     aug_img, aug_bboxes, aug_classes, order,
+                                                     self.output_encoder))
+                    in_flight.append((img_file, len(pending), outputs, futures))
+                
+                # Report finished sources; block only when the write queue is full
+                while in_flight and (len(in_flight) > depth or all(f.done() for f in in_flight[0][3])):
+                    yield finish(in_flight.popleft())
             
-            if os.path.exists(label_path):
-                with open(label_path, 'r') as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if len(parts) >= 5:
-                            class_id = int(float(parts[0]))
-                            cx, cy, w, h = map(float, parts[1:5])
-                            bboxes.append([cx, cy, w, h])
-                            class_labels.append(class_id)
+            while in_flight:
+                yield finish(in_flight.popleft())
+
+    def _run_parallel(self, tasks, num_workers, label_store=None):
+        """Yield (img_file, written, outputs) for each task from a process pool, in task order."""
+        # spawn: forking a process that owns a Tk interpreter is not safe
+        ctx = multiprocessing.get_context("spawn")
+        chunksize = max(1, min(16, len(tasks) // (num_workers * 4)))
+        store_dirs = (label_store.labels_dir, label_store.store_dir) if label_store else None
+        
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx,
+                                 initializer=_init_worker,
+                                 initargs=(self.pipeline.to_dict(), self.output_encoder.to_dict(),
+                                           store_dirs)) as executor:
+            for img_file, written, outputs, encoder_stats in executor.map(_augment_worker, tasks,
+                                                                           chunksize=chunksize):
+                self.output_encoder.merge_stats(encoder_stats)
+                yield img_file, written, outputs
+
+    def export_shards(self, images_dir, labels_dir, shard_dir, progress_callback=None,
+                      max_shard_bytes=512 * 1024 * 1024):
+        """Augment a dataset into packed shards instead of one file pair per sample.
+
+        Samples are generated exactly like augment_dataset (same seeds and
+        channel order) and encoded with output_encoder on io_threads threads,
+        then appended to ShardWriter shards in shard_dir under the id their
+        output file would have had, minus the extension (see ShardReader).
+        Shards are append-only: exporting again adds samples, and ids that
+        already exist point at the new copy.
+
+        Returns:
+            int: Number of samples written
+        """
+        if not self.pipeline.enabled:
+            return 0
+        
+        image_files = list_source_images(images_dir)
+        augs_per_image = self.pipeline.augmentations_per_image
+        total = len(image_files) * augs_per_image
+        current = 0
+        written = 0
+        
+        run_seed = self._resolve_run_seed()
+        order = self.pipeline.native_channel_order()
+        depth = max(1, int(self.io_queue_depth or 1))
+        threads = max(1, int(self.io_threads or 1))
+        encoder = self.output_encoder
+        encoder.take_stats()
+        label_store = self._label_store_for(labels_dir)
+        
+        def decode(img_file):
+            label_path = os.path.join(labels_dir, os.path.splitext(img_file)[0] + '.txt')
+            return (img_file,) + _load_source(os.path.join(images_dir, img_file), label_path, order, label_store)
+        
+        def encode(image, ext):
+            if order == 'RGB':
+                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+            return encoder.encode(image, ext)
+        
+        with ShardWriter(shard_dir, max_shard_bytes) as writer, ThreadPoolExecutor(max_workers=threads) as pool:
+            in_flight = deque()  # (sample id, ext, bboxes, class_labels, encode future), in order
+            
+            def append(entry):
+                sample_id, ext, bboxes, class_labels, future = entry
+                encoded = future.result()
+                if encoded is None:
+                    return 0
+                writer.add(sample_id, encoded, ext, bboxes, class_labels)
+                return 1
             
-            # Generate augmentations
+            for img_file, image, bboxes, class_labels in _prefetch_map(decode, image_files, depth, threads):
+                ext = encoder.extension(os.path.splitext(img_file)[1])
+                for aug_idx in range(augs_per_image):
+                    current += 1
+                    if image is not None:
+                        seed = derive_sample_seed(run_seed, img_file, aug_idx)
+                        aug_img, aug_bboxes, aug_classes = self.pipeline.run_on_image(
+                            image, bboxes, class_labels, seed=seed, channel_order=order)
+                        sample_id = os.path.splitext(_output_names(img_file, aug_idx, run_seed)[0])[0]
+                        in_flight.append((sample_id, ext, aug_bboxes, aug_classes, pool.submit(encode, aug_img, ext)))
+                        while len(in_flight) > depth:
+                            written += append(in_flight.popleft())
+                    if progress_callback:
+                        progress_callback(current, total, f"Augmenting {img_file}")
+            
+            while in_flight:
+                written += append(in_flight.popleft())
+        
+        self.last_run_stats = {'written': written, 'output': encoder.summary()}
+        return written
+
+    def iter_augmented(self, images_dir, labels_dir, prefetch=8, decode_workers=4, seed=None, channel_order='RGB'):
+        """Lazily yield augmented samples without writing anything to disk.
+
+        Sources are decoded ahead of time by a background thread pool with
+        at most `prefetch` images buffered; augmentation runs in the consuming
+        thread as samples are requested. Samples are seeded exactly like
+        augment_dataset, so a seeded stream matches the files it would write.
+
+        Args:
+            images_dir: Directory of source images (aug_* files are skipped)
+            labels_dir: Directory of YOLO label files
+            prefetch: Maximum number of decoded sources held in memory
+            decode_workers: Number of decode threads
+            seed: Run seed (defaults to pipeline.seed, random if unset)
+            channel_order: 'RGB' or 'BGR' for the yielded images. Samples are
+                generated in the pipeline's native order like augment_dataset
+                and converted only if that differs.
+
+        Yields:
+            tuple: (image ndarray, bboxes, class_labels) per augmentation
+        """
+        run_seed = int(seed) if seed is not None else self._resolve_run_seed()
+        image_files = list_source_images(images_dir)
+        order = self.pipeline.native_channel_order()
+        label_store = self._label_store_for(labels_dir)
+        
+        def decode(img_file):
+            label_path = os.path.join(labels_dir, os.path.splitext(img_file)[0] + '.txt')
+            return (img_file,) + _load_source(os.path.join(images_dir, img_file), label_path, order, label_store)
+        
+        for img_file, image, bboxes, class_labels in _prefetch_map(decode, image_files, prefetch, decode_workers):
+            if image is None:
+                continue
             for aug_idx in range(self.pipeline.augmentations_per_image):
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-                base_name = os.path.splitext(img_file)[0]
-                ext = os.path.splitext(img_file)[1]
-                
-                aug_img_name = f"aug_{aug_idx}_{timestamp}_{base_name}{ext}"
-                aug_label_name = f"aug_{aug_idx}_{timestamp}_{base_name}.txt"
-                
-                aug_img_path = os.path.join(output_images_dir, aug_img_name)
-                aug_label_path = os.path.join(output_labels_dir, aug_label_name)
-                
-                # Run Pipeline
-                aug_img, aug_bboxes, aug_classes = self.pipeline.run_on_image(image, bboxes, class_labels)
-                
-                # Save results
-                final_img = cv2.cvtColor(aug_img, cv2.COLOR_RGB2BGR)
-                cv2.imwrite(aug_img_path, final_img)
-                
-                with open(aug_label_path, 'w') as f:
-                    for bbox, class_id in zip(aug_bboxes, aug_classes):
-                        cx, cy, w, h = bbox
-                        f.write(f"{int(class_id)} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}\n")
-                
-                augmented_count += 1
-                
-                if progress_callback:
-                    current = idx * self.pipeline.augmentations_per_image + aug_idx + 1
-                    total = total_images * self.pipeline.augmentations_per_image
-                    progress_callback(current, total, f"Augmenting {img_file}")
-                    
-        return augmented_count
+                sample_seed = derive_sample_seed(run_seed, img_file, aug_idx)
+                aug_img, aug_bboxes, aug_classes = self.pipeline.run_on_image(image, bboxes, class_labels,
+                                                                              seed=sample_seed, channel_order=order)
+                if channel_order != order:
+                    aug_img = cv2.cvtColor(aug_img, cv2.COLOR_BGR2RGB)
+                yield aug_img, aug_bboxes, aug_classes
 
-    def preview_augmentation(self, image_path, label_path):
-        """Preview helper."""
-        image = cv2.imread(image_path)
+    def preview_augmentation(self, image_path, label_path, with_source=False):
+        """Preview helper.
+
+        with_source also returns the decoded source (RGB) first, so a view
+        can show it next to the result without decoding the file again.
+        """
+        order = self.pipeline.native_channel_order()
+        image, bboxes, class_labels = _load_source(image_path, label_path, order)
         if image is None: return None
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        bboxes = []
-        class_labels = []
-        
-        if os.path.exists(label_path):
-            with open(label_path, 'r') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) >= 5:
-                        class_id = int(float(parts[0]))
-                        cx, cy, w, h = map(float, parts[1:5])
-                        bboxes.append([cx, cy, w, h])
-                        class_labels.append(class_id)
                         
-        aug_img, aug_bboxes, aug_classes = self.pipeline.run_on_image(image, bboxes, class_labels)
+        aug_img, aug_bboxes, aug_classes = self.pipeline.run_on_image(image, bboxes, class_labels,
+                                                                      channel_order=order)
+        if order == 'BGR':
+            aug_img = cv2.cvtColor(aug_img, cv2.COLOR_BGR2RGB)
+        if with_source:
+            source = cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if order == 'BGR' else image
+            return source, aug_img, aug_bboxes, aug_classes
+        return aug_img, aug_bboxes, aug_classes
+
+    def generate_sample(self, image_path, label_path, aug_idx, seed=None):
+        """Regenerate one sample of a seeded run on demand.
+
+        Args:
+            image_path: Source image path
+            label_path: Source YOLO label path
+            aug_idx: Augmentation index of the sample
+            seed: Run seed (defaults to pipeline.seed)
+
+        Returns:
+            tuple: (image RGB, bboxes, class_labels) or None if unreadable
+        """
+        run_seed = seed if seed is not None else self.pipeline.seed
+        if run_seed is None:
+            raise ValueError("generate_sample requires a seed (pipeline.seed is not set)")
+        
+        # Same channel order as augment_dataset, so the result matches its file
+        order = self.pipeline.native_channel_order()
+        image, bboxes, class_labels = _load_source(image_path, label_path, order)
+        if image is None: return None
+        
+        sample_seed = derive_sample_seed(run_seed, os.path.basename(image_path), aug_idx)
+        aug_img, aug_bboxes, aug_classes = self.pipeline.run_on_image(image, bboxes, class_labels, seed=sample_seed,
+                                                                      channel_order=order)
+        if order == 'BGR':
+            aug_img = cv2.cvtColor(aug_img, cv2.COLOR_BGR2RGB)
         return aug_img, aug_bboxes, aug_classes
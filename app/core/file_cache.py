@@ -0,0 +1,96 @@
+"""
+Helpers shared by the on-disk caches (thumbnails, SAM embeddings).
+"""
+
+import hashlib
+import os
+import threading
+
+
+class ContentHasher:
+    """
+    Content hashes of files, recomputed only when a file's mtime or size changes.
+
+    Caches name their entries after the hash, so renamed or copied files
+    share an entry and edited ones get a new one.
+    """
+
+    def __init__(self):
+        self._digests = {}  # path -> ((mtime_ns, size), hash)
+        self._lock = threading.Lock()
+
+    def known_digest(self, path):
+        """digest(path) if it is already known for the file's current mtime and size, else None.
+
+        Only stats the file, never reads it.
+
+        Raises:
+            OSError: If the file can't be stat'ed
+        """
+        return self._known(path, self._stat(path))
+
+    def digest(self, path):
+        """Hex blake2b-128 of the file's content.
+
+        Raises:
+            OSError: If the file can't be read
+        """
+        stat = self._stat(path)
+        known = self._known(path, stat)
+        if known is not None:
+            return known
+
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock:
+            self._digests[path] = (stat, digest)
+        return digest
+
+    @staticmethod
+    def _stat(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _known(self, path, stat):
+        with self._lock:
+            known = self._digests.get(path)
+        return known[1] if known is not None and known[0] == stat else None
+
+
+def directory_size(directory, suffix):
+    """Total bytes of the files in directory ending with suffix."""
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(suffix))
+
+
+def evict_least_recent(directory, suffix, max_bytes):
+    """Delete the oldest (by mtime) files ending with suffix until the rest fits in max_bytes.
+
+    Callers bump a file's mtime (os.utime) when they use it, so this
+    evicts the least recently used files first.
+
+    Returns:
+        int: Bytes of the files left
+    """
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(suffix):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    return total
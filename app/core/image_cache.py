@@ -0,0 +1,219 @@
+"""
+Decoded-image cache for the labeling views.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+
+def image_nbytes(image):
+    """Approximate memory of a decoded PIL image."""
+    return image.width * image.height * len(image.getbands())
+
+
+class ImageCache:
+    """
+    LRU cache of decoded images, bounded by their memory, with a prefetcher.
+
+    get() returns the decoded image of a path, decoding it on the calling
+    thread on a miss. prefetch() hands the images likely to be shown next
+    (the neighbours in the navigation order) to a daemon thread that
+    decodes them ahead of time, so stepping through a dataset is served
+    from memory. Entries are keyed on the file's mtime and size, so an
+    image changed on disk is decoded again.
+
+    Views that only display an image can ask for a draft of it instead
+    (display_size): JPEGs are then decoded directly at a reduced scale
+    (1/2, 1/4 or 1/8 in the DCT domain) that still covers display_size,
+    which is several times faster than a full decode and a resize.
+
+    Cached images are shared: callers must not modify them in place.
+    """
+
+    MAX_BYTES = 512 * 2**20
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        """
+        Args:
+            max_bytes: Memory cap of the decoded images kept
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+
+        self._images = OrderedDict()  # (path, display size) -> (stat key, image, full size)
+        self._bytes = 0
+        self._loading = {}  # (path, display size) -> Event set once its decode finishes
+        self._queue = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def get(self, path):
+        """Decoded (loaded) image of path.
+
+        Raises:
+            OSError: If the file can't be opened or decoded
+        """
+        return self._get((path, None))[0]
+
+    def get_draft(self, path, display_size):
+        """Image of path decoded at a reduced scale still covering display_size.
+
+        Args:
+            display_size: (width, height) the image will be shown in; None
+                (or a format without draft support) decodes it in full
+
+        Returns:
+            tuple: (image, (width, height) of the full-resolution image)
+        """
+        return self._get((path, tuple(display_size) if display_size else None))
+
+    def prefetch(self, paths, display_size=None):
+        """Decode paths in the background, in order, replacing earlier prefetch requests.
+
+        Args:
+            display_size: Prefetch drafts for get_draft instead of full images
+        """
+        display_size = tuple(display_size) if display_size else None
+        with self._lock:
+            self._queue = [(path, display_size) for path in paths]
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def invalidate(self, path):
+        """Drop path, full image and drafts (e.g. after deleting the image)."""
+        with self._lock:
+            for item in [item for item in self._images if item[0] == path]:
+                self._bytes -= image_nbytes(self._images.pop(item)[1])
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "prefetched": self.prefetched,
+                "images": len(self._images),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # --- Internals ---
+
+    def _get(self, item):
+        key = self._stat_key(item[0])
+        while True:
+            with self._lock:
+                entry = self._images.get(item)
+                if entry is not None and entry[0] == key:
+                    self._images.move_to_end(item)
+                    self.hits += 1
+                    return entry[1], entry[2]
+                loading = self._loading.get(item)
+                if loading is None:
+                    self.misses += 1
+                    self._loading[item] = threading.Event()
+                    break
+            # The prefetcher is decoding it right now: wait for that instead of decoding twice
+            loading.wait()
+
+        try:
+            image, full_size = self._decode(*item)
+            self._store(item, key, image, full_size)
+            return image, full_size
+        finally:
+            self._finish(item)
+
+    @staticmethod
+    def _stat_key(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    def _decode(path, display_size=None):
+        image = Image.open(path)
+        full_size = image.size
+        if display_size:
+            # No-op for formats other than JPEG
+            image.draft(image.mode, display_size)
+        image.load()
+        return image, full_size
+
+    def _store(self, item, key, image, full_size):
+        with self._lock:
+            old = self._images.pop(item, None)
+            if old is not None:
+                self._bytes -= image_nbytes(old[1])
+            self._images[item] = (key, image, full_size)
+            self._bytes += image_nbytes(image)
+            self._evict()
+
+    def _evict(self):
+        # Least recently used first; the newest image is kept even if it alone exceeds the cap
+        while self._bytes > self.max_bytes and len(self._images) > 1:
+            _, (_, image, _) = self._images.popitem(last=False)
+            self._bytes -= image_nbytes(image)
+
+    def _finish(self, item):
+        with self._lock:
+            loading = self._loading.pop(item, None)
+        if loading is not None:
+            loading.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        break
+                    item = self._queue.pop(0)
+                    if item in self._loading:
+                        continue
+                    key = self._stat_key(item[0])
+                    entry = self._images.get(item)
+                    if key is None or (entry is not None and entry[0] == key):
+                        continue
+                    self._loading[item] = threading.Event()
+                try:
+                    self._store(item, key, *self._decode(*item))
+                    with self._lock:
+                        self.prefetched += 1
+                except Exception as e:
+                    print(f"Prefetch failed for {item[0]}: {e}")
+                finally:
+                    self._finish(item)
+
+
+_project_caches = {}
+
+def get_project_image_cache(project_path, max_bytes=None):
+    """Shared ImageCache of a project, created on first use.
+
+    Args:
+        max_bytes: New memory cap, if given
+    """
+    cache = _project_caches.get(project_path)
+    if cache is None:
+        cache = _project_caches[project_path] = ImageCache()
+    if max_bytes is not None and max_bytes != cache.max_bytes:
+        cache.set_max_bytes(max_bytes)
+    return cache
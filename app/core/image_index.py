@@ -0,0 +1,192 @@
+"""
+Background index of a project's images and their label class.
+
+Keeps, per image in data/images, the class of its first box (as the
+labeling views group images) and keeps it current by diffing directory
+listings and label file mtimes on a background thread, so the UI never
+scans the dataset itself and only receives the rows that changed.
+"""
+
+import os
+import threading
+import time
+
+from app.core.label_store import get_project_label_store
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Class of an image without labels (or with an empty label file)
+NEGATIVE = -1
+
+
+class ImageIndex:
+    """
+    {image path: class id of its first box, or NEGATIVE} of one project.
+
+    The first scan and all later rescans run on a daemon thread; rescans
+    happen every poll_interval seconds or when rescan() is called, and
+    reparse only label files whose mtime or size changed (LabelStore).
+    The index shares the project's LabelStore with the UI, so its own
+    saves are never reparsed, and compacts the store's journal off the
+    UI thread. On large trees the poll interval grows to SCAN_BACKOFF
+    times the duration of the last scan, so polling stays a small share
+    of the CPU; the image directory is only listed again once its mtime
+    changes.
+    Subscribers get lists of (img_path, old, new) changes, where old or
+    new is None for an image that appeared or disappeared. Callbacks are
+    called from the index thread, so Tk code must hand them to after().
+    """
+
+    POLL_INTERVAL = 2.0
+    SCAN_BACKOFF = 20
+
+    def __init__(self, project_path, poll_interval=POLL_INTERVAL):
+        self.project_path = project_path
+        self.images_dir = os.path.join(project_path, "data", "images")
+        self.poll_interval = poll_interval
+
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._classes = {}
+        self._touched = set()
+        self._subscribers = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listing = (None, {})  # images dir mtime_ns -> {img_path: stem}
+
+    def start(self):
+        """Start the index thread (first scan included); no-op if running."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def rescan(self):
+        """Ask the index thread for a rescan now instead of at the next poll."""
+        self._wake.set()
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def snapshot(self):
+        """Copy of the current {img_path: class id or NEGATIVE}, sorted by file name."""
+        with self._lock:
+            return dict(sorted(self._classes.items(), key=lambda item: os.path.basename(item[0])))
+
+    # --- Updates the UI already knows about ---
+
+    def set_class(self, img_path, class_id):
+        """Record a label change made in-process (e.g. a save) without waiting for a rescan.
+
+        Args:
+            class_id: Class of the image's first box, or NEGATIVE
+
+        Returns:
+            list: The resulting changes, [] if nothing changed. They are
+                returned rather than sent to subscribers.
+        """
+        return self._update(img_path, class_id)
+
+    def discard(self, img_path):
+        """Record that an image was deleted in-process.
+
+        Returns:
+            list: The resulting changes, like set_class
+        """
+        return self._update(img_path, None)
+
+    def _update(self, img_path, class_id):
+        with self._lock:
+            self._touched.add(img_path)
+            old = self._classes.get(img_path)
+            if old == class_id:
+                return []
+            if class_id is None:
+                del self._classes[img_path]
+            else:
+                self._classes[img_path] = class_id
+        return [(img_path, old, class_id)]
+
+    # --- Index thread ---
+
+    def _run(self):
+        label_store = None
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                if label_store is None:
+                    label_store = get_project_label_store(self.project_path)
+                self._scan(label_store)
+            except OSError as e:
+                print(f"Image index scan failed: {e}")
+            self.ready.set()
+            elapsed = time.monotonic() - started
+            self._wake.wait(max(self.poll_interval, elapsed * self.SCAN_BACKOFF))
+            self._wake.clear()
+
+    def _scan(self, label_store):
+        with self._lock:
+            self._touched.clear()
+
+        label_store.sync()  # Also compacts its journal when due
+        first_classes = label_store.first_classes()
+        current = {path: first_classes.get(stem, NEGATIVE) for path, stem in self._list_images().items()}
+
+        with self._lock:
+            # Leave images changed in-process during this scan to the next one
+            changes = [(path, self._classes.get(path), current.get(path))
+                       for path in set(current) | set(self._classes)
+                       if path not in self._touched and self._classes.get(path) != current.get(path)]
+            for path, _, new in changes:
+                if new is None:
+                    del self._classes[path]
+                else:
+                    self._classes[path] = new
+            subscribers = list(self._subscribers)
+
+        if changes:
+            changes.sort(key=lambda change: os.path.basename(change[0]))
+            for callback in subscribers:
+                callback(changes)
+
+    def _list_images(self):
+        """{img_path: stem} of data/images, listed again only when the directory changed."""
+        try:
+            mtime = os.stat(self.images_dir).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        # A coarse mtime may not tick for changes made right after listing
+        if mtime == self._listing[0] and time.time_ns() - mtime > 2 * 10**9:
+            return self._listing[1]
+
+        images = {}
+        with os.scandir(self.images_dir) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    images[os.path.join(self.images_dir, entry.name)] = os.path.splitext(entry.name)[0]
+        self._listing = (mtime, images)
+        return images
+
+
+_project_indexes = {}
+
+def get_project_image_index(project_path):
+    """Shared, running ImageIndex of a project, created on first use."""
+    index = _project_indexes.get(project_path)
+    if index is None:
+        index = _project_indexes[project_path] = ImageIndex(project_path)
+    index.start()
+    return index
@@ -0,0 +1,162 @@
+"""
+Multi-resolution tiles for zoomable image views.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+
+class ImagePyramid:
+    """
+    Power-of-two pyramid of one image with an LRU cache of tiles.
+
+    Level k is the image reduced by 2**k (box filter), each level built
+    from the one before it on a background thread, coarsest last. A
+    view renders from the coarsest built level that is still at least as
+    detailed as the display, composing only the tiles it can see, so
+    zoomed-out redraws never resample the full-resolution image.
+    """
+
+    TILE_SIZE = 512
+    CACHE_TILES = 96  # ~72 MB of RGB tiles
+    # Modes Image.reduce() can't handle, and what every level (0 included) uses instead
+    REDUCE_MODES = {'1': 'L', 'P': 'RGB', 'PA': 'RGBA', 'I;16': 'I', 'I;16L': 'I', 'I;16B': 'I', 'I;16N': 'I'}
+
+    def __init__(self, image, on_level=None, tile_size=TILE_SIZE, cache_tiles=CACHE_TILES):
+        """
+        Args:
+            image: PIL image (level 0, loaded here; converted if its
+                mode is in REDUCE_MODES)
+            on_level: Called with (pyramid, level) from the build thread
+                each time a level becomes available
+            tile_size: Tile edge in pixels
+            cache_tiles: Number of tiles kept in the cache
+        """
+        image.load()
+        # Tiles of these modes would also lose their palette when pasted
+        # into a new region image
+        image = self._reducible(image)
+        self.size = image.size
+        self.tile_size = tile_size
+        self.cache_tiles = cache_tiles
+        self.on_level = on_level
+
+        # Down to the first level that fits in a single tile
+        self.max_level = max(0, math.ceil(math.log2(max(self.size) / tile_size))) if max(self.size) > tile_size else 0
+
+        self._levels = [image]
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def _reducible(cls, image):
+        """image in a mode Image.reduce() handles."""
+        if image.mode not in cls.REDUCE_MODES:
+            return image
+        mode = cls.REDUCE_MODES[image.mode]
+        if image.mode == 'P' and 'transparency' in image.info:
+            mode = 'RGBA'
+        return image.convert(mode)
+
+    def start(self):
+        """Build the lower-resolution levels in the background."""
+        if self.max_level and self._thread is None:
+            self._thread = threading.Thread(target=self._build, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop building (e.g. when another image is shown) and drop the tiles."""
+        self._stop.set()
+        with self._lock:
+            self._tiles.clear()
+
+    def _build(self):
+        for level in range(1, self.max_level + 1):
+            if self._stop.is_set():
+                return
+            with self._lock:
+                previous = self._levels[level - 1]
+            try:
+                reduced = previous.reduce(2)
+            except (ValueError, OSError) as e:
+                # Views keep rendering from the levels built so far
+                print(f"Image pyramid stopped at level {level - 1}: {e}")
+                return
+            with self._lock:
+                self._levels.append(reduced)
+            if self.on_level and not self._stop.is_set():
+                self.on_level(self, level)
+
+    @property
+    def built_levels(self):
+        with self._lock:
+            return len(self._levels)
+
+    @staticmethod
+    def ideal_level(scale):
+        """Coarsest level still at least as detailed as the display at scale."""
+        return max(0, int(math.floor(math.log2(1.0 / scale)))) if scale < 1.0 else 0
+
+    def level_for_scale(self, scale):
+        """Level to render scale from, among the levels built so far."""
+        return min(self.ideal_level(scale), self.built_levels - 1)
+
+    def tile(self, level, tile_x, tile_y):
+        """One tile of a level, from the cache if possible."""
+        key = (level, tile_x, tile_y)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                return tile
+            source = self._levels[level]
+
+        t = self.tile_size
+        box = (tile_x * t, tile_y * t, min((tile_x + 1) * t, source.width), min((tile_y + 1) * t, source.height))
+        tile = source.crop(box)
+        tile.load()
+        with self._lock:
+            self._tiles[key] = tile
+            while len(self._tiles) > self.cache_tiles:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def render(self, scale, x1, y1, x2, y2):
+        """Region (x1, y1)-(x2, y2) of the full image (integer pixel bounds) at display scale.
+
+        Returns:
+            PIL.Image: ((x2 - x1) * scale, (y2 - y1) * scale) image
+        """
+        level = self.level_for_scale(scale)
+        factor = 2 ** level
+        with self._lock:
+            level_w, level_h = self._levels[level].size
+            mode = self._levels[level].mode
+        t = self.tile_size
+
+        # Level pixels covering the region, snapped outwards
+        lx1, ly1 = int(x1 / factor), int(y1 / factor)
+        lx2, ly2 = min(level_w, math.ceil(x2 / factor)), min(level_h, math.ceil(y2 / factor))
+        tiles_x = range(lx1 // t, max(lx1, lx2 - 1) // t + 1)
+        tiles_y = range(ly1 // t, max(ly1, ly2 - 1) // t + 1)
+
+        if len(tiles_x) == 1 and len(tiles_y) == 1:
+            region = self.tile(level, tiles_x[0], tiles_y[0])
+            origin_x, origin_y = tiles_x[0] * t, tiles_y[0] * t
+        else:
+            region = Image.new(mode, (lx2 - lx1, ly2 - ly1))
+            for ty in tiles_y:
+                for tx in tiles_x:
+                    region.paste(self.tile(level, tx, ty), (tx * t - lx1, ty * t - ly1))
+            origin_x, origin_y = lx1, ly1
+
+        target = (max(1, int((x2 - x1) * scale)), max(1, int((y2 - y1) * scale)))
+        box = (x1 / factor - origin_x, y1 / factor - origin_y, x2 / factor - origin_x, y2 / factor - origin_y)
+        # NEAREST for speed/sharpness when zoomed inside
+        resample = Image.Resampling.NEAREST if scale >= 1.0 else Image.Resampling.BILINEAR
+        return region.resize(target, resample, box=box)
@@ -0,0 +1,264 @@
+"""
+Reading and writing YOLO label files.
+
+Labels are handled as (N, 5) arrays of class_id, cx, cy, w, h rows.
+Typical files (up to SMALL_FILE_LINES rows) are split and converted in
+one pass; larger files and whole batches of files go to numpy's C
+reader, whose fixed setup cost only pays off there. Writing formats all
+rows with a single string operation instead of a Python loop per box.
+
+Callers that work on (bboxes, class_labels) lists (the augmentation
+pipeline) use the *_lists functions, which keep small files in plain
+Python: for a handful of boxes the round trip through an array costs
+more than the parse itself.
+"""
+
+import math
+from itertools import repeat
+
+import numpy as np
+
+
+LABEL_WIDTH = 5
+
+ROW_FORMAT = "%d %.6f %.6f %.6f %.6f\n"
+
+# Files up to this many lines skip np.loadtxt (its setup outweighs the parse)
+SMALL_FILE_LINES = 64
+
+
+class LabelFormatError(ValueError):
+    """A label file that does not hold valid YOLO rows."""
+
+
+def empty_labels(dtype=np.float32):
+    """(0, 5) label array."""
+    return np.zeros((0, LABEL_WIDTH), dtype=dtype)
+
+
+def parse_labels(text, strict=False, dtype=np.float32, source=None):
+    """Parse the contents of a YOLO label file.
+
+    Args:
+        text: File contents
+        strict: Raise LabelFormatError on any malformed row instead of
+            skipping it. Rows must have exactly 5 numeric fields, a
+            non-negative integer class id and finite coordinates. In
+            lenient mode class ids are truncated to integers like
+            int(float(x)) (so "0.0" is class 0) and only rows that aren't
+            numeric or finite are skipped.
+        dtype: Array dtype. float64 keeps the written values exactly
+            (float32 may move a box touching the border just outside it).
+        source: Path used in error messages
+
+    Returns:
+        np.ndarray: (N, 5) rows of class_id, cx, cy, w, h
+    """
+    lines = text.splitlines()
+    values = _split_rows(text, lines) if len(lines) <= SMALL_FILE_LINES else None
+    if values is not None:
+        return values.astype(dtype, copy=False)
+
+    values = _load_rows(lines)
+    if values is None:
+        # Slow path: find (or skip) the offending lines one by one
+        values = _parse_rows(lines, strict, source)
+
+    bad = _invalid_rows(values, strict)
+    if bad is not None:
+        if strict:
+            row = int(np.flatnonzero(bad)[0])
+            raise LabelFormatError(f"{source or 'labels'}: invalid row {row + 1}: {values[row].tolist()}")
+        values = values[~bad]
+    if not strict:
+        values[:, 0] = np.trunc(values[:, 0])
+    return values.astype(dtype, copy=False)
+
+
+def parse_lists(text):
+    """(bboxes, class_labels) lists of a label file's contents.
+
+    Same result as to_lists(parse_labels(text, dtype=np.float64)). Small
+    files of well-formed rows go line by line straight into the lists;
+    anything else (or any line that isn't exactly 5 numbers) takes the
+    array path.
+    """
+    if text.count('\n') < SMALL_FILE_LINES and 'n' not in text and 'N' not in text:
+        bboxes = []
+        class_labels = []
+        try:
+            for line in text.splitlines():
+                class_id, cx, cy, w, h = map(float, line.split())
+                bboxes.append([cx, cy, w, h])
+                class_labels.append(int(class_id))
+            return bboxes, class_labels
+        except ValueError:
+            pass
+    return to_lists(parse_labels(text, dtype=np.float64))
+
+
+def _split_rows(text, lines):
+    """All rows from one str.split of the text, or None unless every row is valid as is.
+
+    A line with 4 spaces has at most 5 fields, so with 5 per line in total
+    each has exactly 5 and the flat list splits into rows by count. These
+    plain string scans (plus class ids all digits, no "nan"/"inf") are
+    cheaper than the numpy checks for a handful of rows; blank lines,
+    tabs, runs of spaces and the like are left to the general path.
+    """
+    fields = text.split()
+    if (len(fields) != LABEL_WIDTH * len(lines) or 'n' in text or 'N' in text
+            or set(map(str.count, lines, repeat(' '))) != {LABEL_WIDTH - 1}
+            or not "".join(fields[::LABEL_WIDTH]).isdigit()):
+        return None
+    try:
+        return np.fromiter(map(float, fields), np.float64, len(fields)).reshape(-1, LABEL_WIDTH)
+    except ValueError:
+        return None
+
+
+def _load_rows(lines):
+    """All rows via np.loadtxt, or None if any line isn't 5 numbers."""
+    if not "".join(lines).strip():
+        return empty_labels(np.float64)
+    try:
+        values = np.loadtxt(lines, dtype=np.float64, comments=None, ndmin=2)
+    except ValueError:
+        return None
+    if values.size == 0:
+        return empty_labels(np.float64)
+    return values if values.shape[1] == LABEL_WIDTH else None
+
+
+def _parse_rows(lines, strict, source):
+    parsed = []
+    for i, row in enumerate(line.split() for line in lines):
+        if not row:
+            continue
+        try:
+            if len(row) < LABEL_WIDTH or (strict and len(row) != LABEL_WIDTH):
+                raise ValueError(f"expected {LABEL_WIDTH} fields, got {len(row)}")
+            parsed.append([float(v) for v in row[:LABEL_WIDTH]])
+        except ValueError as e:
+            if strict:
+                raise LabelFormatError(f"{source or 'labels'}: invalid line {i + 1}: {e}") from None
+    return np.array(parsed, dtype=np.float64).reshape(-1, LABEL_WIDTH)
+
+
+def _invalid_rows(values, strict=False):
+    """Mask of the rows to reject, None if all are valid.
+
+    Rows with non-finite values are always invalid; strict also rejects
+    negative or fractional class ids.
+    """
+    if not strict:
+        if math.isfinite(values.sum()):
+            return None
+        return ~np.isfinite(values).all(axis=1)
+    classes = values[:, 0]
+    if np.isfinite(values).all() and classes.min(initial=0) >= 0 and (classes == np.floor(classes)).all():
+        return None
+    return ~np.isfinite(values).all(axis=1) | (classes < 0) | (classes != np.floor(classes))
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def read_labels(path, strict=False, dtype=np.float32):
+    """Labels of one YOLO .txt file; a missing file has none.
+
+    Returns:
+        np.ndarray: (N, 5) rows of class_id, cx, cy, w, h
+    """
+    return parse_labels(_read_text(path), strict=strict, dtype=dtype, source=path)
+
+
+def read_label_files(paths, strict=False, dtype=np.float32):
+    """Labels of many .txt files as one array.
+
+    All files go through a single np.loadtxt call; only if that batch
+    holds a malformed row are the files parsed one by one. In lenient mode
+    a file that can't be read counts as empty (and is reported), so one
+    broken file doesn't stop a whole scan.
+
+    Returns:
+        tuple: (labels, offsets) - (M, 5) rows of all files, and int64
+            offsets (len(paths) + 1,); rows of paths[i] are
+            labels[offsets[i]:offsets[i + 1]]
+    """
+    texts = []
+    for path in paths:
+        try:
+            texts.append(_read_text(path))
+        except (OSError, UnicodeDecodeError) as e:
+            if strict:
+                raise
+            print(f"Error reading labels {path}: {e}")
+            texts.append("")
+
+    file_lines = [text.splitlines() for text in texts]
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum([len(lines) - lines.count("") for lines in file_lines], out=offsets[1:])
+
+    values = _load_rows([line for lines in file_lines for line in lines])
+    if values is not None and len(values) == offsets[-1] and _invalid_rows(values, strict) is None:
+        if not strict:
+            values[:, 0] = np.trunc(values[:, 0])
+        return values.astype(dtype, copy=False), offsets
+
+    parts = [parse_labels(text, strict=strict, dtype=dtype, source=path) for text, path in zip(texts, paths)]
+    np.cumsum([len(part) for part in parts], out=offsets[1:])
+    return (np.concatenate(parts) if parts else empty_labels(dtype)), offsets
+
+
+def read_label_lists(path):
+    """(bboxes, class_labels) lists of one YOLO .txt file; a missing file has none."""
+    return parse_lists(_read_text(path))
+
+
+def format_labels(labels):
+    """YOLO text of (N, 5) rows, one "class cx cy w h" line per box with 6 decimals."""
+    if not (isinstance(labels, np.ndarray) and labels.ndim == 2 and labels.dtype == np.float64):
+        labels = np.asarray(labels, dtype=np.float64).reshape(-1, LABEL_WIDTH)
+    return (ROW_FORMAT * len(labels)) % tuple(labels.ravel().tolist())
+
+
+def write_labels(path, labels):
+    """Write (N, 5) rows to a YOLO .txt file in one write."""
+    with open(path, 'w') as f:
+        f.write(format_labels(labels))
+
+
+def format_lists(bboxes, class_labels):
+    """YOLO text of (bboxes, class_labels) lists, as format_labels(to_array(...)) gives it."""
+    if len(bboxes) > SMALL_FILE_LINES:
+        return format_labels(to_array(bboxes, class_labels, np.float64))
+    return (ROW_FORMAT * len(bboxes)) % tuple(
+        [value for bbox, class_id in zip(bboxes, class_labels) for value in (class_id, *bbox)])
+
+
+def write_label_lists(path, bboxes, class_labels):
+    """Write (bboxes, class_labels) lists to a YOLO .txt file in one write."""
+    with open(path, 'w') as f:
+        f.write(format_lists(bboxes, class_labels))
+
+
+def to_array(bboxes, class_labels, dtype=np.float32):
+    """(N, 5) rows from the (bboxes, class_labels) lists the pipeline and UI use."""
+    if len(bboxes) == 0:
+        return empty_labels(dtype)
+    labels = np.empty((len(bboxes), LABEL_WIDTH), dtype=dtype)
+    labels[:, 0] = class_labels
+    labels[:, 1:] = bboxes
+    return labels
+
+
+def to_lists(labels):
+    """(bboxes, class_labels) lists from (N, 5) rows, as Albumentations takes them."""
+    labels = np.asarray(labels).reshape(-1, LABEL_WIDTH)
+    return labels[:, 1:].tolist(), labels[:, 0].astype(np.int64).tolist()
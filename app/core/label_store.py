@@ -0,0 +1,507 @@
+"""
+Columnar, memory-mapped store of a project's YOLO labels.
+
+The .txt files in data/labels stay the source of truth (training and
+external tools read them); the store mirrors them as one structured array
+so every label of a project can be read with a single mmap.
+"""
+
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from app.core.label_io import read_label_files, read_labels, to_array, write_labels
+
+
+LABEL_DTYPE = np.dtype([
+    ('image_id', '<i4'),
+    ('class_id', '<i4'),
+    # float64 so values read back exactly as parsed from the .txt
+    ('cx', '<f8'),
+    ('cy', '<f8'),
+    ('w', '<f8'),
+    ('h', '<f8'),
+])
+
+_ARRAY_NAME = re.compile(r"^(boxes|offsets)-(\d+)\.npy$")
+
+
+class LabelStoreError(OSError):
+    """A label store on disk that can't be opened."""
+
+
+def _to_rows(labels):
+    """LABEL_DTYPE rows (image_id left 0) from an (N, 5) label array."""
+    labels = np.asarray(labels, dtype=np.float64).reshape(-1, 5)
+    rows = np.zeros(len(labels), dtype=LABEL_DTYPE)
+    rows['class_id'] = labels[:, 0]
+    rows['cx'], rows['cy'], rows['w'], rows['h'] = labels[:, 1:5].T
+    return rows
+
+
+def _to_labels(rows):
+    """(N, 5) label array of LABEL_DTYPE rows."""
+    return np.stack([rows['class_id'], rows['cx'], rows['cy'], rows['w'], rows['h']], axis=1).astype(np.float64)
+
+
+class LabelStore:
+    """
+    Mirror of a labels directory as one structured array plus a journal.
+
+    Layout of store_dir:
+        index.json: version, generation, and per image (by stem) of the
+            arrays: mtime_ns and size of its .txt when mirrored
+        boxes-<gen>.npy: LABEL_DTYPE rows of all images, grouped by image
+        offsets-<gen>.npy: int64 (n_images + 1,); rows of image i are
+            boxes[offsets[i]:offsets[i + 1]]
+        journal.jsonl: One line per image changed since the arrays were
+            written: its stem, .txt stat (null once deleted) and rows
+        lock: Held while the files are read or written
+
+    put(), remove() and sync_file() only append a journal line and keep
+    the change in an in-memory overlay, so a save costs the same however
+    large the project is. compact() (run by the image index thread once
+    the journal holds COMPACT_THRESHOLD images, and by sync()) folds the
+    journal into a new generation of the arrays. Journal entries are
+    absolute, so replaying one twice is harmless.
+
+    Every instance (UI, index thread, worker processes) writes under the
+    same file lock and catches up on the others' changes before writing.
+    Arrays are written under a new, increasing generation number and
+    never replaced in place, so open memory maps stay valid; only
+    generations older than the previous one are deleted.
+    """
+
+    VERSION = 2
+    COMPACT_THRESHOLD = 1000
+
+    def __init__(self, labels_dir, store_dir, sync=True):
+        """
+        Args:
+            labels_dir: Directory of YOLO .txt files
+            store_dir: Directory for the store files (created if missing)
+            sync: Bring the store up to date with labels_dir right away.
+                False just opens what is on disk (e.g. in worker processes)
+                and raises LabelStoreError if that is unreadable, instead
+                of coming up empty.
+        """
+        self.labels_dir = labels_dir
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self._index_path = os.path.join(store_dir, "index.json")
+        self._journal_path = os.path.join(store_dir, "journal.jsonl")
+        self._lock_path = os.path.join(store_dir, "lock")
+
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._reset()
+        with self._locked():
+            self._catch_up(strict=not sync)
+        if sync:
+            self.sync()
+
+    @classmethod
+    def for_project(cls, project_path, sync=True):
+        """New store of a project's data/labels, kept in data/label_store.
+
+        Instances are thread-safe; the UI and the image index share one
+        through get_project_label_store.
+        """
+        return cls(os.path.join(project_path, "data", "labels"),
+                   os.path.join(project_path, "data", "label_store"), sync=sync)
+
+    # --- Persistence ---
+
+    @contextmanager
+    def _locked(self):
+        """This instance's lock plus, outermost, the store directory's file lock."""
+        with self._lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+
+            fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT)
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+                    if msvcrt:
+                        os.lseek(fd, 0, os.SEEK_SET)
+                        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(fd)  # Also releases flock
+
+    def _reset(self):
+        self._generation = None
+        self._index_stat = None
+        self._base_stems = []
+        self._base_stats = []
+        self._positions = {}
+        self.boxes = np.zeros(0, dtype=LABEL_DTYPE)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self._overlay = {}  # stem -> (rows, stat), stat None once deleted
+        self._journal_offset = 0
+
+    @staticmethod
+    def _file_stat(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _catch_up(self, strict=False):
+        """Pick up what other instances wrote since we last looked (under the lock)."""
+        index_stat = self._file_stat(self._index_path)
+        if index_stat != self._index_stat:
+            self._load_index(index_stat, strict)
+        if self._file_stat(self._journal_path) is None:
+            self._journal_offset = 0
+            return
+        if os.path.getsize(self._journal_path) < self._journal_offset:
+            # Rewritten by a compaction we haven't seen the index of yet
+            self._journal_offset = 0
+        self._replay_journal(strict)
+
+    def _load_index(self, index_stat, strict):
+        self._reset()
+        if index_stat is None:
+            return
+        try:
+            with open(self._index_path, 'r') as f:
+                index = json.load(f)
+            if index.get('version') != self.VERSION:
+                raise ValueError(f"version {index.get('version')}, expected {self.VERSION}")
+            generation = int(index['generation'])
+            boxes = np.load(os.path.join(self.store_dir, f"boxes-{generation}.npy"), mmap_mode='r')
+            offsets = np.load(os.path.join(self.store_dir, f"offsets-{generation}.npy"), mmap_mode='r')
+        except (OSError, ValueError, KeyError) as e:
+            if strict:
+                raise LabelStoreError(f"Label store {self.store_dir} is unreadable: {e}") from e
+            print(f"Rebuilding label store {self.store_dir}: {e}")
+            self._index_stat = index_stat  # Not again until it's rewritten
+            return
+
+        self._generation = generation
+        self._index_stat = index_stat
+        self._base_stems = index['stems']
+        self._base_stats = [tuple(stat) for stat in index['stats']]
+        self.boxes = boxes
+        self.offsets = offsets
+        self._positions = {stem: i for i, stem in enumerate(self._base_stems)}
+
+    def _replay_journal(self, strict):
+        try:
+            with open(self._journal_path, 'r') as f:
+                f.seek(self._journal_offset)
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # Being written
+                    entry = json.loads(line)
+                    stat = tuple(entry['stat']) if entry['stat'] is not None else None
+                    self._overlay[entry['stem']] = (_to_rows(entry['labels']), stat)
+                    self._journal_offset += len(line.encode('utf-8'))
+        except (OSError, ValueError, KeyError) as e:
+            if strict:
+                raise LabelStoreError(f"Label store journal {self._journal_path} is unreadable: {e}") from e
+            print(f"Ignoring the rest of label store journal {self._journal_path}: {e}")
+
+    def _record(self, changes):
+        """Journal and apply {stem: (rows, stat)} (under the lock)."""
+        if not changes:
+            return
+        self._catch_up()
+        lines = "".join(json.dumps({'stem': stem, 'stat': list(stat) if stat is not None else None,
+                                    'labels': _to_labels(rows).tolist()}) + "\n"
+                        for stem, (rows, stat) in changes.items())
+        with open(self._journal_path, 'a') as f:
+            if f.tell() > self._journal_offset:
+                f.truncate(self._journal_offset)  # Torn line of an interrupted write
+            f.write(lines)
+        self._journal_offset = os.path.getsize(self._journal_path)
+        self._overlay.update(changes)
+
+    def _write_generation(self, stems, stats, boxes, offsets, journal):
+        """Write new arrays, index and journal (under the lock), then drop old generations."""
+        names = [_ARRAY_NAME.match(name) for name in os.listdir(self.store_dir)]
+        generation = max([self._generation or 0] + [int(match.group(2)) for match in names if match]) + 1
+        np.save(os.path.join(self.store_dir, f"boxes-{generation}.npy"), boxes)
+        np.save(os.path.join(self.store_dir, f"offsets-{generation}.npy"), offsets)
+
+        with open(self._index_path + '.tmp', 'w') as f:
+            json.dump({'version': self.VERSION, 'generation': generation,
+                       'stems': stems, 'stats': [list(stat) for stat in stats]}, f)
+        os.replace(self._index_path + '.tmp', self._index_path)
+
+        # Entries written after the snapshot the arrays were built from
+        with open(self._journal_path + '.tmp', 'w') as f:
+            f.write("".join(json.dumps({'stem': stem, 'stat': list(stat) if stat is not None else None,
+                                        'labels': _to_labels(rows).tolist()}) + "\n"
+                            for stem, (rows, stat) in journal.items()))
+        os.replace(self._journal_path + '.tmp', self._journal_path)
+
+        # The previous generation may still be mapped by a reader that read
+        # the old index just before; anything older (or unversioned) can go
+        for name in os.listdir(self.store_dir):
+            match = _ARRAY_NAME.match(name)
+            if name.endswith('.npy') and (not match or int(match.group(2)) < generation - 1):
+                try:
+                    os.remove(os.path.join(self.store_dir, name))
+                except OSError:
+                    pass  # Still mapped somewhere (Windows); next time
+
+        self._index_stat = None
+        self._journal_offset = 0
+        self._catch_up()
+
+    @staticmethod
+    def _merged(base_stems, base_stats, boxes, offsets, overlay):
+        """(stems, stats, boxes, offsets) of the arrays with overlay folded in."""
+        kept = np.array([stem not in overlay for stem in base_stems], dtype=bool)
+        live = [(stem, rows, stat) for stem, (rows, stat) in overlay.items() if stat is not None]
+        stems = [stem for stem, keep in zip(base_stems, kept) if keep] + [stem for stem, _, _ in live]
+        stats = [stat for stat, keep in zip(base_stats, kept) if keep] + [stat for _, _, stat in live]
+
+        base_counts = np.diff(np.asarray(offsets))
+        counts = np.concatenate([base_counts[kept], [len(rows) for _, rows, _ in live]]).astype(np.int64)
+        rows = np.concatenate([np.asarray(boxes)[np.repeat(kept, base_counts)]] + [rows for _, rows, _ in live])
+
+        # Back in stem order; a stable sort keeps each image's rows in order
+        order = np.argsort(np.array(stems, dtype=object), kind='stable')
+        rank = np.empty(len(stems), dtype=np.int64)
+        rank[order] = np.arange(len(stems))
+        rows = rows[np.argsort(np.repeat(rank, counts), kind='stable')]
+        rows['image_id'] = np.repeat(np.arange(len(stems), dtype=np.int32), counts[order])
+
+        merged_offsets = np.zeros(len(stems) + 1, dtype=np.int64)
+        np.cumsum(counts[order], out=merged_offsets[1:])
+        return [stems[i] for i in order], [stats[i] for i in order], rows, merged_offsets
+
+    def compact(self):
+        """Fold the journal into a new generation of the arrays.
+
+        The arrays are built from a snapshot outside the lock, so saves
+        made meanwhile aren't blocked; they stay in the new journal.
+
+        Returns:
+            bool: True if a new generation was written
+        """
+        with self._locked():
+            self._catch_up()
+            if not self._overlay and self._generation is not None:
+                return False
+            snapshot = dict(self._overlay)
+            generation = self._generation
+            base = (self._base_stems, self._base_stats, self.boxes, self.offsets)
+        merged = self._merged(*base, snapshot)
+
+        with self._locked():
+            self._catch_up()
+            if self._generation != generation:
+                return False  # Another instance compacted first
+            remaining = {stem: entry for stem, entry in self._overlay.items() if snapshot.get(stem) is not entry}
+            self._write_generation(*merged, remaining)
+        return True
+
+    def compact_if_needed(self):
+        """compact() once the journal holds COMPACT_THRESHOLD images."""
+        if len(self._overlay) >= self.COMPACT_THRESHOLD or self._generation is None:
+            return self.compact()
+        return False
+
+    def sync(self):
+        """Bring the store up to date with the .txt files.
+
+        Journals the .txt files added, changed or deleted since they were
+        last mirrored (reparsing only those), then compacts if needed.
+
+        Returns:
+            bool: True if anything changed
+        """
+        current = {}
+        if os.path.exists(self.labels_dir):
+            with os.scandir(self.labels_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.txt') and entry.is_file():
+                        stat = entry.stat()
+                        current[entry.name[:-4]] = (stat.st_mtime_ns, stat.st_size)
+
+        with self._locked():
+            self._catch_up()
+            known = dict(zip(self._base_stems, self._base_stats))
+            for stem, (_, stat) in self._overlay.items():
+                if stat is None:
+                    known.pop(stem, None)
+                else:
+                    known[stem] = stat
+
+        changed = [stem for stem, stat in current.items() if known.get(stem) != stat]
+        parsed, parsed_offsets = read_label_files(
+            [os.path.join(self.labels_dir, stem + '.txt') for stem in changed], dtype=np.float64)
+        changes = {stem: (_to_rows(parsed[parsed_offsets[j]:parsed_offsets[j + 1]]), current[stem])
+                   for j, stem in enumerate(changed)}
+        changes.update({stem: (np.zeros(0, dtype=LABEL_DTYPE), None) for stem in known if stem not in current})
+        with self._locked():
+            self._catch_up()
+            # Leave images saved while the files were parsed as they are now
+            changes = {stem: entry for stem, entry in changes.items() if self._stat_of(stem) == known.get(stem)}
+            if len(changes) >= self.COMPACT_THRESHOLD:
+                # E.g. the first sync of a project: straight into new arrays
+                merged = self._merged(self._base_stems, self._base_stats, self.boxes, self.offsets,
+                                      {**self._overlay, **changes})
+                self._write_generation(*merged, {})
+            else:
+                self._record(changes)
+        self.compact_if_needed()
+        return bool(changes)
+
+    def sync_file(self, stem):
+        """Bring a single image's rows up to date with its .txt (O(1), no directory scan).
+
+        Returns:
+            bool: True if anything changed
+        """
+        path = os.path.join(self.labels_dir, stem + '.txt')
+        stat = self._file_stat(path)
+        with self._locked():
+            self._catch_up()
+            if stat == self._stat_of(stem):
+                return False
+            rows = _to_rows(read_labels(path, dtype=np.float64)) if stat else np.zeros(0, dtype=LABEL_DTYPE)
+            self._record({stem: (rows, stat)})
+        return True
+
+    # --- Queries ---
+
+    def _base_rows(self, stem):
+        i = self._positions.get(stem)
+        if i is None:
+            return self.boxes[:0]
+        return self.boxes[self.offsets[i]:self.offsets[i + 1]]
+
+    def _stat_of(self, stem):
+        if stem in self._overlay:
+            return self._overlay[stem][1]
+        i = self._positions.get(stem)
+        return self._base_stats[i] if i is not None else None
+
+    def __contains__(self, stem):
+        with self._lock:
+            return self._stat_of(stem) is not None
+
+    def __len__(self):
+        with self._lock:
+            count = len(self._base_stems)
+            for stem, (_, stat) in self._overlay.items():
+                count += (stat is not None) - (stem in self._positions)
+            return count
+
+    def get_rows(self, stem):
+        """LABEL_DTYPE rows of one image (a view into the map), empty if it has no labels."""
+        with self._lock:
+            if stem in self._overlay:
+                rows, stat = self._overlay[stem]
+                return rows if stat is not None else rows[:0]
+            return self._base_rows(stem)
+
+    def get(self, stem):
+        """(bboxes, class_labels) of one image, in the form the augmentation pipeline takes."""
+        rows = self.get_rows(stem)
+        bboxes = np.stack([rows['cx'], rows['cy'], rows['w'], rows['h']], axis=1)
+        return bboxes.tolist(), rows['class_id'].tolist()
+
+    def first_classes(self):
+        """Class of the first box of every labelled image, {stem: class_id}.
+
+        Images whose .txt is empty are left out.
+        """
+        with self._lock:
+            starts = np.asarray(self.offsets[:-1])
+            has_boxes = np.asarray(self.offsets[1:]) > starts
+            first = np.asarray(self.boxes['class_id'])[starts[has_boxes]] if len(self.boxes) else []
+            stems = [stem for stem, labelled in zip(self._base_stems, has_boxes) if labelled]
+            classes = dict(zip(stems, (int(c) for c in first)))
+            for stem, (rows, stat) in self._overlay.items():
+                if stat is not None and len(rows):
+                    classes[stem] = int(rows['class_id'][0])
+                else:
+                    classes.pop(stem, None)
+            return classes
+
+    def nonempty_files(self):
+        """Stems whose .txt exists and isn't empty, parseable boxes or not."""
+        with self._lock:
+            stems = {stem for stem, stat in zip(self._base_stems, self._base_stats) if stat[1]}
+            for stem, (_, stat) in self._overlay.items():
+                if stat is not None and stat[1]:
+                    stems.add(stem)
+                else:
+                    stems.discard(stem)
+            return stems
+
+    def class_counts(self, num_classes=None):
+        """Number of boxes per class id."""
+        with self._lock:
+            overlay = list(self._overlay.items())
+            added = [rows['class_id'] for _, (rows, stat) in overlay if stat is not None]
+            replaced = [np.asarray(self._base_rows(stem)['class_id']) for stem, _ in overlay]
+            base = np.asarray(self.boxes['class_id'])
+            minlength = max([num_classes or 0] + [int(ids.max()) + 1 for ids in [base] + added + replaced if len(ids)])
+            counts = np.bincount(base, minlength=minlength)
+            for ids in added:
+                counts += np.bincount(ids, minlength=minlength)
+            for ids in replaced:
+                counts -= np.bincount(ids, minlength=minlength)
+            return counts
+
+    # --- Updates ---
+
+    def put(self, stem, bboxes, class_labels):
+        """Write an image's labels as YOLO .txt (the export) and mirror them in the store."""
+        path = os.path.join(self.labels_dir, stem + '.txt')
+        labels = to_array(bboxes, class_labels, np.float64)
+        with self._locked():
+            write_labels(path, labels)
+            self._record({stem: (_to_rows(labels), self._file_stat(path))})
+
+    def remove(self, stem):
+        """Delete an image's .txt and drop it from the store."""
+        path = os.path.join(self.labels_dir, stem + '.txt')
+        with self._locked():
+            if os.path.exists(path):
+                os.remove(path)
+            if self._stat_of(stem) is not None:
+                self._record({stem: (np.zeros(0, dtype=LABEL_DTYPE), None)})
+
+
+_project_stores = {}
+_project_stores_lock = threading.Lock()
+
+def get_project_label_store(project_path):
+    """Shared LabelStore of a project (UI and image index), created on first use."""
+    with _project_stores_lock:
+        store = _project_stores.get(project_path)
+        if store is None:
+            store = _project_stores[project_path] = LabelStore.for_project(project_path)
+        return store
@@ -0,0 +1,79 @@
+"""
+Ordered navigation over image paths.
+"""
+
+
+class NavigationOrder:
+    """
+    Doubly linked order of image paths with O(1) next/prev/insert/remove.
+
+    Links are kept in path -> neighbour hashmaps, so stepping from any
+    image costs the same however many images the order holds (unlike
+    list.index or walking a Treeview).
+    """
+
+    def __init__(self, paths=()):
+        self.clear()
+        self.extend(paths)
+
+    def clear(self):
+        self._next = {}
+        self._prev = {}
+        self.head = None
+        self.tail = None
+
+    def __len__(self):
+        return len(self._next)
+
+    def __contains__(self, path):
+        return path in self._next
+
+    def __iter__(self):
+        path = self.head
+        while path is not None:
+            yield path
+            path = self._next[path]
+
+    def extend(self, paths):
+        """Append paths at the end, in order."""
+        for path in paths:
+            self.insert_after(path, self.tail)
+
+    def insert_after(self, path, after=None):
+        """Insert path right after `after` (at the front if None); moves it if already present."""
+        if path in self._next:
+            self.remove(path)
+        following = self._next[after] if after is not None else self.head
+        self._prev[path] = after
+        self._next[path] = following
+        if after is None:
+            self.head = path
+        else:
+            self._next[after] = path
+        if following is None:
+            self.tail = path
+        else:
+            self._prev[following] = path
+
+    def remove(self, path):
+        """Unlink path; no-op if absent."""
+        if path not in self._next:
+            return
+        before = self._prev.pop(path)
+        after = self._next.pop(path)
+        if before is None:
+            self.head = after
+        else:
+            self._next[before] = after
+        if after is None:
+            self.tail = before
+        else:
+            self._prev[after] = before
+
+    def next(self, path):
+        """Path after `path`, None at the end or if path is unknown."""
+        return self._next.get(path)
+
+    def prev(self, path):
+        """Path before `path`, None at the start or if path is unknown."""
+        return self._prev.get(path)
@@ -0,0 +1,174 @@
+"""
+Cache of SAM image embeddings, so repeat prompts on an image skip the image encoder.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.core.file_cache import directory_size, evict_least_recent
+
+
+class SAMEmbeddingCache:
+    """
+    Image encoder outputs of recent images, by image content hash.
+
+    The most recent max_images embeddings stay in memory as the
+    predictor's own tensors. With a cache_dir, every new embedding is
+    also written there (compressed, on a background thread), so images
+    annotated in an earlier session skip the encoder too; the directory
+    is capped at max_disk_bytes, least recently used first.
+
+    Features are a tensor (SAM) or a dict of tensors and lists of tensors
+    (SAM 2); on disk they are flattened to named arrays.
+
+    Layout of cache_dir:
+        <content hash>-<model>.npz: Flattened features of one image
+    """
+
+    MAX_IMAGES = 8  # SAM 2 large: ~16 MB each
+    MAX_DISK_BYTES = 2 * 2**30
+
+    def __init__(self, model_name, cache_dir=None, max_images=MAX_IMAGES, max_disk_bytes=MAX_DISK_BYTES):
+        """
+        Args:
+            model_name: Name of the model the features come from (part of
+                the file names, embeddings of other models never match)
+            cache_dir: Directory to spill embeddings to, None for memory only
+            max_images: Embeddings kept in memory
+            max_disk_bytes: Size cap of cache_dir
+        """
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.max_images = max_images
+        self.max_disk_bytes = max_disk_bytes
+
+        self._features = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._disk_bytes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._disk_bytes = directory_size(cache_dir, '.npz')
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sam-embeddings")
+
+    def get(self, digest, device=None):
+        """Features of the image with content hash digest, or None.
+
+        Args:
+            device: Torch device features loaded from disk are moved to
+        """
+        with self._lock:
+            features = self._features.get(digest)
+            if features is not None:
+                self._features.move_to_end(digest)
+                return features
+
+        path = self._path(digest)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as arrays:
+                features = _unflatten({name: arrays[name] for name in arrays.files}, device)
+            os.utime(path)  # Most recently used
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring SAM embedding {path}: {e}")
+            return None
+        self._remember(digest, features)
+        return features
+
+    def put(self, digest, features):
+        """Keep the features of an image (and spill them to disk in the background)."""
+        self._remember(digest, features)
+        if self._writer is not None:
+            try:
+                arrays = _flatten(features)
+            except TypeError as e:
+                print(f"Not spilling SAM embedding: {e}")
+                return
+            self._writer.submit(self._write, digest, arrays)
+
+    def __contains__(self, digest):
+        with self._lock:
+            if digest in self._features:
+                return True
+        path = self._path(digest)
+        return path is not None and os.path.exists(path)
+
+    # --- Internals ---
+
+    def _path(self, digest):
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"{digest}-{self.model_name}.npz")
+
+    def _remember(self, digest, features):
+        with self._lock:
+            self._features[digest] = features
+            self._features.move_to_end(digest)
+            while len(self._features) > self.max_images:
+                self._features.popitem(last=False)
+
+    def _write(self, digest, arrays):
+        path = self._path(digest)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, path)
+            self._disk_bytes += os.path.getsize(path)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._disk_bytes = evict_least_recent(self.cache_dir, '.npz', int(self.max_disk_bytes * 0.9))
+        except OSError as e:
+            print(f"Failed to write SAM embedding {path}: {e}")
+
+
+def _to_numpy(tensor):
+    import torch
+    tensor = tensor.detach().cpu()
+    if tensor.dtype == torch.bfloat16:
+        tensor = tensor.float()  # No numpy equivalent
+    return tensor.numpy()
+
+
+def _flatten(features):
+    """{name: array} of a tensor or a dict of tensors / lists of tensors."""
+    if hasattr(features, 'detach'):
+        return {'features': _to_numpy(features)}
+    if not isinstance(features, dict):
+        raise TypeError(f"unsupported features type {type(features).__name__}")
+    arrays = {}
+    for key, value in features.items():
+        if isinstance(value, (list, tuple)):
+            for i, item in enumerate(value):
+                arrays[f"{key}/{i}"] = _to_numpy(item)
+        elif hasattr(value, 'detach'):
+            arrays[key] = _to_numpy(value)
+        else:
+            raise TypeError(f"unsupported features entry {key}: {type(value).__name__}")
+    return arrays
+
+
+def _unflatten(arrays, device=None):
+    """Inverse of _flatten, as tensors on device."""
+    import torch
+
+    def tensor(array):
+        return torch.from_numpy(array).to(device) if device is not None else torch.from_numpy(array)
+
+    if set(arrays) == {'features'}:
+        return tensor(arrays['features'])
+    features = {}
+    lists = {}
+    for name, array in arrays.items():
+        key, _, index = name.partition('/')
+        if index:
+            lists.setdefault(key, []).append((int(index), tensor(array)))
+        else:
+            features[key] = tensor(array)
+    for key, items in lists.items():
+        features[key] = [item for _, item in sorted(items, key=lambda pair: pair[0])]
+    return features
@@ -1,19 +1,47 @@
 import os
+import threading
+from contextlib import contextmanager
 import cv2
 import numpy as np
 from ultralytics import SAM
 from PIL import Image
+from app.core.file_cache import ContentHasher
+from app.core.sam_embedding_cache import SAMEmbeddingCache
 
 class SAMWrapper:
-    def __init__(self, model_path="sam2.1_l.pt"):
+    # Torch threads background encodes use; the rest stay free for the UI and prompts
+    PRECOMPUTE_THREADS = max(1, (os.cpu_count() or 1) // 4)
+
+    def __init__(self, model_path="sam2.1_l.pt", cache_dir=None):
         """
         Initialize the SAM wrapper.
         
         Args:
             model_path (str): Path to the SAM model file.
+            cache_dir (str): Directory to keep image embeddings in across
+                sessions; None keeps them in memory only.
         """
         self.model_path = model_path
         self.model = None
+        self._predictor = None
+        self._predictor_digest = None  # Image whose features the predictor holds
+        self._use_predictor = True  # False once the cached path failed with this ultralytics
+        self._hasher = ContentHasher()
+        self.embeddings = SAMEmbeddingCache(os.path.splitext(os.path.basename(model_path))[0], cache_dir)
+        
+        # Background precompute: queue of paths, and digests being encoded -> Event set when done
+        self._precompute_queue = []
+        self._encoding = {}
+        self._precompute_lock = threading.Lock()
+        self._precompute_wake = threading.Event()
+        self._foreground_calls = 0
+        self._foreground_idle = threading.Event()  # Set while no foreground set_image runs
+        self._foreground_idle.set()
+        self._closed = threading.Event()
+        self._precompute_thread = None
+        # Held around every encode: the precompute thread's torch.set_num_threads
+        # is process-wide, so no other encode may run while it is lowered
+        self._encode_lock = threading.Lock()
         self._load_model()
 
     def _load_model(self):
@@ -28,11 +56,172 @@ class SAMWrapper:
                      self.model_path = potential_path
             
             self.model = SAM(self.model_path)
+            self._predictor = None
             print(f"SAM Model loaded from {self.model_path}")
         except Exception as e:
             print(f"Failed to load SAM model: {e}")
             self.model = None
 
+    def _new_predictor(self):
+        """Prompt predictor sharing self.model's network."""
+        predictor_cls = self.model.task_map["segment"]["predictor"]
+        predictor = predictor_cls(overrides=dict(conf=0.25, task="segment", mode="predict",
+                                                 imgsz=1024, save=False, verbose=False))
+        predictor.setup_model(model=self.model.model, verbose=False)
+        return predictor
+
+    def _get_predictor(self):
+        """The prompt predictor, created on first use."""
+        if self._predictor is None:
+            self._predictor = self._new_predictor()
+            self._predictor_digest = None
+        return self._predictor
+
+    def set_image(self, image_path):
+        """
+        Make the predictor ready for prompts on an image.
+        
+        The image encoder only runs for images whose embedding isn't
+        cached (by content hash); otherwise the cached features are handed
+        to the predictor and prompts only run the mask decoder.
+        
+        Returns:
+            The predictor, to be called with prompts (points=, labels=, bboxes=)
+        """
+        predictor = self._get_predictor()
+        digest = self._hasher.digest(image_path)
+        if digest == self._predictor_digest:
+            return predictor
+        
+        with self._foreground():
+            self._set_image(predictor, image_path, digest)
+        return predictor
+
+    @contextmanager
+    def _foreground(self):
+        """Keep the precompute thread from starting another image meanwhile."""
+        with self._precompute_lock:
+            self._foreground_calls += 1
+            self._foreground_idle.clear()
+        try:
+            yield
+        finally:
+            with self._precompute_lock:
+                self._foreground_calls -= 1
+                if not self._foreground_calls:
+                    self._foreground_idle.set()
+
+    def _set_image(self, predictor, image_path, digest):
+        while True:
+            features = self.embeddings.get(digest, device=getattr(predictor, "device", None))
+            if features is not None:
+                break
+            with self._precompute_lock:
+                encoding = self._encoding.get(digest)
+                if encoding is None:
+                    # Keeps the precompute thread from encoding it a second time
+                    done = self._encoding[digest] = threading.Event()
+                    break
+            # Being encoded in the background: sooner done than starting over
+            encoding.wait()
+        
+        if features is None:
+            try:
+                with self._encode_lock:
+                    predictor.set_image(image_path)
+                self.embeddings.put(digest, predictor.features)
+            finally:
+                with self._precompute_lock:
+                    self._encoding.pop(digest, None)
+                done.set()
+        else:
+            # What set_image does, minus the encoder
+            predictor.setup_source(image_path)
+            predictor.features = features
+        self._predictor_digest = digest
+
+    def precompute(self, image_paths):
+        """
+        Encode images in the background so their first prompt is fast.
+        
+        Replaces the paths of any earlier call that aren't started yet
+        (e.g. when the user navigates elsewhere). Images already cached
+        are skipped. The worker is a single thread that encodes with
+        PRECOMPUTE_THREADS torch threads, leaving the other cores to the UI
+        and to prompts on the current image, and that doesn't start another
+        image while a foreground set_image is running.
+        
+        Args:
+            image_paths (list): Paths in the order to encode them
+        """
+        if not self.model or not self._use_predictor:
+            return
+        with self._precompute_lock:
+            self._precompute_queue = list(image_paths)
+            if self._precompute_thread is None or not self._precompute_thread.is_alive():
+                self._precompute_thread = threading.Thread(target=self._precompute_loop, daemon=True)
+                self._precompute_thread.start()
+        self._precompute_wake.set()
+
+    def cancel_precompute(self):
+        """Drop the images not started yet (the one being encoded finishes)."""
+        with self._precompute_lock:
+            self._precompute_queue = []
+
+    def close(self):
+        """Stop the precompute thread (e.g. before unloading the model)."""
+        self.cancel_precompute()
+        self._closed.set()
+        self._precompute_wake.set()
+
+    def _encode_in_background(self, predictor, image_path):
+        """predictor.set_image with PRECOMPUTE_THREADS torch threads.
+
+        torch.set_num_threads is process-wide, so the previous count is
+        restored afterwards and _encode_lock keeps foreground encodes from
+        running with the lowered one.
+        """
+        import torch
+        with self._encode_lock:
+            threads = torch.get_num_threads()
+            torch.set_num_threads(self.PRECOMPUTE_THREADS)
+            try:
+                predictor.set_image(image_path)
+            finally:
+                torch.set_num_threads(threads)
+
+    def _precompute_loop(self):
+        predictor = None  # Its own, so the prompt predictor's image isn't replaced
+        while not self._closed.is_set():
+            self._precompute_wake.wait()
+            self._precompute_wake.clear()
+            while not self._closed.is_set():
+                self._foreground_idle.wait()
+                with self._precompute_lock:
+                    if not self._precompute_queue:
+                        break
+                    image_path = self._precompute_queue.pop(0)
+                try:
+                    digest = self._hasher.digest(image_path)
+                    if digest in self.embeddings:
+                        continue
+                    with self._precompute_lock:
+                        if digest in self._encoding:
+                            continue
+                        done = self._encoding[digest] = threading.Event()
+                    try:
+                        if predictor is None:
+                            predictor = self._new_predictor()
+                        self._encode_in_background(predictor, image_path)
+                        self.embeddings.put(digest, predictor.features)
+                        predictor.features = None
+                    finally:
+                        with self._precompute_lock:
+                            self._encoding.pop(digest, None)
+                        done.set()
+                except Exception as e:
+                    print(f"SAM precompute failed for {image_path}: {e}")
+
     def predict_point(self, image_path, point):
         """
         Run SAM prediction based on a single point.
@@ -57,41 +246,154 @@ class SAMWrapper:
             # ensuring generic support.
             # Convert point to list of list as expected by some interfaces
             
-            results = self.model.predict(
-                source=image_path,
-                points=[point],
-                labels=[1],
-                save=False
-            )
+            results = None
+            if self._use_predictor:
+                try:
+                    results = self.set_image(image_path)(points=[point], labels=[1])
+                except Exception as e:
+                    # Predictor API of this ultralytics version not as expected: encode per call
+                    print(f"SAM embedding cache unavailable, running full predictions: {e}")
+                    self._use_predictor = False
+                    self._predictor = None
+            if not self._use_predictor:
+                with self._encode_lock:
+                    results = self.model.predict(
+                        source=image_path,
+                        points=[point],
+                        labels=[1],
+                        save=False
+                    )
             
             if not results:
                 return None
-                
-            # Result usually contains masks. We need the bounding box of the mask.
-            # Results object -> masks -> xyxy
-            
-            r = results[0]
-            
-            # 1. Try generic boxes if available (SAM usually returns them)
-            if r.boxes is not None and len(r.boxes) > 0:
-                 return r.boxes.xyxy[0].tolist()
-            
-            # 2. Derive from masks if no boxes
-            if r.masks is not None:
-                 # r.masks.xy is a list of np arrays (segments)
-                 # We take the first one
-                 segments = r.masks.xy
-                 if len(segments) > 0:
-                     poly = segments[0] # numpy array (N, 2)
-                     if len(poly) > 0:
-                         x1 = poly[:, 0].min()
-                         y1 = poly[:, 1].min()
-                         x2 = poly[:, 0].max()
-                         y2 = poly[:, 1].max()
-                         return [float(x1), float(y1), float(x2), float(y2)]
             
+            return self._result_to_box(results[0])
+
+        except Exception as e:
+            print(f"SAM Inference error: {e}")
             return None
 
+    def predict_prompts(self, image_path, prompts):
+        """
+        Segment several objects of one image, each from its own prompt.
+        
+        The image is encoded once (or taken from the embedding cache) and
+        all prompts go through the mask decoder in one batch (two if only
+        some of them have a box), so labeling many objects costs one
+        encoder pass.
+        
+        Args:
+            image_path (str): Path to the image file.
+            prompts (list): One dict per object, with any of
+                'points': [(x, y), ...] clicks on (or off) the object,
+                'labels': [1 or 0, ...] per point, 1 foreground (default), 0 background,
+                'box': [x1, y1, x2, y2] box around the object.
+            
+        Returns:
+            list: Per prompt, in order, a dict with 'box' ([x1, y1, x2, y2]),
+                'mask' (bool array, image size) and 'score', or None if
+                nothing was found. None instead of the list if SAM failed.
+        """
+        if not prompts:
+            return []
+        if not self.model:
+            self._load_model()
+            if not self.model:
+                return None
+        
+        try:
+            outputs = [None] * len(prompts)
+            # The prompt encoder takes boxes for all objects of a batch or for none
+            with_box = [i for i, prompt in enumerate(prompts) if prompt.get('box') is not None]
+            without_box = [i for i, prompt in enumerate(prompts) if prompt.get('box') is None]
+            for indices in (with_box, without_box):
+                if indices:
+                    for i, output in zip(indices, self._decode_batch(image_path, [prompts[i] for i in indices])):
+                        outputs[i] = output
+            return outputs
+        
         except Exception as e:
             print(f"SAM Inference error: {e}")
             return None
+
+    def _decode_batch(self, image_path, prompts):
+        """Outputs of prompts that all have a box or all have none (see predict_prompts)."""
+        # Pad every object to the same number of points; label -1 marks padding for SAM
+        prompt_points = [[] if prompt.get('points') is None else prompt['points'] for prompt in prompts]
+        num_points = max(len(object_points) for object_points in prompt_points)
+        points = labels = bboxes = None
+        if num_points:
+            points = np.zeros((len(prompts), num_points, 2), dtype=np.float32)
+            labels = np.full((len(prompts), num_points), -1, dtype=np.int32)
+            for i, (prompt, object_points) in enumerate(zip(prompts, prompt_points)):
+                if len(object_points):
+                    points[i, :len(object_points)] = object_points
+                    labels[i, :len(object_points)] = prompt.get('labels', [1] * len(object_points))
+        if prompts[0].get('box') is not None:
+            bboxes = np.array([prompt['box'] for prompt in prompts], dtype=np.float32)
+        
+        if self._use_predictor:
+            try:
+                results = self.set_image(image_path)(points=points, labels=labels, bboxes=bboxes)
+                return self._result_to_outputs(results[0], len(prompts))
+            except Exception as e:
+                # Remembered, so later calls don't retry (and report) the cached path every time
+                print(f"Batched SAM prompts unavailable, decoding one object at a time: {e}")
+                self._use_predictor = False
+                self._predictor = None
+        
+        # One full prediction per object (older ultralytics)
+        outputs = []
+        for i in range(len(prompts)):
+            kwargs = {}
+            if points is not None:
+                valid = labels[i] >= 0
+                if valid.any():
+                    kwargs.update(points=[points[i][valid].tolist()], labels=[labels[i][valid].tolist()])
+            if bboxes is not None:
+                kwargs['bboxes'] = [bboxes[i].tolist()]
+            with self._encode_lock:
+                results = self.model.predict(source=image_path, save=False, **kwargs)
+            outputs.append(self._result_to_outputs(results[0], 1)[0] if results else None)
+        return outputs
+
+    @staticmethod
+    def _result_to_outputs(r, count):
+        """Per prompt output of a batched result (prompt index = class of its box)."""
+        outputs = [None] * count
+        if r.boxes is None or r.masks is None:
+            return outputs
+        masks = r.masks.data.cpu().numpy().astype(bool)
+        boxes = r.boxes.xyxy.cpu().numpy()
+        scores = r.boxes.conf.cpu().numpy()
+        classes = r.boxes.cls.cpu().numpy().astype(int)
+        for j, i in enumerate(classes):
+            if 0 <= i < count and masks[j].any():
+                outputs[i] = {'box': boxes[j].tolist(), 'mask': masks[j], 'score': float(scores[j])}
+        return outputs
+
+    @staticmethod
+    def _result_to_box(r):
+        """[x1, y1, x2, y2] of the first object in a SAM result, or None."""
+        # Result usually contains masks. We need the bounding box of the mask.
+        # Results object -> masks -> xyxy
+        
+        # 1. Try generic boxes if available (SAM usually returns them)
+        if r.boxes is not None and len(r.boxes) > 0:
+             return r.boxes.xyxy[0].tolist()
+        
+        # 2. Derive from masks if no boxes
+        if r.masks is not None:
+             # r.masks.xy is a list of np arrays (segments)
+             # We take the first one
+             segments = r.masks.xy
+             if len(segments) > 0:
+                 poly = segments[0] # numpy array (N, 2)
+                 if len(poly) > 0:
+                     x1 = poly[:, 0].min()
+                     y1 = poly[:, 1].min()
+                     x2 = poly[:, 0].max()
+                     y2 = poly[:, 1].max()
+                     return [float(x1), float(y1), float(x2), float(y2)]
+        
+        return None
@@ -0,0 +1,173 @@
+"""
+On-disk thumbnail cache of a project's images.
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from PIL import Image
+
+from app.core.file_cache import ContentHasher, directory_size, evict_least_recent
+
+
+class ThumbnailCache:
+    """
+    Downscaled copies of images, stored as JPEGs in a cache directory.
+
+    Thumbnails are named after a hash of the source file's content and
+    the thumbnail size, so a renamed or copied image reuses its thumbnail
+    and an edited one gets a new one. Content hashes are remembered per
+    (path, mtime, size), so only new or changed files are read to hash
+    them. The directory is capped at max_bytes; the least recently used
+    thumbnails (by file mtime, bumped on every hit) are evicted first.
+
+    Layout of cache_dir:
+        <content hash>-<size>.jpg: Thumbnail fitting in size x size
+    """
+
+    SIZE = 256
+    MAX_BYTES = 256 * 2**20
+    QUALITY = 85
+
+    def __init__(self, cache_dir, max_bytes=MAX_BYTES, workers=None):
+        """
+        Args:
+            cache_dir: Directory for the thumbnails (created if missing)
+            max_bytes: Size cap of the directory
+            workers: Threads generating thumbnails in the background
+                (default: one per CPU)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._hasher = ContentHasher()
+        self._pending = {}  # thumbnail file -> Future generating it
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                            thread_name_prefix="thumbnails")
+        self._bytes = directory_size(cache_dir, '.jpg')
+
+    @classmethod
+    def for_project(cls, project_path, **kwargs):
+        """Thumbnail cache of a project, kept in data/thumbnails."""
+        return cls(os.path.join(project_path, "data", "thumbnails"), **kwargs)
+
+    def get(self, img_path, size=SIZE, create=True):
+        """Thumbnail of img_path fitting in size x size, generated now if missing.
+
+        Hashes img_path if it is new or changed, which reads the whole file,
+        so Tk code should call this from a worker thread (or use request()).
+
+        Args:
+            create: False returns None instead of generating a missing
+                thumbnail, and never hashes: a file whose hash isn't known
+                for its current mtime and size counts as missing
+
+        Raises:
+            OSError: If the image can't be read or decoded
+        """
+        if not create:
+            digest = self._hasher.known_digest(img_path)
+            if digest is None:
+                return None
+            thumb_path = self._path_of(digest, size)
+            if not os.path.exists(thumb_path):
+                return None
+        else:
+            thumb_path = self._path_of(self._hasher.digest(img_path), size)
+        return self._load_or_create(img_path, thumb_path, size)
+
+    def request(self, img_paths, size=SIZE, callback=None):
+        """Generate missing thumbnails in the background, in parallel.
+
+        Args:
+            callback: Called with (img_path, thumbnail) from a worker thread
+                as each thumbnail becomes available, so Tk code must hand
+                it to after(). Images that fail are reported and skipped.
+        """
+        for img_path in img_paths:
+            self._executor.submit(self._request_one, img_path, size, callback)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- Internals ---
+
+    def _request_one(self, img_path, size, callback):
+        try:
+            thumbnail = self.get(img_path, size)
+        except Exception as e:
+            print(f"Thumbnail failed for {img_path}: {e}")
+            return
+        if callback:
+            callback(img_path, thumbnail)
+
+    def _path_of(self, digest, size):
+        return os.path.join(self.cache_dir, f"{digest}-{size}.jpg")
+
+    def _load_or_create(self, img_path, thumb_path, size):
+        try:
+            thumbnail = Image.open(thumb_path)
+            thumbnail.load()
+            os.utime(thumb_path)  # Most recently used
+            return thumbnail
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Regenerating thumbnail {thumb_path}: {e}")
+
+        with self._lock:
+            future = self._pending.get(thumb_path)
+            if future is None:
+                # Generate here; concurrent requests for it wait on this future
+                future = self._pending[thumb_path] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return future.result()
+
+        try:
+            thumbnail = self._create(img_path, thumb_path, size)
+            future.set_result(thumbnail)
+            return thumbnail
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(thumb_path, None)
+
+    def _create(self, img_path, thumb_path, size):
+        with Image.open(img_path) as image:
+            # thumbnail() drafts JPEGs, so they aren't decoded at full size
+            image.thumbnail((size, size))
+            thumbnail = image.convert('RGB')
+
+        tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+        thumbnail.save(tmp_path, 'JPEG', quality=self.QUALITY)
+        os.replace(tmp_path, thumb_path)
+
+        with self._lock:
+            self._bytes += os.path.getsize(thumb_path)
+            over = self._bytes > self.max_bytes
+        if over:
+            # Down to 90% of the cap, so eviction doesn't run on every new thumbnail
+            remaining = evict_least_recent(self.cache_dir, '.jpg', int(self.max_bytes * 0.9))
+            with self._lock:
+                self._bytes = remaining
+        return thumbnail
+
+
+_project_caches = {}
+_project_caches_lock = threading.Lock()
+
+def get_project_thumbnail_cache(project_path):
+    """Shared ThumbnailCache of a project, created on first use."""
+    with _project_caches_lock:
+        cache = _project_caches.get(project_path)
+        if cache is None:
+            cache = _project_caches[project_path] = ThumbnailCache.for_project(project_path)
+        return cache
@@ -9,8 +9,11 @@ import os
 import shutil
 import threading
 from app.core.augmentation_engine import (
-    AugmentationEngine, AugmentationPipeline, EFFECT_REGISTRY, create_effect_from_dict, load_filters
+    AugmentationEngine, AugmentationPipeline, EFFECT_REGISTRY, create_effect_from_dict, load_filters, AUG_PREFIX
 )
+from app.core.augmentation.output import OutputEncoder
+from app.core.label_store import LabelStore
+from app.core.thumbnail_cache import get_project_thumbnail_cache
 from app.ui.components import RoundedButton
 import cv2
 import numpy as np
@@ -18,6 +21,11 @@ import numpy as np
 class AugmentationView(ttk.Frame):
     """UI for configuring and running modular augmentations."""
     
+    # Thumbnail size the original preview shows until the full image is decoded,
+    # and images warmed on each side of the selection
+    PREVIEW_SIZE = 512
+    PREVIEW_PREFETCH = 8
+    
     def __init__(self, parent, project_manager):
         super().__init__(parent)
         self.project_manager = project_manager
@@ -26,6 +34,7 @@ class AugmentationView(ttk.Frame):
         
         self.preview_original = None
         self.preview_augmented = None
+        self._preview_token = 0  # Bumped per preview request; stale results aren't drawn
         
         # State
         self.selected_effect_index = None
@@ -70,6 +79,38 @@ class AugmentationView(ttk.Frame):
         self.count_var = tk.IntVar(value=5)
         ttk.Spinbox(count_frame, from_=1, to=50, textvariable=self.count_var, width=5, 
                     command=self.save_global_settings).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(count_frame, text="Workers:").pack(side=tk.LEFT, padx=(10, 0))
+        # One process unless asked for more: the pool's startup only pays off on large datasets
+        self.workers_var = tk.IntVar(value=self.project_manager.get_setting("augmentation_workers", 1))
+        ttk.Spinbox(count_frame, from_=1, to=max(1, os.cpu_count() or 1), textvariable=self.workers_var, width=5,
+                    command=self.save_global_settings).pack(side=tk.LEFT, padx=5)
+        
+        seed_frame = ttk.Frame(global_frame)
+        seed_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(seed_frame, text="Seed (blank = random):").pack(side=tk.LEFT)
+        self.seed_var = tk.StringVar(value="")
+        seed_entry = ttk.Entry(seed_frame, textvariable=self.seed_var, width=12)
+        seed_entry.pack(side=tk.LEFT, padx=5)
+        seed_entry.bind("<Return>", lambda e: self.save_global_settings())
+        seed_entry.bind("<FocusOut>", lambda e: self.save_global_settings())
+        
+        output_frame = ttk.Frame(global_frame)
+        output_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(output_frame, text="Output Format:").pack(side=tk.LEFT)
+        self.output_format_var = tk.StringVar(value=self.project_manager.get_setting(
+            "augmentation_output_format", "source"))
+        # npy is left out: training cannot read it from the images folder
+        format_combo = ttk.Combobox(output_frame, textvariable=self.output_format_var,
+                                    values=["source", "jpg", "webp", "png"], state="readonly", width=7)
+        format_combo.pack(side=tk.LEFT, padx=5)
+        format_combo.bind("<<ComboboxSelected>>", lambda e: self.save_global_settings())
+        
+        ttk.Label(output_frame, text="Quality:").pack(side=tk.LEFT, padx=(10, 0))
+        self.output_quality_var = tk.IntVar(value=self.project_manager.get_setting(
+            "augmentation_output_quality", 95))
+        ttk.Spinbox(output_frame, from_=1, to=100, textvariable=self.output_quality_var, width=5,
+                    command=self.save_global_settings).pack(side=tk.LEFT, padx=5)
 
         # Effect Actions (Add, Remove, Move)
         action_frame = ttk.Frame(parent)
@@ -133,6 +174,7 @@ class AugmentationView(ttk.Frame):
         ttk.Label(select_frame, text="Image:").pack(side=tk.LEFT)
         self.image_combo = ttk.Combobox(select_frame, state='readonly')
         self.image_combo.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.image_combo.bind("<<ComboboxSelected>>", lambda e: self.warm_previews())
         self.refresh_image_list()
         
         # Canvases
@@ -381,8 +423,30 @@ class AugmentationView(ttk.Frame):
     def save_global_settings(self):
         self.pipeline.enabled = self.enabled_var.get()
         self.pipeline.augmentations_per_image = self.count_var.get()
+        seed_text = self.seed_var.get().strip()
+        self.pipeline.seed = int(seed_text) if seed_text.isdigit() else None
+        self.engine.num_workers = self._workers()
+        self.engine.output_encoder = self._make_output_encoder()
+        if self.project_manager.current_project_path:
+            self.project_manager.set_setting("augmentation_workers", self.engine.num_workers)
+            self.project_manager.set_setting("augmentation_output_format", self.engine.output_encoder.format)
+            self.project_manager.set_setting("augmentation_output_quality", self.engine.output_encoder.quality)
         self.save_config()
 
+    def _workers(self):
+        """Workers spinbox value, at least 1; empty or non-numeric input counts as 1."""
+        try:
+            return max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            return 1
+
+    def _make_output_encoder(self):
+        try:
+            quality = int(self.output_quality_var.get())
+        except (tk.TclError, ValueError):
+            quality = 95
+        return OutputEncoder(format=self.output_format_var.get(), quality=quality)
+
     def save_config(self):
         if self.project_manager.current_project_path:
             config_path = os.path.join(self.project_manager.current_project_path, "augmentation_pipeline.json")
@@ -395,6 +459,7 @@ class AugmentationView(ttk.Frame):
                 self.pipeline.load(config_path)
                 self.enabled_var.set(self.pipeline.enabled)
                 self.count_var.set(self.pipeline.augmentations_per_image)
+                self.seed_var.set("" if self.pipeline.seed is None else str(self.pipeline.seed))
                 self.refresh_listbox()
     
     # Utility methods for preview and image handling (copied/adapted from previous)
@@ -402,9 +467,21 @@ class AugmentationView(ttk.Frame):
         if not self.project_manager.current_project_path: return
         images_dir = os.path.join(self.project_manager.current_project_path, "data", "images")
         if not os.path.exists(images_dir): return
-        images = [f for f in os.listdir(images_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+        images = [f for f in os.listdir(images_dir)
+                  if f.lower().endswith(('.jpg', '.jpeg', '.png')) and not f.startswith(AUG_PREFIX)]
         self.image_combo['values'] = images
         if images: self.image_combo.current(0)
+        self.warm_previews()
+
+    def warm_previews(self):
+        """Generate the preview thumbnails of the images around the selected one in the background."""
+        images = self.image_combo['values']
+        if not images: return
+        index = max(0, self.image_combo.current())
+        images_dir = os.path.join(self.project_manager.current_project_path, "data", "images")
+        nearby = images[max(0, index - self.PREVIEW_PREFETCH):index + self.PREVIEW_PREFETCH + 1]
+        get_project_thumbnail_cache(self.project_manager.current_project_path).request(
+            [os.path.join(images_dir, name) for name in nearby], size=self.PREVIEW_SIZE)
 
     def generate_preview(self):
         selected = self.image_combo.get()
@@ -415,15 +492,32 @@ class AugmentationView(ttk.Frame):
         img_path = os.path.join(images_dir, selected)
         label_path = os.path.join(labels_dir, os.path.splitext(selected)[0] + '.txt')
         
-        # Display Original
-        original_img = Image.open(img_path)
-        self.display_image(self.original_canvas, original_img)
+        self._preview_token += 1
+        thread = threading.Thread(target=self._preview_thread,
+                                  args=(self._preview_token, img_path, label_path))
+        thread.daemon = True
+        thread.start()
+
+    def _preview_thread(self, token, img_path, label_path):
+        """Show the cached thumbnail right away, then the decoded original next to its augmentation."""
+        def show(canvas, pil_img):
+            # Tk calls go through after(); only the latest request may draw
+            self.after(0, lambda: token == self._preview_token and self.display_image(canvas, pil_img))
         
-        # Display Augmented
-        res = self.engine.preview_augmentation(img_path, label_path)
+        try:
+            thumbnails = get_project_thumbnail_cache(self.project_manager.current_project_path)
+            thumbnail = thumbnails.get(img_path, size=self.PREVIEW_SIZE, create=False)
+            if thumbnail is not None:
+                show(self.original_canvas, thumbnail)
+        except OSError as e:
+            print(f"Preview thumbnail failed for {img_path}: {e}")
+        
+        # One decode serves both canvases
+        res = self.engine.preview_augmentation(img_path, label_path, with_source=True)
         if res:
-            aug_img, bbox, cls = res
-            self.display_image(self.augmented_canvas, Image.fromarray(aug_img))
+            source, aug_img, bbox, cls = res
+            show(self.original_canvas, Image.fromarray(source))
+            show(self.augmented_canvas, Image.fromarray(aug_img))
 
     def display_image(self, canvas, pil_img):
         w, h = canvas.winfo_width(), canvas.winfo_height()
@@ -451,6 +545,8 @@ class AugmentationView(ttk.Frame):
         self.progress_frame.pack(fill=tk.X, padx=10, pady=10)
         self.progress_bar['value'] = 0
         self.progress_label.config(text="Starting...")
+        self.engine.num_workers = self._workers()
+        self.engine.output_encoder = self._make_output_encoder()
         
         thread = threading.Thread(target=self._run_thread)
         thread.daemon = True
@@ -459,12 +555,15 @@ class AugmentationView(ttk.Frame):
     def _run_thread(self):
         try:
             p = self.project_manager.current_project_path
+            # Own instance: the UI thread keeps using the shared one
+            self.engine.label_store = LabelStore.for_project(p, sync=False)
             count = self.engine.augment_dataset(
                 os.path.join(p, "data", "images"),
                 os.path.join(p, "data", "labels"),
                 os.path.join(p, "data", "images"),
                 os.path.join(p, "data", "labels"),
-                lambda c, t, m: self.after(0, lambda: self._update_progress(c, t, m))
+                lambda c, t, m: self.after(0, lambda: self._update_progress(c, t, m)),
+                manifest_path=os.path.join(p, "data", "augmentation_manifest.json")
             )
             self.after(0, lambda: self._complete(count))
         except Exception as e:
@@ -78,3 +78,158 @@ class RoundedButton(tk.Canvas):
         self._draw()
         if self.command:
             self.command()
+
+
+class VirtualListbox(tk.Frame):
+    """
+    Listbox over a Python sequence that only holds the visible rows in Tk.
+
+    Scrolling re-renders the visible window (constant time at any length)
+    instead of keeping one Tk entry per item. Selection is tracked by item
+    index, so off-screen selections survive scrolling. Mirrors the parts
+    of the Listbox API the labeling views use (curselection, selection_set,
+    selection_clear, see) and emits <<ListboxSelect>> on itself.
+
+    The sequence stays owned by the caller: after changing it in place,
+    call notify_insert/notify_delete (or set_items after bigger changes).
+    """
+
+    def __init__(self, parent, format_item=str, **listbox_options):
+        super().__init__(parent)
+        self.items = []
+        self.format_item = format_item
+        self.top = 0
+        self._selection = set()
+        self._rows = 1
+        self._row_height = None
+
+        listbox_options.setdefault("selectmode", "extended")
+        self.listbox = tk.Listbox(self, exportselection=False, **listbox_options)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.listbox.bind("<Configure>", self._on_configure)
+        self.listbox.bind("<<ListboxSelect>>", self._on_listbox_select)
+        # A plain click replaces the selection, including its off-screen part
+        self.listbox.bind("<Button-1>", lambda e: self._selection.clear())
+        self.listbox.bind("<Control-Button-1>", lambda e: None)
+        self.listbox.bind("<Shift-Button-1>", lambda e: None)
+        self.listbox.bind("<MouseWheel>", self._on_mouse_wheel)
+        self.listbox.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll(3))
+        self.listbox.bind("<Up>", lambda e: self._step(-1))
+        self.listbox.bind("<Down>", lambda e: self._step(1))
+
+    # --- Data ---
+
+    def set_items(self, items):
+        """Show a new sequence; clears the selection."""
+        self.items = items
+        self._selection.clear()
+        self._render()
+
+    def notify_insert(self, index):
+        """items[index] was just inserted."""
+        self._selection = {i + (i >= index) for i in self._selection}
+        if index < self.top:
+            self.top += 1  # Keep the visible rows in place
+        self._render()
+
+    def notify_delete(self, index):
+        """The item at index was just removed from items."""
+        self._selection = {i - (i > index) for i in self._selection if i != index}
+        if index < self.top:
+            self.top -= 1
+        self._render()
+
+    def size(self):
+        return len(self.items)
+
+    # --- Selection ---
+
+    def curselection(self):
+        return tuple(sorted(self._selection))
+
+    def selection_set(self, index):
+        self._selection.add(index)
+        self._render()
+
+    def selection_clear(self, first=0, last=None):
+        if last is None:
+            last = first
+        last = len(self.items) - 1 if last == tk.END else last
+        self._selection = {i for i in self._selection if not first <= i <= last}
+        self._render()
+
+    def see(self, index):
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self._rows:
+            self.top = index - self._rows + 1
+        self._render()
+
+    # --- Scrolling and rendering ---
+
+    def scroll(self, rows):
+        self.top += rows
+        self._render()
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.items))
+        elif args[0] == "scroll":
+            step = self._rows if args[2] == "pages" else 1
+            self.top += int(args[1]) * step
+        self._render()
+
+    def _on_mouse_wheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        units = -(event.delta // 120) if abs(event.delta) >= 120 else (-1 if event.delta > 0 else 1)
+        self.scroll(units * 3)
+
+    def _step(self, delta):
+        """Arrow keys: move a single selection, scrolling at the window edges."""
+        if not self.items:
+            return "break"
+        current = max(self._selection) if delta > 0 and self._selection else \
+            min(self._selection) if self._selection else self.top - delta
+        target = min(max(current + delta, 0), len(self.items) - 1)
+        self._selection = {target}
+        self.see(target)
+        self.event_generate("<<ListboxSelect>>")
+        return "break"
+
+    def _on_configure(self, event):
+        if self._row_height is None:
+            self.listbox.delete(0, tk.END)
+            self.listbox.insert(tk.END, "", "")
+            first, second = self.listbox.bbox(0), self.listbox.bbox(1)
+            if first and second:
+                self._row_height = second[1] - first[1]
+        row_height = self._row_height or tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+        # Listbox height includes its border and highlight ring
+        inner = event.height - 2 * (int(self.listbox.cget("borderwidth")) + int(self.listbox.cget("highlightthickness")))
+        self._rows = max(1, inner // row_height)
+        self._render()
+
+    def _render(self):
+        self.top = min(max(self.top, 0), max(0, len(self.items) - self._rows))
+        visible = self.items[self.top:self.top + self._rows]
+        self.listbox.delete(0, tk.END)
+        if visible:
+            self.listbox.insert(tk.END, *[self.format_item(item) for item in visible])
+        for i in range(len(visible)):
+            if self.top + i in self._selection:
+                self.listbox.selection_set(i)
+
+        if self.items:
+            self.scrollbar.set(self.top / len(self.items), (self.top + len(visible)) / len(self.items))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _on_listbox_select(self, event):
+        visible = range(self.top, self.top + self.listbox.size())
+        self._selection.difference_update(visible)
+        self._selection.update(self.top + i for i in self.listbox.curselection())
+        self.event_generate("<<ListboxSelect>>")
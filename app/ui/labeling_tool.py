@@ -4,13 +4,20 @@ from app.ui.components import RoundedButton
 from PIL import Image, ImageTk
 import os
 import shutil
+import threading
 from app.core.theme_manager import ThemeManager
+from app.core.label_store import get_project_label_store
+from app.core.image_cache import ImageCache, get_project_image_cache
 
 class LabelingTool(tk.Frame):
+    # Images decoded ahead on each side of the current one
+    PREFETCH_RADIUS = 2
+
     def __init__(self, parent, project_manager):
         super().__init__(parent)
         self.project_manager = project_manager
         self.images = []
+        self._list_token = 0  # Bumped per refresh_image_list; stale label syncs are ignored
         self.current_image_index = -1
         self.current_image_path = None
         self.photo_image = None # Keep reference
@@ -29,6 +36,11 @@ class LabelingTool(tk.Frame):
 
         self.selected_class = None
         
+        # Decoded images, shared with the other views of the project
+        cache_mb = self.project_manager.get_setting("image_cache_mb", ImageCache.MAX_BYTES // 2**20)
+        self.image_cache = get_project_image_cache(self.project_manager.current_project_path,
+                                                   max_bytes=int(cache_mb) * 2**20)
+        
         self._create_ui()
         self._bind_events()
         self.refresh_image_list()
@@ -120,16 +132,35 @@ class LabelingTool(tk.Frame):
         img_dir = os.path.join(self.project_manager.current_project_path, "data", "images")
         self.images = [f for f in os.listdir(img_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp'))]
         
-        non_labeled_color = ThemeManager().get("inspector_non_labeled_color")
-        
-        for i, img in enumerate(self.images):
+        for img in self.images:
             self.image_listbox.insert(tk.END, img)
-            
-            # Check if label exists
-            label_name = os.path.splitext(img)[0] + ".txt"
-            label_path = os.path.join(self.project_manager.current_project_path, "data", "labels", label_name)
-            
-            if not os.path.exists(label_path) or os.path.getsize(label_path) == 0:
+        
+        # The first sync parses every label file: color the list once it's done
+        self._list_token += 1
+        threading.Thread(target=self._sync_labels_thread,
+                         args=(self._list_token, self.project_manager.current_project_path, list(self.images)),
+                         daemon=True).start()
+    
+    def _sync_labels_thread(self, token, project_path, images):
+        try:
+            label_store = get_project_label_store(project_path)  # Syncs when first created
+            label_store.sync()
+            labeled = label_store.nonempty_files()
+        except Exception as e:
+            print(f"Error syncing labels: {e}")
+            return
+        try:
+            self.after(0, lambda: self._mark_unlabeled(token, images, labeled))
+        except (tk.TclError, RuntimeError):
+            pass  # View is being destroyed
+    
+    def _mark_unlabeled(self, token, images, labeled):
+        if token != self._list_token:
+            return  # The list was refreshed again meanwhile
+        non_labeled_color = ThemeManager().get("inspector_non_labeled_color")
+        for i, img in enumerate(images):
+            # Label file missing or empty
+            if os.path.splitext(img)[0] not in labeled:
                 self.image_listbox.itemconfig(i, {'bg': non_labeled_color})
 
     def refresh_class_list(self):
@@ -173,13 +204,15 @@ class LabelingTool(tk.Frame):
             filename = self.images[index]
             self.current_image_path = os.path.join(self.project_manager.current_project_path, "data", "images", filename)
             
-            pil_img = Image.open(self.current_image_path)
-            self.img_width, self.img_height = pil_img.size
-            
             # Resize for display if too large (simple fit)
             canvas_width = self.canvas.winfo_width()
             canvas_height = self.canvas.winfo_height()
             
+            # JPEGs are decoded straight at the closest scale above the canvas size;
+            # boxes stay in full-resolution pixels
+            pil_img, (self.img_width, self.img_height) = self.image_cache.get_draft(
+                self.current_image_path, self._display_size())
+            
             # Simple scaling logic (can be improved)
             if canvas_width > 1 and canvas_height > 1:
                 scale_w = canvas_width / self.img_width
@@ -202,31 +235,44 @@ class LabelingTool(tk.Frame):
             self.redo_stack = []
             self.load_existing_labels(filename)
             self.update_inspector()
+            self.prefetch_neighbours(index)
+
+    def prefetch_neighbours(self, index):
+        """Decode the images around index in the background, nearest first."""
+        radius = int(self.project_manager.get_setting("prefetch_images", self.PREFETCH_RADIUS))
+        images_dir = os.path.join(self.project_manager.current_project_path, "data", "images")
+        neighbours = [i for step in range(1, radius + 1) for i in (index + step, index - step)]
+        self.image_cache.prefetch([os.path.join(images_dir, self.images[i])
+                                   for i in neighbours if 0 <= i < len(self.images)],
+                                  display_size=self._display_size())
+
+    def _display_size(self):
+        """Size images are drafted for: the canvas (the view never zooms past fit)."""
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        if canvas_width > 1 and canvas_height > 1:
+            return (canvas_width, canvas_height)
+        return None
 
     def load_existing_labels(self, filename):
-        label_name = os.path.splitext(filename)[0] + ".txt"
-        label_path = os.path.join(self.project_manager.current_project_path, "data", "labels", label_name)
+        label_store = get_project_label_store(self.project_manager.current_project_path)
+        stem = os.path.splitext(filename)[0]
+        label_store.sync_file(stem)  # Edited outside the app since the last scan?
+        bboxes, class_ids = label_store.get(stem)
         
         classes = self.project_manager.get_classes()
         
-        if os.path.exists(label_path):
-            with open(label_path, "r") as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) >= 5:
-                        cls_idx = int(float(parts[0]))
-                        cx, cy, w, h = map(float, parts[1:5])
-                        
-                        if 0 <= cls_idx < len(classes):
-                            cls_name = classes[cls_idx]
-                            
-                            # Convert YOLO to pixel
-                            x1 = (cx - w/2) * self.img_width
-                            y1 = (cy - h/2) * self.img_height
-                            x2 = (cx + w/2) * self.img_width
-                            y2 = (cy + h/2) * self.img_height
-                            
-                            self.add_box_visual(x1, y1, x2, y2, cls_name)
+        for (cx, cy, w, h), cls_idx in zip(bboxes, class_ids):
+            if 0 <= cls_idx < len(classes):
+                cls_name = classes[cls_idx]
+                
+                # Convert YOLO to pixel
+                x1 = (cx - w/2) * self.img_width
+                y1 = (cy - h/2) * self.img_height
+                x2 = (cx + w/2) * self.img_width
+                y2 = (cy + h/2) * self.img_height
+                
+                self.add_box_visual(x1, y1, x2, y2, cls_name)
 
     def on_canvas_motion(self, event):
         """Update crosshair position as mouse moves."""
@@ -383,12 +429,11 @@ class LabelingTool(tk.Frame):
             # Delete image
             if os.path.exists(img_path):
                 os.remove(img_path)
+            self.image_cache.invalidate(img_path)
             
             # Delete label if exists
-            label_name = os.path.splitext(filename)[0] + ".txt"
-            label_path = os.path.join(self.project_manager.current_project_path, "data", "labels", label_name)
-            if os.path.exists(label_path):
-                os.remove(label_path)
+            label_store = get_project_label_store(self.project_manager.current_project_path)
+            label_store.remove(os.path.splitext(filename)[0])
         except Exception as e:
             messagebox.showerror("Error", f"Failed to delete {filename}: {e}")
 
@@ -482,27 +527,29 @@ class LabelingTool(tk.Frame):
         if not self.current_image_path: return
         
         filename = os.path.basename(self.current_image_path)
-        label_name = os.path.splitext(filename)[0] + ".txt"
-        label_path = os.path.join(self.project_manager.current_project_path, "data", "labels", label_name)
-        
         classes = self.project_manager.get_classes()
         
-        with open(label_path, "w") as f:
-            for box in self.boxes:
-                cls_name = box['class']
-                if cls_name not in classes:
-                    continue # Skip unknown classes or warn
-                
-                cls_idx = classes.index(cls_name)
-                x1, y1, x2, y2 = box['bbox']
-                
-                # Convert to YOLO (cx, cy, w, h) normalized
-                cx = ((x1 + x2) / 2) / self.img_width
-                cy = ((y1 + y2) / 2) / self.img_height
-                w = (x2 - x1) / self.img_width
-                h = (y2 - y1) / self.img_height
-                
-                f.write(f"{cls_idx} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}\n")
+        bboxes = []
+        class_ids = []
+        for box in self.boxes:
+            cls_name = box['class']
+            if cls_name not in classes:
+                continue # Skip unknown classes or warn
+            
+            x1, y1, x2, y2 = box['bbox']
+            
+            # Convert to YOLO (cx, cy, w, h) normalized
+            cx = ((x1 + x2) / 2) / self.img_width
+            cy = ((y1 + y2) / 2) / self.img_height
+            w = (x2 - x1) / self.img_width
+            h = (y2 - y1) / self.img_height
+            
+            bboxes.append([cx, cy, w, h])
+            class_ids.append(classes.index(cls_name))
+        
+        # Writes the YOLO .txt and updates the label store
+        label_store = get_project_label_store(self.project_manager.current_project_path)
+        label_store.put(os.path.splitext(filename)[0], bboxes, class_ids)
         
         # messagebox.showinfo("Saved", f"Labels saved for {filename}")
         self.flash_screen()
@@ -1,16 +1,30 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
-from app.ui.components import RoundedButton
+from app.ui.components import RoundedButton, VirtualListbox
 from PIL import Image, ImageTk
 import os
 import shutil
+from bisect import bisect_left
 from app.core.theme_manager import ThemeManager
 from datetime import datetime
 from app.core.sam_wrapper import SAMWrapper
+from app.core.label_store import get_project_label_store
+from app.core.image_index import NEGATIVE, get_project_image_index
+from app.core.navigation import NavigationOrder
+from app.core.image_pyramid import ImagePyramid
+from app.core.image_cache import ImageCache, get_project_image_cache
 
 class OrganizedLabelingTool(ttk.Frame):
     """Tabbed labeling interface with drawing capabilities."""
     
+    # Images shown per step when a class folder is opened
+    TREE_PAGE_SIZE = 500
+    # Images decoded ahead on each side of the current one
+    PREFETCH_RADIUS = 2
+    # Images (the current one, then the next ones) the Magic Wand encodes ahead
+    SAM_PRECOMPUTE = 3
+    MORE_ROW_PREFIX = "more:"
+    
     def __init__(self, parent, project_manager):
         super().__init__(parent)
         self.project_manager = project_manager
@@ -27,9 +41,14 @@ class OrganizedLabelingTool(ttk.Frame):
         self.pan_x = 0
         self.pan_y = 0
         self.pil_image = None  # Store original PIL image
+        self.pyramid = None  # Tiles of pil_image that redraw_view renders from
         self.image_id = None
+        self._redraw_after = None  # Pending schedule_redraw callback
+        self._panning = False
         
-        self.boxes = []  # {'id': rect_id, 'text_id': text_id, 'class': class_name, 'bbox': [x1,y1,x2,y2]}
+        # {'id': rect_id, 'text_id': text_id, 'class': class_name, 'bbox': [x1,y1,x2,y2],
+        #  'view': (scale, pan_x, pan_y) its canvas items are placed for}
+        self.boxes = []
         self.current_box_start = None
         self.drawing_rect_id = None
         self.selected_class = None
@@ -54,9 +73,35 @@ class OrganizedLabelingTool(ttk.Frame):
         # Track current selection context
         self.selected_image_for_deletion = None
         
+        # Rows shown for the image index: class id -> tree node / sorted paths
+        self.image_index = None
+        self._class_nodes = {}
+        self._node_classes = {}
+        self._class_members = {}
+        self._materialized = {}  # class id -> number of its images with a tree row
+        self._row_classes = []
+        self.negatives_paths = []
+        # Save-and-next order of each tab, and the folder of every image in the tree
+        self._tree_order = NavigationOrder()
+        self._negative_order = NavigationOrder()
+        self._image_classes = {}
+        
+        # Decoded images, shared with the other views of the project
+        cache_mb = self.project_manager.get_setting("image_cache_mb", ImageCache.MAX_BYTES // 2**20)
+        self.image_cache = get_project_image_cache(self.project_manager.current_project_path,
+                                                   max_bytes=int(cache_mb) * 2**20)
+        
         self.setup_ui()
+        if self.project_manager.current_project_path:
+            self.image_index = get_project_image_index(self.project_manager.current_project_path)
+            self.image_index.subscribe(self._on_index_changes)
+            self.bind("<Destroy>", self._on_destroy, add="+")
         self.refresh_all_images()
     
+    def _on_destroy(self, event):
+        if event.widget is self and self.image_index:
+            self.image_index.unsubscribe(self._on_index_changes)
+    
     def setup_ui(self):
         # ... (lines 45-84 remain, we need to locate where to insert the new button or key bind)
         # I'll use multi_replace for safer edits across the file.
@@ -149,8 +194,10 @@ class OrganizedLabelingTool(ttk.Frame):
         # Pan bindings
         self.canvas.bind("<ButtonPress-2>", self.start_pan)
         self.canvas.bind("<B2-Motion>", self.pan)
+        self.canvas.bind("<ButtonRelease-2>", self.end_pan)
         self.canvas.bind("<ButtonPress-3>", self.start_pan) 
         self.canvas.bind("<B3-Motion>", self.pan)
+        self.canvas.bind("<ButtonRelease-3>", self.end_pan)
         
         # Zoom/Brush bindings (Canvas only)
         self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
@@ -188,6 +235,7 @@ class OrganizedLabelingTool(ttk.Frame):
         self.class_tree.config(yscrollcommand=scrollbar.set)
         
         self.class_tree.bind("<<TreeviewSelect>>", self.on_class_tree_select)
+        self.class_tree.bind("<<TreeviewOpen>>", self._on_class_tree_open)
         
         return tab
     
@@ -195,7 +243,7 @@ class OrganizedLabelingTool(ttk.Frame):
         """Create a simple list tab."""
         tab = ttk.Frame(self.notebook)
         
-        listbox = tk.Listbox(tab, bg="#1e1e1e", fg="white", selectmode='extended')
+        listbox = VirtualListbox(tab, format_item=os.path.basename, bg="#1e1e1e", fg="white")
         listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         listbox.bind("<<ListboxSelect>>", lambda e: self.on_simple_list_select(e, name))
         
@@ -242,64 +290,191 @@ class OrganizedLabelingTool(ttk.Frame):
             self.refresh_all_images()
     
     def refresh_all_images(self):
-        """Refresh all image lists."""
-        if not self.project_manager.current_project_path:
+        """Rebuild all image lists from the image index and ask it for a rescan.
+
+        The index scans the disk on its own thread; this only redraws rows.
+        Class folders are filled lazily when opened (see _materialize_page)
+        and the negatives list only renders its visible rows, so this costs
+        the same at 100 or 100k images.
+        """
+        if not self.image_index:
             return
-        
-        images_dir = os.path.join(self.project_manager.current_project_path, "data", "images")
-        labels_dir = os.path.join(self.project_manager.current_project_path, "data", "labels")
-        
-        if not os.path.exists(images_dir):
+        self.image_index.rescan()
+        
+        self._row_classes = self.project_manager.get_classes()
+        self._class_members = {class_id: [] for class_id in range(len(self._row_classes))}
+        negatives = []
+        for img_path, class_id in self.image_index.snapshot().items():
+            if class_id == NEGATIVE:
+                # No (or empty) label = Negative (was unclassified)
+                negatives.append(img_path)
+            elif class_id in self._class_members:
+                self._class_members[class_id].append(img_path)
+        
+        self._tree_order = NavigationOrder(img for images in self._class_members.values() for img in images)
+        self._negative_order = NavigationOrder(negatives)
+        self._image_classes = {img: class_id for class_id, images in self._class_members.items() for img in images}
+        
+        # Update UI, keeping open folders open
+        reopen = {class_id: count for class_id, count in self._materialized.items()
+                  if class_id in self._class_nodes and count and self.class_tree.item(self._class_nodes[class_id], "open")}
+        self.class_tree.delete(*self.class_tree.get_children())
+        self._class_nodes = {}
+        self._node_classes = {}
+        self._materialized = {}
+        for class_id, images in self._class_members.items():
+            parent = self.class_tree.insert("", "end", text=f"{self._row_classes[class_id]} ({len(images)})")
+            self._class_nodes[class_id] = parent
+            self._node_classes[parent] = class_id
+            self._materialized[class_id] = 0
+            self._sync_more_row(class_id)
+        for class_id, count in reopen.items():
+            if class_id in self._class_members:
+                while self._materialized[class_id] < min(count, len(self._class_members[class_id])):
+                    self._materialize_page(class_id)
+                self.class_tree.item(self._class_nodes[class_id], open=True)
+        
+        self.negatives_paths = negatives
+        self.negatives_listbox.set_items(self.negatives_paths)
+    
+    def _more_row(self, class_id):
+        return f"{self.MORE_ROW_PREFIX}{class_id}"
+    
+    def _is_image_row(self, item):
+        """True for tree rows of images (not class folders or "more" rows)."""
+        return bool(self.class_tree.parent(item)) and not item.startswith(self.MORE_ROW_PREFIX)
+    
+    def _sync_more_row(self, class_id):
+        """Keep a "... more" row at the end of a folder while it has rows left to show."""
+        more = self._more_row(class_id)
+        remaining = len(self._class_members[class_id]) - self._materialized[class_id]
+        if remaining <= 0:
+            if self.class_tree.exists(more):
+                self.class_tree.delete(more)
+            return
+        text = f"... {remaining} more (select to show {min(remaining, self.TREE_PAGE_SIZE)})"
+        if self.class_tree.exists(more):
+            self.class_tree.item(more, text=text)
+            self.class_tree.move(more, self._class_nodes[class_id], "end")
+        else:
+            self.class_tree.insert(self._class_nodes[class_id], "end", iid=more, text=text)
+    
+    def _materialize_page(self, class_id):
+        """Create the tree rows of a folder's next TREE_PAGE_SIZE images."""
+        members = self._class_members[class_id]
+        parent = self._class_nodes[class_id]
+        start = self._materialized[class_id]
+        stop = min(start + self.TREE_PAGE_SIZE, len(members))
+        for img in members[start:stop]:
+            self.class_tree.insert(parent, "end", iid=img, text=os.path.basename(img), values=(img,))
+        self._materialized[class_id] = stop
+        self._sync_more_row(class_id)
+    
+    def _on_class_tree_open(self, event):
+        """Fill a class folder with its first page when it is opened."""
+        class_id = self._node_classes.get(self.class_tree.focus())
+        if class_id is not None and self._materialized[class_id] == 0:
+            self._materialize_page(class_id)
+    
+    def _ensure_tree_row(self, img_path):
+        """Create the tree row of an image (and the pages before it); returns its class id or None."""
+        class_id = self._image_classes.get(img_path)
+        if class_id is None:
+            return None
+        i = self._find_sorted(self._class_members[class_id], img_path)
+        while self._materialized[class_id] <= i:
+            self._materialize_page(class_id)
+        return class_id
+    
+    def _on_index_changes(self, changes):
+        """Image index callback (index thread): apply the changes on the Tk thread."""
+        try:
+            self.after(0, lambda: self._apply_index_changes(changes))
+        except (tk.TclError, RuntimeError):
+            pass  # View is being destroyed
+    
+    def _apply_index_changes(self, changes):
+        """Move only the rows of images whose class changed, appeared or disappeared."""
+        if len(changes) > 200:
+            # e.g. the first scan: one rebuild beats many single inserts
+            self.refresh_all_images()
             return
         
-        # Categorize
-        all_images = {"Classes": {}, "Negatives": []}
-        
-        classes = self.project_manager.get_classes()
-        for cls in classes:
-            all_images["Classes"][cls] = []
-        
-        for img_file in os.listdir(images_dir):
-            if not img_file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                continue
+        touched = set()
+        for img_path, old, new in changes:
+            if old == NEGATIVE:
+                i = self._remove_sorted(self.negatives_paths, img_path)
+                if i is not None:
+                    self.negatives_listbox.notify_delete(i)
+                self._negative_order.remove(img_path)
+            elif old in self._class_members:
+                if self._remove_sorted(self._class_members[old], img_path) is not None \
+                        and self.class_tree.exists(img_path):
+                    self.class_tree.delete(img_path)
+                    self._materialized[old] -= 1
+                self._tree_order.remove(img_path)
+                self._image_classes.pop(img_path, None)
+                touched.add(old)
             
-            img_path = os.path.join(images_dir, img_file)
-            label_path = os.path.join(labels_dir, os.path.splitext(img_file)[0] + ".txt")
-            
-            # Generated detection
-            if os.path.exists(label_path) and os.path.getsize(label_path) > 0:
-                with open(label_path, "r") as f:
-                    lines = f.readlines()
-                    if lines:
-                        class_id = int(float(lines[0].split()[0]))
-                        if class_id < len(classes):
-                            all_images["Classes"][classes[class_id]].append(img_path)
-                    else:
-                        all_images["Negatives"].append(img_path)
-            else:
-                # No label = Negative (was unclassified)
-                all_images["Negatives"].append(img_path)
-        
-        # Update UI
-        self.class_tree.delete(*self.class_tree.get_children())
-        for cls, images in all_images["Classes"].items():
-            parent = self.class_tree.insert("", "end", text=f"{cls} ({len(images)})")
-            for img in images:
-                self.class_tree.insert(parent, "end", text=os.path.basename(img), values=(img,))
-        
-        for category in ["Negatives"]:
-            listbox = getattr(self, f"{category.lower()}_listbox")
-            listbox.delete(0, tk.END)
-            for img in all_images[category]:
-                listbox.insert(tk.END, os.path.basename(img))
-            # Store paths for retrieval
-            setattr(self, f"{category.lower()}_paths", all_images[category])
+            if new == NEGATIVE:
+                i = self._insert_sorted(self.negatives_paths, img_path)
+                self.negatives_listbox.notify_insert(i)
+                self._negative_order.insert_after(img_path, self.negatives_paths[i - 1] if i else None)
+            elif new in self._class_members:
+                i = self._insert_sorted(self._class_members[new], img_path)
+                self._tree_order.insert_after(img_path, self._tree_predecessor(new, i))
+                self._image_classes[img_path] = new
+                # Only if it lands among the rows already shown (otherwise a later page has it)
+                if i < self._materialized[new] or 0 < self._materialized[new] == len(self._class_members[new]) - 1:
+                    self.class_tree.insert(self._class_nodes[new], i, iid=img_path,
+                                           text=os.path.basename(img_path), values=(img_path,))
+                    self._materialized[new] += 1
+                touched.add(new)
+        
+        for class_id in touched:
+            self.class_tree.item(self._class_nodes[class_id],
+                                 text=f"{self._row_classes[class_id]} ({len(self._class_members[class_id])})")
+            self._sync_more_row(class_id)
+    
+    def _tree_predecessor(self, class_id, i):
+        """Image before position i of a folder in tree order (across folders), None if first."""
+        if i > 0:
+            return self._class_members[class_id][i - 1]
+        for previous in range(class_id - 1, -1, -1):
+            if self._class_members[previous]:
+                return self._class_members[previous][-1]
+        return None
+    
+    @staticmethod
+    def _find_sorted(paths, img_path):
+        """Position in a list sorted by file name, None if absent."""
+        i = bisect_left(paths, os.path.basename(img_path), key=os.path.basename)
+        return i if i < len(paths) and paths[i] == img_path else None
+    
+    @staticmethod
+    def _insert_sorted(paths, img_path):
+        """Insert into a list sorted by file name; returns the position."""
+        i = bisect_left(paths, os.path.basename(img_path), key=os.path.basename)
+        paths.insert(i, img_path)
+        return i
+    
+    @staticmethod
+    def _remove_sorted(paths, img_path):
+        """Remove from a list sorted by file name; returns the old position, None if absent."""
+        i = OrganizedLabelingTool._find_sorted(paths, img_path)
+        if i is not None:
+            del paths[i]
+        return i
     
     def on_class_tree_select(self, event):
         """Handle class tree selection."""
         selection = self.class_tree.selection()
-        if selection and self.class_tree.parent(selection[0]):
-            img_path = self.class_tree.item(selection[0])["values"][0]
+        if selection and selection[0].startswith(self.MORE_ROW_PREFIX):
+            class_id = int(selection[0][len(self.MORE_ROW_PREFIX):])
+            self.class_tree.selection_remove(selection[0])
+            self._materialize_page(class_id)
+        elif selection and self._is_image_row(selection[0]):
+            img_path = selection[0]  # Image rows use their path as iid
             self.selected_image_for_deletion = img_path  # Track for deletion
             self.load_image(img_path)
     
@@ -324,8 +499,12 @@ class OrganizedLabelingTool(ttk.Frame):
         self.info_label.config(text=os.path.basename(img_path))
         
         try:
-            self.pil_image = Image.open(img_path)
+            self.pil_image = self.image_cache.get(img_path)
             self.img_width, self.img_height = self.pil_image.size
+            if self.pyramid:
+                self.pyramid.close()
+            self.pyramid = ImagePyramid(self.pil_image, on_level=self._on_pyramid_level)
+            self.pyramid.start()
 
             
 
@@ -335,10 +514,13 @@ class OrganizedLabelingTool(ttk.Frame):
             self.redo_stack = []
 
             self.canvas.delete("all")
+            self.image_id = None
             
             self.load_existing_labels()
             self.reset_view()
             self.update_inspector()
+            self.prefetch_neighbours(img_path)
+            self.precompute_sam()
 
             # self.load_existing_labels()
             # self.update_inspector()
@@ -347,6 +529,31 @@ class OrganizedLabelingTool(ttk.Frame):
             messagebox.showerror("Error", f"Failed to load: {e}")
     
 
+    def prefetch_neighbours(self, img_path):
+        """Decode the images around img_path in its navigation order in the background."""
+        order = self._negative_order if img_path in self._negative_order else self._tree_order
+        radius = int(self.project_manager.get_setting("prefetch_images", self.PREFETCH_RADIUS))
+        paths = []
+        next_path = prev_path = img_path
+        for _ in range(radius):
+            # Nearest first, the next image before the previous one
+            next_path = order.next(next_path) if next_path else None
+            prev_path = order.prev(prev_path) if prev_path else None
+            paths += [p for p in (next_path, prev_path) if p]
+        if paths:
+            self.image_cache.prefetch(paths)
+
+    def precompute_sam(self):
+        """Have the Magic Wand encode the current image and the next ones in the background."""
+        if not self.sam_wrapper or not self.is_magic_wand_active or not self.current_image_path:
+            return
+        order = self._negative_order if self.current_image_path in self._negative_order else self._tree_order
+        count = int(self.project_manager.get_setting("sam_precompute_images", self.SAM_PRECOMPUTE))
+        paths = [self.current_image_path]
+        while len(paths) < count and order.next(paths[-1]):
+            paths.append(order.next(paths[-1]))
+        self.sam_wrapper.precompute(paths)
+
     def reset_view(self, event=None):
         """Fit image to canvas center."""
         if not self.pil_image: return
@@ -372,8 +579,26 @@ class OrganizedLabelingTool(ttk.Frame):
             
         self.redraw_view()
 
+    def schedule_redraw(self):
+        """Redraw once the pending events are handled.
+
+        Bursts of pan/zoom events (one per wheel tick or mouse move) only
+        update the view state; the render runs once per burst, from the
+        idle queue, with the latest state.
+        """
+        if self._redraw_after is None:
+            self._redraw_after = self.after_idle(self._run_scheduled_redraw)
+
+    def _run_scheduled_redraw(self):
+        self._redraw_after = None
+        self.redraw_view()
+
     def redraw_view(self):
         """Redraw the visible portion of the image at current scale."""
+        if self._redraw_after is not None:
+            # Rendering now covers the scheduled redraw too
+            self.after_cancel(self._redraw_after)
+            self._redraw_after = None
         if not self.pil_image: return
         
         # Canvas dimensions
@@ -398,40 +623,42 @@ class OrganizedLabelingTool(ttk.Frame):
         crop_x2 = min(img_w, int(vis_x2) + 1)
         crop_y2 = min(img_h, int(vis_y2) + 1)
         
-        # Store current boxes data to re-create
-        current_boxes = self.boxes
-        self.boxes = [] # Will be repopulated
-        
-        self.canvas.delete("all")
-
-        # If completely off-screen, just redraw boxes (though likely none visible)
+        # If completely off-screen, just hide the image (boxes likely aren't visible either)
         if crop_x2 <= crop_x1 or crop_y2 <= crop_y1:
-            pass
+            if self.image_id:
+                self.canvas.itemconfig(self.image_id, state=tk.HIDDEN)
         else:
-            # 2. Crop
-            crop = self.pil_image.crop((crop_x1, crop_y1, crop_x2, crop_y2))
-            
-            # 3. Resize
-            target_w = int((crop_x2 - crop_x1) * self.scale)
-            target_h = int((crop_y2 - crop_y1) * self.scale)
-            
-            # Use NEAREST for speed/sharpness when zoomed inside
-            resample_method = Image.Resampling.NEAREST if self.scale >= 1.0 else Image.Resampling.BILINEAR
-                
-            display_img = crop.resize((max(1, target_w), max(1, target_h)), resample_method)
+            # 2-3. Compose the visible tiles of the closest pyramid level at display scale
+            display_img = self.pyramid.render(self.scale, crop_x1, crop_y1, crop_x2, crop_y2)
             self.photo_image = ImageTk.PhotoImage(display_img)
             
             # 4. Position on Canvas
             draw_x = self.pan_x + crop_x1 * self.scale
             draw_y = self.pan_y + crop_y1 * self.scale
             
-            self.image_id = self.canvas.create_image(draw_x, draw_y, anchor=tk.NW, image=self.photo_image)
-        
-        # 5. Redraw boxes
-        for box_data in current_boxes:
-             x1, y1, x2, y2 = box_data['bbox']
-             cls = box_data['class']
-             self.add_box_to_canvas(x1, y1, x2, y2, cls)
+            if self.image_id:
+                self.canvas.itemconfig(self.image_id, image=self.photo_image, state=tk.NORMAL)
+                self.canvas.coords(self.image_id, draw_x, draw_y)
+            else:
+                self.image_id = self.canvas.create_image(draw_x, draw_y, anchor=tk.NW, image=self.photo_image)
+                self.canvas.tag_lower(self.image_id)
+        
+        # 5. Move the boxes placed for another view; their items are kept
+        view = (self.scale, self.pan_x, self.pan_y)
+        for box in self.boxes:
+            if box['view'] != view:
+                self.place_box(box)
+
+    def _on_pyramid_level(self, pyramid, level):
+        """Pyramid callback (build thread): redraw if the new level is the one to show."""
+        def redraw():
+            # A pan renders when it ends
+            if pyramid is self.pyramid and level == pyramid.level_for_scale(self.scale) and not self._panning:
+                self.schedule_redraw()
+        try:
+            self.after(0, redraw)
+        except (tk.TclError, RuntimeError):
+            pass  # View is being destroyed
 
     def zoom(self, delta, mouse_x, mouse_y):
         """Zoom in or out relative to mouse position."""
@@ -463,10 +690,10 @@ class OrganizedLabelingTool(ttk.Frame):
         self.pan_y = mouse_y - new_rel_y
         
         self.scale = new_scale
-        self.redraw_view()
+        self.schedule_redraw()
         
     def start_pan(self, event):
-        self.canvas.scan_mark(event.x, event.y)
+        self._panning = True
         self._pan_start_x = event.x
         self._pan_start_y = event.y
         self._pan_orig_x = self.pan_x
@@ -477,34 +704,42 @@ class OrganizedLabelingTool(ttk.Frame):
         dx = event.x - self._pan_start_x
         dy = event.y - self._pan_start_y
         
-        self.pan_x = self._pan_orig_x + dx
-        self.pan_y = self._pan_orig_y + dy
-        self.redraw_view()
+        new_pan_x = self._pan_orig_x + dx
+        new_pan_y = self._pan_orig_y + dy
+        
+        # Shift what is already drawn; the newly exposed area is rendered in end_pan
+        move_x, move_y = new_pan_x - self.pan_x, new_pan_y - self.pan_y
+        old_view = (self.scale, self.pan_x, self.pan_y)
+        self.pan_x, self.pan_y = new_pan_x, new_pan_y
+        if self.image_id:
+            self.canvas.move(self.image_id, move_x, move_y)
+        self.canvas.move("box", move_x, move_y)
+        view = (self.scale, self.pan_x, self.pan_y)
+        for box in self.boxes:
+            if box['view'] == old_view:
+                box['view'] = view
+
+    def end_pan(self, event):
+        self._panning = False
+        self.schedule_redraw()
     
     def load_existing_labels(self):
         """Load existing YOLO labels."""
         filename = os.path.basename(self.current_image_path)
-        label_path = os.path.join(self.project_manager.current_project_path, "data", "labels",
-                                    os.path.splitext(filename)[0] + ".txt")
+        label_store = get_project_label_store(self.project_manager.current_project_path)
+        stem = os.path.splitext(filename)[0]
+        label_store.sync_file(stem)  # Edited outside the app since the last scan?
+        bboxes, class_ids = label_store.get(stem)
         
         classes = self.project_manager.get_classes()
-        if not os.path.exists(label_path):
-            return
-        
-        with open(label_path, "r") as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) >= 5:
-                    cls_idx = int(float(parts[0]))
-                    cx, cy, w, h = map(float, parts[1:5])
-                    
-                    if cls_idx < len(classes):
-                        x1 = (cx - w/2) * self.img_width
-                        y1 = (cy - h/2) * self.img_height
-                        x2 = (cx + w/2) * self.img_width
-                        y2 = (cy + h/2) * self.img_height
-                        
-                        self.add_box_visual(x1, y1, x2, y2, classes[cls_idx])
+        for (cx, cy, w, h), cls_idx in zip(bboxes, class_ids):
+            if cls_idx < len(classes):
+                x1 = (cx - w/2) * self.img_width
+                y1 = (cy - h/2) * self.img_height
+                x2 = (cx + w/2) * self.img_width
+                y2 = (cy + h/2) * self.img_height
+                
+                self.add_box_visual(x1, y1, x2, y2, classes[cls_idx])
     
     def on_canvas_motion(self, event):
         """Update crosshair position as mouse moves."""
@@ -580,15 +815,8 @@ class OrganizedLabelingTool(ttk.Frame):
     
     def add_box_visual(self, x1, y1, x2, y2, cls_name, record_history=False):
         """Add a box to the canvas."""
-        sx1, sy1 = x1 * self.scale + self.pan_x, y1 * self.scale + self.pan_y
-        sx2, sy2 = x2 * self.scale + self.pan_x, y2 * self.scale + self.pan_y
-        
-        color = self.get_class_color(cls_name)
-        
-        rect_id = self.canvas.create_rectangle(sx1, sy1, sx2, sy2, outline=color, width=2, tags="box")
-        text_id = self.canvas.create_text(sx1, sy1-10, text=cls_name, fill=color, anchor=tk.SW, tags="box")
-        
-        box = {"id": rect_id, "text_id": text_id, "class": cls_name, "bbox": [x1, y1, x2, y2]}
+        box = {"class": cls_name, "bbox": [x1, y1, x2, y2]}
+        self.create_box_items(box)
         self.boxes.append(box)
         self.update_inspector()
         
@@ -596,6 +824,22 @@ class OrganizedLabelingTool(ttk.Frame):
             self.history.append(("add", box))
             self.redo_stack.clear()
 
+    def create_box_items(self, box):
+        """Create the rectangle and label items of a box at the current view."""
+        color = self.get_class_color(box['class'])
+        box['id'] = self.canvas.create_rectangle(0, 0, 0, 0, outline=color, width=2, tags="box")
+        box['text_id'] = self.canvas.create_text(0, 0, text=box['class'], fill=color, anchor=tk.SW, tags="box")
+        self.place_box(box)
+
+    def place_box(self, box):
+        """Move a box's existing items to the current view."""
+        x1, y1, x2, y2 = box['bbox']
+        sx1, sy1 = x1 * self.scale + self.pan_x, y1 * self.scale + self.pan_y
+        sx2, sy2 = x2 * self.scale + self.pan_x, y2 * self.scale + self.pan_y
+        self.canvas.coords(box['id'], sx1, sy1, sx2, sy2)
+        self.canvas.coords(box['text_id'], sx1, sy1-10)
+        box['view'] = (self.scale, self.pan_x, self.pan_y)
+
     def save_history(self):
         """Save current state to history for undo."""
         # This seems to be intended to save a 'bulk' action or just marking a point.
@@ -634,6 +878,7 @@ class OrganizedLabelingTool(ttk.Frame):
         """Unload SAM model to free memory (e.g., before training)."""
         if self.sam_wrapper is not None:
             print("[Memory] Unloading SAM model...")
+            self.sam_wrapper.close()
             del self.sam_wrapper
             self.sam_wrapper = None
             import gc
@@ -648,8 +893,9 @@ class OrganizedLabelingTool(ttk.Frame):
             model_path = self.project_manager.project_config.get("auto_label_model", "sam2.1_l.pt")
             from app.core.sam_wrapper import SAMWrapper
             try:
-                self.sam_wrapper = SAMWrapper(model_path=model_path)
+                self.sam_wrapper = SAMWrapper(model_path=model_path, cache_dir=self._sam_cache_dir())
                 print("[Memory] SAM model reloaded")
+                self.precompute_sam()
             except Exception as e:
                 print(f"[Memory] Failed to reload SAM: {e}")
     
@@ -668,11 +914,7 @@ class OrganizedLabelingTool(ttk.Frame):
         elif action[0] == 'delete':
             box, idx = action[1], action[2]
             self.boxes.insert(idx, box)
-            sx1, sy1 = box['bbox'][0] * self.scale, box['bbox'][1] * self.scale
-            sx2, sy2 = box['bbox'][2] * self.scale, box['bbox'][3] * self.scale
-            color = self.get_class_color(box['class'])
-            box['id'] = self.canvas.create_rectangle(sx1, sy1, sx2, sy2, outline=color, width=2, tags="box")
-            box['text_id'] = self.canvas.create_text(sx1, sy1-10, text=box['class'], fill=color, anchor=tk.SW, tags="box")
+            self.create_box_items(box)
             self.redo_stack.append(action)
         
         self.update_inspector()
@@ -684,7 +926,10 @@ class OrganizedLabelingTool(ttk.Frame):
         action = self.redo_stack.pop()
         
         if action[0] == 'add':
-            self.add_box_visual(*action[1]['bbox'], action[1]['class'], record_history=False)
+            # Same box object as in the history, so a later undo finds it
+            box = action[1]
+            self.create_box_items(box)
+            self.boxes.append(box)
             self.history.append(action)
         elif action[0] == 'delete':
             box = action[1]
@@ -702,32 +947,37 @@ class OrganizedLabelingTool(ttk.Frame):
             return
         
         filename = os.path.basename(self.current_image_path)
-        label_path = os.path.join(self.project_manager.current_project_path, "data", "labels",
-                                    os.path.splitext(filename)[0] + ".txt")
-        
         classes = self.project_manager.get_classes()
         
-        with open(label_path, "w") as f:
-            for box in self.boxes:
-                if box['class'] not in classes:
-                    continue
-                
-                cls_idx = classes.index(box['class'])
-                x1, y1, x2, y2 = box['bbox']
-                
-                cx = ((x1 + x2) / 2) / self.img_width
-                cy = ((y1 + y2) / 2) / self.img_height
-                w = (x2 - x1) / self.img_width
-                h = (y2 - y1) / self.img_height
-                
-                f.write(f"{cls_idx} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}\n")
+        bboxes = []
+        class_ids = []
+        for box in self.boxes:
+            if box['class'] not in classes:
+                continue
+            
+            x1, y1, x2, y2 = box['bbox']
+            
+            cx = ((x1 + x2) / 2) / self.img_width
+            cy = ((y1 + y2) / 2) / self.img_height
+            w = (x2 - x1) / self.img_width
+            h = (y2 - y1) / self.img_height
+            
+            bboxes.append([cx, cy, w, h])
+            class_ids.append(classes.index(box['class']))
+        
+        # Writes the YOLO .txt and updates the label store
+        label_store = get_project_label_store(self.project_manager.current_project_path)
+        label_store.put(os.path.splitext(filename)[0], bboxes, class_ids)
         
         # Determine what's next before refreshing
         next_path = self.get_next_image_path()
         
         # visual feedback instead of annoying popup
         self.flash_feedback()
-        self.refresh_all_images()
+        # Move just this image's row; the index rescans the rest in the background
+        if self.image_index:
+            self._apply_index_changes(self.image_index.set_class(self.current_image_path,
+                                                                 class_ids[0] if class_ids else NEGATIVE))
         
         # Navigate to next image if available
         if next_path:
@@ -757,7 +1007,7 @@ class OrganizedLabelingTool(ttk.Frame):
         elif self.class_tree.selection():
             # Check if it's an image in class tree
             sel = self.class_tree.selection()[0]
-            if self.class_tree.parent(sel):  # It's an image
+            if self._is_image_row(sel):  # It's an image
                 self.delete_selected_image_from_tab()
         elif self.negatives_listbox.curselection():
             self.delete_selected_image_from_tab()
@@ -770,9 +1020,8 @@ class OrganizedLabelingTool(ttk.Frame):
         # Check class tree
         if self.class_tree.selection():
             for sel in self.class_tree.selection():
-                if self.class_tree.parent(sel):  # It's an image
-                    img_path = self.class_tree.item(sel)["values"][0]
-                    images_to_delete.append(img_path)
+                if self._is_image_row(sel):  # It's an image (iid is its path)
+                    images_to_delete.append(sel)
         
         # Check negatives listbox
         neg_selections = self.negatives_listbox.curselection()
@@ -795,26 +1044,26 @@ class OrganizedLabelingTool(ttk.Frame):
                 return
         
         # Delete all selected images
+        label_store = get_project_label_store(self.project_manager.current_project_path)
+        changes = []
         for img_path in images_to_delete:
             try:
                 filename = os.path.basename(img_path)
                 # Delete image
                 if os.path.exists(img_path):
                     os.remove(img_path)
+                self.image_cache.invalidate(img_path)
                 
                 # Delete label
-                label_path = os.path.join(
-                    self.project_manager.current_project_path, "data", "labels",
-                    os.path.splitext(filename)[0] + ".txt"
-                )
-                if os.path.exists(label_path):
-                    os.remove(label_path)
+                label_store.remove(os.path.splitext(filename)[0])
+                if self.image_index:
+                    changes += self.image_index.discard(img_path)
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to delete {filename}: {e}")
         
         self.selected_image_for_deletion = None
         self.current_image_path = None
-        self.refresh_all_images()
+        self._apply_index_changes(changes)
         
         if count == 1:
             messagebox.showinfo("Deleted", f"Deleted 1 image")
@@ -830,16 +1079,14 @@ class OrganizedLabelingTool(ttk.Frame):
         if messagebox.askyesno("Delete Image", f"Delete {filename}?"):
             try:
                 os.remove(self.current_image_path)
+                self.image_cache.invalidate(self.current_image_path)
                 
                 # Delete label
-                label_path = os.path.join(
-                    self.project_manager.current_project_path, "data", "labels",
-                    os.path.splitext(filename)[0] + ".txt"
-                )
-                if os.path.exists(label_path):
-                    os.remove(label_path)
+                label_store = get_project_label_store(self.project_manager.current_project_path)
+                label_store.remove(os.path.splitext(filename)[0])
                 
-                self.refresh_all_images()
+                if self.image_index:
+                    self._apply_index_changes(self.image_index.discard(self.current_image_path))
                 messagebox.showinfo("Deleted", f"Deleted {filename}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to delete: {e}")
@@ -887,12 +1134,15 @@ class OrganizedLabelingTool(ttk.Frame):
     def set_manual_mode(self):
         """Switch to manual box drawing mode."""
         self.is_magic_wand_active = False
+        if self.sam_wrapper:
+            self.sam_wrapper.cancel_precompute()
         self._update_cursor()
         
     def set_magic_mode(self):
         """Switch to Magic Wand mode."""
         self.is_magic_wand_active = True
         self._init_sam_if_needed()
+        self.precompute_sam()
         self._update_cursor()
         
     def _update_cursor(self):
@@ -901,10 +1151,16 @@ class OrganizedLabelingTool(ttk.Frame):
         else:
              self.canvas.config(cursor="cross")
 
+    def _sam_cache_dir(self):
+        """Where the Magic Wand keeps image embeddings across sessions."""
+        if not self.project_manager.current_project_path:
+            return None
+        return os.path.join(self.project_manager.current_project_path, "data", "sam_embeddings")
+
     def _init_sam_if_needed(self):
         if self.is_magic_wand_active and not self.sam_wrapper:
              try:
-                 self.sam_wrapper = SAMWrapper()
+                 self.sam_wrapper = SAMWrapper(cache_dir=self._sam_cache_dir())
                  # sticky notification instead of popup? Or just silent?
                  # messagebox.showinfo("SAM2 Ready", "Magic Wand is ready. Click on objects to auto-select.")
              except Exception as e:
@@ -1010,30 +1266,14 @@ class OrganizedLabelingTool(ttk.Frame):
         tab_idx = self.notebook.index(self.notebook.select())
         
         if tab_idx == 0:  # Classes tab (Treeview)
-            items = self.class_tree.get_children('')
-            all_images = []
-            def collect_images(parent):
-                for item in self.class_tree.get_children(parent):
-                    if self.class_tree.parent(item): # It's an image
-                        all_images.append(item)
-                    collect_images(item)
-            
-            for root_item in items:
-                collect_images(root_item)
-                
             selection = self.class_tree.selection()
-            if selection and selection[0] in all_images:
-                idx = all_images.index(selection[0])
-                if idx + 1 < len(all_images):
-                    next_item = all_images[idx + 1]
-                    return self.class_tree.item(next_item)["values"][0]
+            if selection and self._is_image_row(selection[0]):
+                return self._tree_order.next(selection[0])  # Image rows use their path as iid
         
         elif tab_idx == 1:  # Negatives tab (Listbox)
             sel = self.negatives_listbox.curselection()
-            if sel:
-                next_idx = sel[0] + 1
-                if next_idx < len(self.negatives_paths):
-                    return self.negatives_paths[next_idx]
+            if sel and sel[0] < len(self.negatives_paths):
+                return self._negative_order.next(self.negatives_paths[sel[0]])
         
         return None
 
@@ -1042,30 +1282,16 @@ class OrganizedLabelingTool(ttk.Frame):
         tab_idx = self.notebook.index(self.notebook.select())
         
         if tab_idx == 0:  # Classes tab
-            items = self.class_tree.get_children('')
-            def find_and_select(parent):
-                for item in self.class_tree.get_children(parent):
-                    if self.class_tree.parent(item):
-                        path = self.class_tree.item(item)["values"][0]
-                        if path == target_path:
-                            self.class_tree.selection_set(item)
-                            self.class_tree.see(item)
-                            return True
-                    if find_and_select(item):
-                        return True
-                return False
-            
-            for root_item in items:
-                if find_and_select(root_item):
-                    break
+            if self._ensure_tree_row(target_path) is not None:
+                self.class_tree.selection_set(target_path)
+                self.class_tree.see(target_path)
                     
         elif tab_idx == 1:  # Negatives tab
-            for i, path in enumerate(self.negatives_paths):
-                if path == target_path:
-                    self.negatives_listbox.selection_clear(0, tk.END)
-                    self.negatives_listbox.selection_set(i)
-                    self.negatives_listbox.see(i)
-                    break
+            i = self._find_sorted(self.negatives_paths, target_path)
+            if i is not None:
+                self.negatives_listbox.selection_clear(0, tk.END)
+                self.negatives_listbox.selection_set(i)
+                self.negatives_listbox.see(i)
     
 
 
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+# Add current directory to path to allow imports
+sys.path.append(os.getcwd())
+
+from app.core.label_io import (format_labels, format_lists, parse_labels, parse_lists, read_label_files,
+                               read_label_lists, to_array, to_lists)
+
+NUM_FILES = 2000
+BOXES_PER_FILE = (5, 20, 200)
+REPEATS = 10
+
+
+def loop_parse(text):
+    """The per-line parser the app used before label_io."""
+    bboxes = []
+    class_labels = []
+    for line in text.splitlines():
+        parts = line.strip().split()
+        if len(parts) >= 5:
+            class_id = int(float(parts[0]))
+            cx, cy, w, h = map(float, parts[1:5])
+            bboxes.append([cx, cy, w, h])
+            class_labels.append(class_id)
+    return bboxes, class_labels
+
+
+def loop_format(bboxes, class_labels):
+    """The per-box writer the app used before label_io, into a string."""
+    lines = []
+    for bbox, class_id in zip(bboxes, class_labels):
+        cx, cy, w, h = bbox
+        lines.append(f"{int(class_id)} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}\n")
+    return "".join(lines)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def compare(old_fn, new_fn):
+    """Best times of both, run alternately so load on the machine hits them alike."""
+    old, new = [], []
+    for _ in range(REPEATS):
+        old.append(timed(old_fn))
+        new.append(timed(new_fn))
+    return min(old), min(new)
+
+
+def report(name, old_fn, new_fn):
+    old, new = compare(old_fn, new_fn)
+    print(f"  {name:<28} loop: {old * 1000:8.1f} ms   label_io: {new * 1000:8.1f} ms   ({old / new:.1f}x)")
+
+
+def main():
+    rng = np.random.default_rng(0)
+    for boxes_per_file in BOXES_PER_FILE:
+        samples = []
+        for _ in range(NUM_FILES):
+            boxes = rng.random((boxes_per_file, 4)).tolist()
+            classes = rng.integers(0, 10, boxes_per_file).tolist()
+            samples.append((boxes, classes))
+        texts = [loop_format(boxes, classes) for boxes, classes in samples]
+        assert texts == [format_labels(to_array(b, c, np.float64)) for b, c in samples], "writers disagree"
+        assert texts == [format_lists(b, c) for b, c in samples], "writers disagree"
+        parsed = [loop_parse(t) for t in texts]
+        assert parsed == [to_lists(parse_labels(t, dtype=np.float64)) for t in texts], "parsers disagree"
+        assert parsed == [parse_lists(t) for t in texts], "parsers disagree"
+
+        print(f"{NUM_FILES} files x {boxes_per_file} boxes, best of {REPEATS}")
+        report("format (lists -> text)",
+               lambda: [loop_format(b, c) for b, c in samples],
+               lambda: [format_lists(b, c) for b, c in samples])
+        report("parse (text -> lists)",
+               lambda: [loop_parse(t) for t in texts],
+               lambda: [parse_lists(t) for t in texts])
+
+        tmp = tempfile.mkdtemp(prefix="label_io_bench_")
+        try:
+            paths = [os.path.join(tmp, f"{i:05d}.txt") for i in range(NUM_FILES)]
+            for path, text in zip(paths, texts):
+                with open(path, "w") as f:
+                    f.write(text)
+
+            def read_loop():
+                # Keeps the results like the label_io side, so both pay for holding them
+                results = []
+                for path in paths:
+                    with open(path, "r") as f:
+                        results.append(loop_parse(f.read()))
+                return results
+
+            report("read files, one by one", read_loop, lambda: [read_label_lists(p) for p in paths])
+            report("read files, one batch", read_loop, lambda: read_label_files(paths))
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
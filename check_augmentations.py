@@ -1,5 +1,6 @@
 import os
 import cv2
+import numpy as np
 import sys
 import shutil
 import traceback
@@ -9,6 +10,7 @@ import albumentations as A
 sys.path.append(os.getcwd())
 
 from app.core.augmentation_engine import load_filters
+from app.core.label_io import read_labels, to_lists
 
 TESTED_DIR = "Filter_Showcase"
 IMG_PATH = "img_1.png"
@@ -22,19 +24,7 @@ def load_data():
     image = cv2.imread(IMG_PATH)
     image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
     
-    bboxes = []
-    class_labels = []
-    
-    if os.path.exists(TXT_PATH):
-        with open(TXT_PATH, "r") as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) >= 5:
-                    class_id = int(float(parts[0]))
-                    cx, cy, w, h = map(float, parts[1:5])
-                    bboxes.append([cx, cy, w, h])
-                    class_labels.append(class_id)
-                    
+    bboxes, class_labels = to_lists(read_labels(TXT_PATH, dtype=np.float64))
     return image, bboxes, class_labels
 
 def main():
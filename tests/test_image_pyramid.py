@@ -0,0 +1,34 @@
+from PIL import Image
+
+from app.core.image_pyramid import ImagePyramid
+
+
+def _palette_image(size, color, transparent=False):
+    image = Image.new('P', size)
+    image.putpalette([0, 0, 0, *color] + [0] * (256 - 2) * 3)
+    image.paste(1, (0, 0, *size))
+    if transparent:
+        image.info['transparency'] = 0
+    return image
+
+
+def test_palette_image_renders_across_tiles_at_level_0():
+    pyramid = ImagePyramid(_palette_image((300, 200), (200, 30, 40)), tile_size=128)
+    # Spans 3 x 2 tiles of level 0
+    region = pyramid.render(1.0, 0, 0, 300, 200)
+    assert region.size == (300, 200)
+    assert region.convert('RGB').getpixel((150, 100)) == (200, 30, 40)
+    assert region.convert('RGB').getpixel((299, 199)) == (200, 30, 40)
+
+
+def test_palette_image_with_transparency_keeps_alpha():
+    pyramid = ImagePyramid(_palette_image((300, 200), (200, 30, 40), transparent=True), tile_size=128)
+    assert pyramid.render(1.0, 0, 0, 300, 200).getpixel((150, 100)) == (200, 30, 40, 255)
+
+
+def test_reduced_levels_of_palette_image():
+    pyramid = ImagePyramid(_palette_image((600, 400), (200, 30, 40)), tile_size=128)
+    pyramid._build()
+    assert pyramid.built_levels == pyramid.max_level + 1
+    region = pyramid.render(0.25, 0, 0, 600, 400)
+    assert region.convert('RGB').getpixel((70, 50)) == (200, 30, 40)
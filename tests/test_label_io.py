@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from app.core.label_io import (LabelFormatError, format_labels, format_lists, parse_labels, parse_lists,
+                               read_label_files, to_array, to_lists)
+
+
+def test_lenient_parse_truncates_float_class_ids():
+    # Class ids written as floats were read with int(float(x)) before label_io
+    line = "0.0 0.5 0.5 0.1 0.1"
+    assert parse_labels(line, dtype=np.float64).tolist() == [[0.0, 0.5, 0.5, 0.1, 0.1]]
+    assert parse_lists(line) == ([[0.5, 0.5, 0.1, 0.1]], [0])
+    labels = parse_labels("2.7 0.5 0.5 0.1 0.1\n-1 0.5 0.5 0.1 0.1\n", dtype=np.float64)
+    assert to_lists(labels)[1] == [2, -1]
+
+
+def test_lenient_batch_keeps_float_class_ids(tmp_path):
+    paths = []
+    for i, text in enumerate(["0.0 0.5 0.5 0.1 0.1\n", "3 0.2 0.2 0.1 0.1\n"]):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(text)
+        paths.append(str(path))
+    labels, offsets = read_label_files(paths, dtype=np.float64)
+    assert labels[:, 0].tolist() == [0.0, 3.0]
+    assert offsets.tolist() == [0, 1, 2]
+
+
+def test_strict_parse_rejects_fractional_class_ids():
+    with pytest.raises(LabelFormatError):
+        parse_labels("0.5 0.5 0.5 0.1 0.1", strict=True)
+
+
+def test_lenient_parse_skips_malformed_rows():
+    text = "0 0.5 0.5 0.1\n1 nan 0.5 0.1 0.1\nx 1 1 1 1\n2 0.1 0.2 0.3 0.4 9\n"
+    assert parse_lists(text) == ([[0.1, 0.2, 0.3, 0.4]], [2])
+    assert to_lists(parse_labels(text, dtype=np.float64)) == ([[0.1, 0.2, 0.3, 0.4]], [2])
+
+
+@pytest.mark.parametrize("boxes", [0, 5, 200])
+def test_list_and_array_paths_agree(boxes):
+    rng = np.random.default_rng(boxes)
+    bboxes = rng.random((boxes, 4)).tolist()
+    class_labels = rng.integers(0, 10, boxes).tolist()
+    text = format_lists(bboxes, class_labels)
+    assert text == format_labels(to_array(bboxes, class_labels, np.float64))
+    assert parse_lists(text) == to_lists(parse_labels(text, dtype=np.float64))
+    assert parse_lists(text)[1] == class_labels
@@ -0,0 +1,25 @@
+from app.core.label_store import LabelStore
+
+
+def _store(tmp_path, files):
+    labels_dir = tmp_path / "labels"
+    labels_dir.mkdir()
+    for stem, text in files.items():
+        (labels_dir / f"{stem}.txt").write_text(text)
+    return LabelStore(str(labels_dir), str(tmp_path / "label_store"))
+
+
+def test_nonempty_files_counts_files_without_valid_rows(tmp_path):
+    # "Labeled" in the image list means a non-empty .txt, as it did before the store
+    store = _store(tmp_path, {"boxes": "1 0.5 0.5 0.1 0.1\n", "empty": "", "blank": "\n", "broken": "x y\n"})
+    assert store.nonempty_files() == {"boxes", "blank", "broken"}
+    assert store.first_classes() == {"boxes": 1}
+
+
+def test_nonempty_files_follows_updates(tmp_path):
+    store = _store(tmp_path, {"a": "", "b": "0 0.5 0.5 0.1 0.1\n"})
+    store.put("a", [[0.5, 0.5, 0.2, 0.2]], [2])
+    store.remove("b")
+    assert store.nonempty_files() == {"a"}
+    store.put("a", [], [])
+    assert store.nonempty_files() == set()